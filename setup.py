@@ -76,11 +76,26 @@ if __name__ == '__main__':
                 'Tox',
                 'PyTest',
                 'PyTest-Flask',
+                # Local SMTP server for the outbox tests
+                'AIOSMTPD',
                 'WeMake-Python-StyleGuide',
                 'ISort<5',
                 'Coverage',
                 'Sphinx',
-            ]
+            ],
+            # Shared response cache backend: myapp.lib.responses.RedisCacheBackend
+            'redis': [
+                'Redis',
+            ],
+            # Binary response encodings: myapp.lib.encoding.negotiate_codec
+            'binary': [
+                'MsgPack',
+                'CBOR2',
+            ],
+            # Prefork serving: myapp.wsgi with myapp.gunicorn_config
+            'production': [
+                'GUnicorn',
+            ],
         },
         include_package_data=True,
         package_dir={'': 'src'},
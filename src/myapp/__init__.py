@@ -4,13 +4,16 @@
 # The <config> shouldn't import other MYAPP modules at the top level.
 # Any other module can import the <config>.
 from myapp.config import *
+# The <commands> are the Flask CLI commands; they import the other modules lazily.
+from myapp.commands import *
 # The <core> is the top level entry point for GENERIC logic and abstractions.
 # The <core> can import the <config>.
 # The <core> can't import any other MYAPP module at the top level.
 from myapp.core import *
-# The <app> sets up the Flask application. It can leverage <config> and <core>.
+# The <app> sets up the Flask application. It can leverage <config>, <core> and <lib>.
 from myapp.app import *
-# The <lib> contains less generic logic then the <core>.
+# The <lib> contains less generic logic then the <core>: caching, database, etc.
+# The <lib> modules import the <config>, the <core> and each other directly.
 from myapp.lib import *
 # The <models> should be initialized before <schemas> and <views>.
 from myapp.models import *
@@ -6,7 +6,6 @@ from traceback import format_exc
 
 from flask import Flask, signals, request
 from flask_debugtoolbar import DebugToolbarExtension
-from flask_sqlalchemy import SQLAlchemy
 from flask_security import Security
 from flask_marshmallow import Marshmallow
 from flask_migrate import Migrate
@@ -15,24 +14,45 @@ from werkzeug import exceptions
 from myapp import (
     APP_PATH,
     APIError,
+    CannedError,
     APIResponseSchema,
     APIConfig,
+    users_export,
+    users_roles,
+    roles_permissions,
+    outbox_worker,
     open_api_dump,
     JSONEncoder,
     JSONDecoder,
     json_dumps,
+    sparse_schema,
+)
+from myapp.lib.admission import admission
+from myapp.lib.database import APISQLAlchemy
+from myapp.lib.encoding import BinaryCodecs, negotiate_codec
+from myapp.lib.health import HealthMiddleware
+from myapp.lib.idempotency import IdempotencyStore
+from myapp.lib.logs import (
+    assign_connection_id,
+    echo_connection_id,
+    exception_log,
     log_request,
     log_response,
+    reset_connection_id,
 )
+from myapp.lib.responses import CannedResponses, FrozenResponse, ResponseCache
 
 LOG = getLogger(__name__)
 
 # ----------------------------------EXTENSIONS----------------------------------
 debug_toolbar = DebugToolbarExtension()
-db = SQLAlchemy()
+db = APISQLAlchemy()
 migrate = Migrate()
 flask_marshmallow = Marshmallow()
 security = Security()  # Blueprints registration is disabled via SECURITY_URL_PREFIX
+cache = ResponseCache()
+idempotency_store = IdempotencyStore()
+codecs = BinaryCodecs()
 # ----------------------------------EXTENSIONS----------------------------------
 
 
@@ -58,6 +78,7 @@ class API(Flask):
 
         self.config.from_mapping(conf.as_dict())
         self.tc: APIConfig = conf
+        self.canned_responses = CannedResponses()
 
     def make_response(self, rv):
         """
@@ -77,7 +98,6 @@ class API(Flask):
         :param from_error_handler: is it from error handler
         :return: response
         :raises ValueError: on empty response
-        :raises TypeError: on wrong schema
         :raises Exception: on critical failure
         """
         if not rv:
@@ -86,12 +106,10 @@ class API(Flask):
         if isinstance(rv, self.response_class):
             return rv
 
-        schema, json, *_ = rv
-
-        if not isinstance(schema, APIResponseSchema):
-            raise TypeError('The Schema should inherit from APISchema.')
-
-        response = self._response(json=schema.dump(json))
+        if isinstance(rv, FrozenResponse):
+            response = rv.thaw(self.response_class)
+        else:
+            response = self.dump_response(rv)
 
         # noinspection PyBroadException
         try:
@@ -106,6 +124,28 @@ class API(Flask):
 
         return response
 
+    def dump_response(self, rv):
+        """
+        Serialize a (schema, json) view return value into a response.
+
+        :param rv: view return value
+        :return: response
+        :raises TypeError: on wrong schema
+        """
+        schema, json, *_ = rv
+
+        if not isinstance(schema, APIResponseSchema):
+            raise TypeError('The Schema should inherit from APISchema.')
+
+        paths = getattr(request, 'sparse_fields', None)
+        if paths:
+            try:
+                schema = sparse_schema(schema, paths)
+            except ValueError:
+                LOG.warning(f'The fields {paths} do not match {type(schema).__name__}.')
+
+        return self._response(json=schema.dump(json))
+
     def handle_user_exception(self, e):
         """
         Handel user exception based on its type.
@@ -113,12 +153,19 @@ class API(Flask):
         :param e: exception
         :return: response
         """
-        LOG.exception('User error.')
+        exception_log.log(e)
 
         # Generic HTTP Exception
         if isinstance(e, exceptions.HTTPException):
             return self.handle_http_exception(e)
 
+        # Static API Exception
+        if isinstance(e, CannedError) and not self._is_debug_tb_response():
+            return self.canned_responses.get_or_build(
+                e.canned_key,
+                lambda: self._response(json=e.json, http_status=e.http_status),
+            )
+
         # Custom API Exception
         if isinstance(e, APIError):
             return self._response(json=e.json, http_status=e.http_status)
@@ -141,7 +188,12 @@ class API(Flask):
         :param e: exception
         :return: response
         """
-        return self._response(status=1, http_status=e.code)
+        if self._is_debug_tb_response():
+            return self._response(status=1, http_status=e.code)
+        return self.canned_responses.get_or_build(
+            ('http', e.code),
+            lambda: self._response(status=1, http_status=e.code),
+        )
 
     def handle_exception(self, e):
         """
@@ -150,7 +202,7 @@ class API(Flask):
         :param e: exception
         :return: response
         """
-        LOG.exception('Unexpected error.')
+        exception_log.log(e, msg='Unexpected error.')
         return self._response(
             json=self._json_from_uncaught_exception(status=2),
             http_status=exceptions.InternalServerError.code,
@@ -168,9 +220,15 @@ class API(Flask):
         if json['metadata'].get('status') is None:
             json['metadata']['status'] = status
 
-        response = json_dumps(json)
-        json['metadata']['headers']['Content-Type'] = 'application/json'
-        if self.config['DEBUG_TB_ENABLED'] and request.args.get('debug_tb_enabled'):
+        is_debug_tb = self._is_debug_tb_response()
+        mimetype, codec = (None, None) if is_debug_tb else negotiate_codec()
+        if codec is not None:
+            response = codec.dumps(json)
+            json['metadata']['headers']['Content-Type'] = mimetype
+        else:
+            response = json_dumps(json)
+            json['metadata']['headers']['Content-Type'] = 'application/json'
+        if is_debug_tb:
             response = """
                 <!DOCTYPE html>
                 <html lang="en">
@@ -192,9 +250,14 @@ class API(Flask):
         )
         for cookie in json['metadata'].get('cookies', []):
             api_response.set_cookie(**cookie)
+        if self.config['BINARY_CODECS']:
+            api_response.vary.add('Accept')
 
         return api_response
 
+    def _is_debug_tb_response(self):
+        return self.config['DEBUG_TB_ENABLED'] and request.args.get('debug_tb_enabled')
+
     def _json_from_uncaught_exception(self, status):
         exc_type, exc_value, _ = exc_info()
 
@@ -213,6 +276,33 @@ class API(Flask):
         return APIResponseSchema().dump(json)
 
 
+def warmup(app):
+    """
+    Do the lazy initialization ahead of the first request.
+
+    It's meant for a preloading master process: the work is done once and
+    the memory is shared with forked workers.
+
+    :param app: Flask Application
+    """
+    app.url_map.update()
+    with app.app_context():
+        pwd_handler = app.extensions['security'].pwd_context.handler()
+        if hasattr(pwd_handler, 'get_backend'):
+            pwd_handler.get_backend()
+
+
+def dispose_engines(app):
+    """
+    Close the pooled connections; forked workers must not share them.
+
+    :param app: Flask Application
+    """
+    with app.app_context():
+        for connector in app.extensions['sqlalchemy'].connectors.values():
+            connector.get_engine().dispose()
+
+
 def create_app():  # noqa: WPS213
     """
     Create Flask Application.
@@ -224,61 +314,41 @@ def create_app():  # noqa: WPS213
     app.json_encoder = JSONEncoder
     app.json_decoder = JSONDecoder
 
+    app.before_request(assign_connection_id)
+    app.before_request(admission.admit)
     app.before_request(log_request)
     app.after_request(log_response)
+    app.after_request(echo_connection_id)
+    app.teardown_request(admission.release)
+    app.teardown_request(reset_connection_id)
+
+    from myapp.views import register_blueprints
 
-    from myapp.views import (
-        AUTH_BLUEPRINT,
-        LoginView,
-        LogoutView,
-        ConfirmationTokenView,
-        ConfirmView,
-        RegisterView,
-        ChangePasswordView,
-        RestorePasswordView,
-        GUYS_BLUEPRINT,
-        GuysView,
-        STATS_BLUEPRINT,
-        StatsView,
-    )
-
-    AUTH_BLUEPRINT.add_url_rule('/login', view_func=LoginView.as_view('login'))
-    AUTH_BLUEPRINT.add_url_rule('/logout', view_func=LogoutView.as_view('logout'))
-    AUTH_BLUEPRINT.add_url_rule('/register', view_func=RegisterView.as_view('register'))
-    AUTH_BLUEPRINT.add_url_rule(
-        '/confirmation_token',
-        view_func=ConfirmationTokenView.as_view('confirmation_token'),
-    )
-    AUTH_BLUEPRINT.add_url_rule('/confirm', view_func=ConfirmView.as_view('confirm'))
-    AUTH_BLUEPRINT.add_url_rule(
-        '/change_password',
-        view_func=ChangePasswordView.as_view('change_password'),
-    )
-    AUTH_BLUEPRINT.add_url_rule(
-        '/restore_password',
-        view_func=RestorePasswordView.as_view('restore_password'),
-    )
-
-    GUYS_BLUEPRINT.add_url_rule('/guys', view_func=GuysView.as_view('guys'))
-
-    STATS_BLUEPRINT.add_url_rule('/stats', view_func=StatsView.as_view('stats'))
-
-    app.register_blueprint(AUTH_BLUEPRINT, url_prefix='/api/v1/auth')
-    app.register_blueprint(GUYS_BLUEPRINT, url_prefix='/api/v1')
-    app.register_blueprint(STATS_BLUEPRINT, url_prefix='/api/v1')
+    register_blueprints(app)
 
     if app.config['DEBUG_TB_ENABLED']:
         debug_toolbar.init_app(app)
 
     db.init_app(app)
 
-    migrate.init_app(app, db=db, directory=APP_PATH / 'migrations')
+    # Batch operations: SQLite alters tables by copying them
+    migrate.init_app(app, db=db, directory=APP_PATH / 'migrations', render_as_batch=True)
+
+    app.wsgi_app = HealthMiddleware(app.wsgi_app, app, APP_PATH / 'migrations')
 
     flask_marshmallow.init_app(app)
 
     # CSRFProtect(app) for CSRF protection
     security.init_app(app, register_blueprint=False)
 
+    cache.init_app(app)
+    idempotency_store.init_app(app)
+    codecs.init_app(app)
+
     app.cli.add_command(open_api_dump)
+    app.cli.add_command(users_export)
+    app.cli.add_command(users_roles)
+    app.cli.add_command(roles_permissions)
+    app.cli.add_command(outbox_worker)
 
     return app
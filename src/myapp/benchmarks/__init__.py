@@ -0,0 +1,5 @@
+"""
+MYAPP benchmarks.
+
+Every module is runnable: python -m myapp.benchmarks.<module>
+"""
@@ -0,0 +1,125 @@
+"""Response encodings: size and encode/decode microseconds of JSON, msgpack and CBOR envelopes."""
+from json import loads as json_loads
+from timeit import Timer
+
+from click import echo
+from flask import Flask
+
+from myapp.config import APIConfig
+from myapp.core import json_dumps
+from myapp.lib.encoding import get_codec
+
+NUMBER = 2000
+MICROSECONDS = 1e6
+TOKEN_PADDING = 150
+
+HEADER = '{0:<10}{1:<14}{2:>8}{3:>10}{4:>10}'
+ROW = '{0:<10}{1:<14}{2:>8}{3:>10.1f}{4:>10.1f}'
+
+
+def users_envelope(users=50):
+    """
+    Make a users page envelope.
+
+    :param users: page size
+    :return: envelope
+    """
+    return {
+        'data': {
+            'users': [
+                {
+                    'username': f'user-{i}',
+                    'email': f'user-{i}@example.com',
+                    'active': True,
+                    'confirmed_at': '2020-01-01T00:00:00+00:00',
+                    'roles': ['admin', 'user'] if i % 10 == 0 else ['user'],
+                }
+                for i in range(users)
+            ],
+        },
+        'metadata': {
+            'status': 0,
+            'message': 'Nice',
+            'errors': None,
+            'details': None,
+            'headers': {},
+            'next_cursor': 'eyJpZCI6NTB9.5Cz1Xb0sG6Jj6ccW9Ys0wE4YTzE',
+        },
+    }
+
+
+ENVELOPES = {
+    'login': {
+        'data': {'access_token': 'eyJ0eXAiOiJKV1QiLCJhbGciOiJIUzI1NiJ9.' + 'x' * TOKEN_PADDING},
+        'metadata': {
+            'status': 0,
+            'message': 'Nice',
+            'errors': None,
+            'details': None,
+            'headers': {},
+        },
+    },
+    'error': {
+        'data': {},
+        'metadata': {
+            'status': 3,
+            'message': 'The request specification is invalid; check OpenAPI docs for more info.',
+            'errors': {'json': {'email': ['Not a valid email address.']}},
+            'details': None,
+            'headers': {},
+        },
+    },
+    'users': users_envelope(),
+}
+
+
+def measure(fn, arg):
+    """
+    Measure microseconds per call.
+
+    :param fn: function
+    :param arg: argument
+    :return: microseconds per call
+    """
+    return Timer(lambda: fn(arg)).timeit(NUMBER) / NUMBER * MICROSECONDS
+
+
+def available_encodings():
+    """
+    Collect the encodings; msgpack and CBOR require their extras.
+
+    :return: name to (dumps, loads) mapping
+    """
+    encodings = {
+        'json': (lambda obj: json_dumps(obj).encode('utf8'), json_loads),
+        'json-compact': (
+            lambda obj: json_dumps(obj, separators=(',', ':')).encode('utf8'),
+            json_loads,
+        ),
+    }
+    for mimetype in ('application/msgpack', 'application/cbor'):
+        codec = get_codec(mimetype)
+        if codec is not None:
+            encodings[mimetype.split('/')[1]] = (codec.dumps, codec.loads)
+    return encodings
+
+
+def main():
+    """Run the benchmark."""
+    app = Flask(__name__)
+    app.config.from_object(APIConfig())
+    encodings = available_encodings()
+
+    echo(HEADER.format('envelope', 'encoding', 'bytes', 'dumps us', 'loads us'))
+    with app.app_context():
+        for name, envelope in ENVELOPES.items():
+            for encoding, (dumps, loads) in encodings.items():
+                # The API responses are indented by JSON_INDENT
+                app.config['JSON_INDENT'] = 4 if encoding == 'json' else None
+                raw = dumps(envelope)
+                dumps_us, loads_us = measure(dumps, envelope), measure(loads, raw)
+                echo(ROW.format(name, encoding, len(raw), dumps_us, loads_us))
+
+
+if __name__ == '__main__':
+    main()
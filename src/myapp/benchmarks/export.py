@@ -0,0 +1,85 @@
+"""
+Users export: RSS while streaming N rows.
+
+The rows are inserted into the configured database inside a transaction
+that is rolled back at the end, so the database is left intact.
+
+Usage: python -m myapp.benchmarks.export [rows] [format]
+"""
+from os import sysconf
+from resource import RUSAGE_SELF, getrusage
+from sys import argv
+from time import perf_counter
+
+from click import echo
+
+from myapp import UserModel, create_app, db, export_users
+
+ROWS = 1000000
+INSERT_BATCH = 10000
+SAMPLES = 10
+PAGE_SIZE = sysconf('SC_PAGE_SIZE')
+BYTES_PER_MB = 1048576
+KB_PER_MB = 1024
+
+HEADER = '{0:>10}{1:>10}{2:>12}'
+ROW = '{0:>10}{1:>10.1f}{2:>12.1f}'
+
+
+def rss_mb():
+    """
+    Get the current resident set size.
+
+    :return: RSS in MB
+    """
+    with open('/proc/self/statm') as fd:
+        pages = int(fd.read().split()[1])
+    return pages * PAGE_SIZE / BYTES_PER_MB
+
+
+def fill(rows):
+    """
+    Insert synthetic users.
+
+    :param rows: number of rows
+    """
+    table = UserModel.__table__
+    for start in range(0, rows, INSERT_BATCH):
+        db.session.execute(table.insert(), [
+            {
+                'username': f'export-benchmark-{i}',
+                'email': f'export-benchmark-{i}@example.com',
+                'password': 'x',
+                'active': True,
+            }
+            for i in range(start, min(start + INSERT_BATCH, rows))
+        ])
+
+
+def main():
+    """Run the benchmark."""
+    rows = int(argv[1]) if len(argv) > 1 else ROWS
+    export_format = argv[2] if len(argv) > 2 else 'ndjson'
+
+    app = create_app()
+    with app.app_context():
+        fill(rows)
+        echo(f'inserted {rows} rows; RSS {rss_mb():.1f} MB')
+
+        step = max(rows // SAMPLES, 1)
+        exported = 0
+        start = perf_counter()
+        echo(HEADER.format('rows', 'RSS, MB', 'elapsed, s'))
+        for chunk in export_users(export_format, app.config['USERS_EXPORT_BATCH_SIZE']):
+            lines = chunk.count('\n')
+            exported += lines
+            if exported // step != (exported - lines) // step:
+                echo(ROW.format(exported, rss_mb(), perf_counter() - start))
+
+        max_rss = getrusage(RUSAGE_SELF).ru_maxrss / KB_PER_MB
+        echo(f'exported {exported} lines; max RSS {max_rss:.1f} MB')
+        db.session.rollback()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Log formatting: records per second of the text and JSON formatters."""
+from logging import INFO, LogRecord
+from logging.config import DictConfigurator
+from sys import exc_info
+from timeit import Timer
+
+from click import echo
+
+from myapp.config import APIConfig
+
+NUMBER = 50000
+STATUS = 200
+LATENCY_MS = 1.234
+
+HEADER = '{0:<12}{1:<10}{2:>12}'
+ROW = '{0:<12}{1:<10}{2:>12,.0f}'
+
+
+def make_record(with_exc_info=False):
+    """
+    Make a typical response log record.
+
+    :param with_exc_info: attach an exception
+    :return: log record
+    """
+    exc = None
+    if with_exc_info:
+        try:
+            int('Invalid value')
+        except ValueError:
+            exc = exc_info()
+    record = LogRecord(
+        'myapp.lib.logs', INFO, __file__, 1, 'Response: %s', ({'data': {'id': 1}},), exc,
+    )
+    record.connection_id = '3f2a9c1b1f4-2a'
+    record.__dict__.update(
+        endpoint='users.users',
+        method='GET',
+        status=STATUS,
+        latency_ms=LATENCY_MS,
+    )
+    return record
+
+
+def measure(formatter, with_exc_info=False):
+    """
+    Measure records per second.
+
+    :param formatter: logging formatter
+    :param with_exc_info: attach an exception
+    :return: records per second
+    """
+    record = make_record(with_exc_info)
+
+    def call():
+        record.exc_text = None
+        formatter.format(record)
+
+    return NUMBER / Timer(call).timeit(NUMBER)
+
+
+def main():
+    """Run the benchmark."""
+    configurator = DictConfigurator(APIConfig().LOGGING)
+    formatters = {
+        name: configurator.configure_formatter(dict(conf))
+        for name, conf in configurator.config['formatters'].items()
+    }
+
+    echo(HEADER.format('formatter', 'case', 'records/s'))
+    for name, formatter in formatters.items():
+        for case, with_exc_info in (('plain', False), ('exc_info', True)):
+            echo(ROW.format(name, case, measure(formatter, with_exc_info)))
+
+
+if __name__ == '__main__':
+    main()
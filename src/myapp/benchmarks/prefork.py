@@ -0,0 +1,133 @@
+"""
+Prefork serving: worker memory and time to first request, with and without preload.
+
+Every mode starts gunicorn with myapp.gunicorn_config, waits for the first
+response and reads workers' memory from /proc/<pid>/smaps_rollup.
+
+Usage: python -m myapp.benchmarks.prefork [workers] [requests]
+"""
+from contextlib import ExitStack
+from os import environ
+from subprocess import DEVNULL, Popen  # noqa: S404
+from sys import argv, executable
+from time import perf_counter, sleep
+from urllib.error import HTTPError, URLError
+from urllib.request import urlopen
+
+from click import echo
+
+WORKERS = 4
+REQUESTS = 200
+PORT = 8094
+URL = f'http://127.0.0.1:{PORT}/api/v1/stats'
+STARTUP_TIMEOUT = 60
+STARTUP_POLL_INTERVAL = 0.01
+KB_PER_MB = 1024
+
+HEADER = '{0:<12}{1:>10}{2:>8}{3:>8}{4:>10}'
+ROW = '{0:<12}{1:>10.2f}{2:>8.1f}{3:>8.1f}{4:>10.1f}'
+
+
+def request():
+    """Issue a request; any HTTP response is fine."""
+    try:
+        with urlopen(URL) as response:
+            response.read()
+    except HTTPError as error:
+        error.read()
+
+
+def smaps_rollup(pid):
+    """
+    Get process memory.
+
+    :param pid: process id
+    :return: {'Rss': kB, 'Pss': kB, ...}
+    """
+    with open(f'/proc/{pid}/smaps_rollup') as fd:
+        lines = fd.read().splitlines()[1:]
+    return {line.split(':')[0]: int(line.split()[1]) for line in lines}
+
+
+def children(pid):
+    """
+    Get child processes.
+
+    :param pid: process id
+    :return: pids
+    """
+    with open(f'/proc/{pid}/task/{pid}/children') as fd:
+        return [int(child) for child in fd.read().split()]
+
+
+def wait_for_first_response(start):
+    """
+    Poll until the server responds.
+
+    :param start: perf_counter() of the server start
+    :return: seconds since the start
+    """
+    while perf_counter() - start < STARTUP_TIMEOUT:
+        try:
+            request()
+        except URLError:
+            sleep(STARTUP_POLL_INTERVAL)
+        else:
+            break
+    return perf_counter() - start
+
+
+def run(workers, requests, preload):
+    """
+    Measure a gunicorn deployment.
+
+    :param workers: number of workers
+    :param requests: number of requests to make before measuring memory
+    :param preload: preload the application in the master
+    :return: (time to first request, workers memory)
+    """
+    env = dict(
+        environ,
+        GUNICORN_BIND=f'127.0.0.1:{PORT}',
+        GUNICORN_WORKERS=str(workers),
+        GUNICORN_PRELOAD='true' if preload else 'false',
+    )
+    start = perf_counter()
+    master = Popen(  # noqa: S603
+        [
+            executable, '-m', 'gunicorn',
+            '--config', 'python:myapp.gunicorn_config',
+            'myapp.wsgi:application',
+        ],
+        env=env,
+        stdout=DEVNULL,
+        stderr=DEVNULL,
+    )
+    with ExitStack() as stack:
+        stack.callback(master.wait)
+        stack.callback(master.terminate)
+        first_request = wait_for_first_response(start)
+        for _ in range(requests):
+            request()
+        memory = [smaps_rollup(pid) for pid in children(master.pid)]
+    return first_request, memory
+
+
+def main():
+    """Run the benchmark."""
+    workers = int(argv[1]) if len(argv) > 1 else WORKERS
+    requests = int(argv[2]) if len(argv) > 2 else REQUESTS
+
+    echo(f'{workers} workers, {requests} requests; per worker memory, MB')
+    echo(HEADER.format('mode', 'first, s', 'RSS', 'PSS', 'private'))
+    for mode, preload in (('no preload', False), ('preload', True)):
+        first_request, memory = run(workers, requests, preload)
+        rss, pss, private = (
+            sum(worker[key] for worker in memory) / len(memory) / KB_PER_MB
+            for key in ('Rss', 'Pss', 'Private_Dirty')
+        )
+        echo(ROW.format(mode, first_request, rss, pss, private))
+
+
+if __name__ == '__main__':
+    main()
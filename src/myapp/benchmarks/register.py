@@ -0,0 +1,137 @@
+"""
+Registration: N single-user requests vs a bulk registration.
+
+The single-user path is measured with the Flask-Security default email
+hashing (sha256_crypt) and with the configured one; the users are deleted
+afterwards.
+
+Usage: python -m myapp.benchmarks.register [users]
+"""
+from contextlib import ExitStack
+from http import HTTPStatus
+from sys import argv
+from time import perf_counter
+
+from click import echo
+from flask import url_for
+from passlib.context import CryptContext
+
+from myapp import OutboxModel, UserModel, create_app, db, register_users
+
+USERS = 200
+PREFIX = 'register-benchmark'
+
+HEADER = '{0:<36}{1:>12}{2:>10}'
+ROW = '{0:<36}{1:>12.2f}{2:>10.1f}'
+
+
+def payloads(users, run):
+    """
+    Make the registration payloads.
+
+    :param users: number of users
+    :param run: run name; keeps the usernames unique across the runs
+    :return: RegisterRequestSchema-like items
+    """
+    return [
+        {
+            'username': f'{PREFIX}-{run}-{i}',
+            'email': f'{PREFIX}-{run}-{i}@example.com',
+            'password': f'password-{i}',
+        }
+        for i in range(users)
+    ]
+
+
+def single(app, items):
+    """
+    Register the users one request at a time.
+
+    :param app: flask application
+    :param items: payloads
+    :return: elapsed seconds
+    """
+    client = app.test_client()
+    with app.test_request_context():
+        url = url_for('auth.register')
+    start = perf_counter()
+    for item in items:
+        assert client.post(url, json=item).status_code == HTTPStatus.OK  # noqa: S101
+    return perf_counter() - start
+
+
+def bulk(app, items):
+    """
+    Register the users in bulk.
+
+    :param app: flask application
+    :param items: payloads
+    :return: elapsed seconds
+    """
+    with app.test_request_context():
+        start = perf_counter()
+        results = register_users(items)
+        elapsed = perf_counter() - start
+    assert all(result['status'] == 'created' for result in results)  # noqa: S101
+    return elapsed
+
+
+def cleanup(app):
+    """
+    Delete the registered users and their emails.
+
+    :param app: flask application
+    """
+    with app.app_context():
+        pattern = f'{PREFIX}-%'
+        OutboxModel.query.filter(OutboxModel.recipient.like(pattern)).delete(
+            synchronize_session=False,
+        )
+        UserModel.query.filter(UserModel.username.like(pattern)).delete(
+            synchronize_session=False,
+        )
+        db.session.commit()
+
+
+def run(app, users):
+    """
+    Register the users along every path.
+
+    :param app: flask application
+    :param users: number of users per path
+    :return: (path, elapsed seconds) pairs
+    """
+    security = app.extensions['security']
+    with ExitStack() as stack:
+        stack.callback(cleanup, app)
+        stack.callback(setattr, security, 'hashing_context', security.hashing_context)
+        configured_context = security.hashing_context
+        security.hashing_context = CryptContext(schemes=['sha256_crypt'])
+        legacy = single(app, payloads(users, 'legacy'))
+        security.hashing_context = configured_context
+        configured = single(app, payloads(users, 'single'))
+        # The hashing processes are started once per worker
+        bulk(app, payloads(1, 'warmup'))
+        bulked = bulk(app, payloads(users, 'bulk'))
+    return [
+        ('single, sha256_crypt email hash', legacy),
+        ('single, configured email hash', configured),
+        ('bulk', bulked),
+    ]
+
+
+def main():
+    """Run the benchmark."""
+    users = int(argv[1]) if len(argv) > 1 else USERS
+    app = create_app()
+    results = run(app, users)
+
+    workers = app.config['REGISTER_BULK_HASH_WORKERS']
+    echo(f'{users} users, {workers} hashing processes')
+    echo(HEADER.format('path', 'elapsed, s', 'users/s'))
+    for name, elapsed in results:
+        echo(ROW.format(name, elapsed, users / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Request validation: marshmallow Schema.load vs compiled loaders."""
+from importlib import import_module
+from inspect import getmembers
+from timeit import Timer
+
+from click import echo
+from marshmallow import ValidationError, fields
+
+from myapp.core import APICommonRequestSchema, APIRequestSchema, compile_schema
+
+SAMPLES = {
+    fields.Email: 'guy@example.com',
+    fields.String: 'value',
+    fields.Boolean: 'true',
+    fields.DateTime: '2020-01-01T00:00:00',
+    fields.Integer: '10',
+}
+
+NUMBER = 20000
+MICROSECONDS = 1e6
+
+HEADER = '{0:<36}{1:<10}{2:>18}{3:>16}{4:>10}'
+ROW = '{0:<36}{1:<10}{2:>18.2f}{3:>16.2f}{4:>9.1f}x'
+ROW_UNCOMPILED = '{0:<36}{1:<10}{2:>18.2f}{3:>16}'
+
+
+def sample(schema):
+    """
+    Make a valid payload for the schema.
+
+    :param schema: marshmallow schema
+    :return: payload
+    """
+    payload = {}
+    for name, field in schema.load_fields.items():
+        for field_class, value in SAMPLES.items():
+            if isinstance(field, field_class):
+                payload[field.data_key or name] = value
+                break
+    return payload
+
+
+def measure(load, payload):
+    """
+    Measure microseconds per load.
+
+    :param load: load function
+    :param payload: payload
+    :return: microseconds per call
+    """
+    def call():
+        try:
+            return load(payload)
+        except ValidationError as error:
+            return error.messages
+
+    return Timer(call).timeit(NUMBER) / NUMBER * MICROSECONDS
+
+
+def request_schemas():
+    """
+    Collect the request schemas.
+
+    :return: schema instances
+    """
+    schemas = [APICommonRequestSchema()]
+    for _, obj in getmembers(import_module('myapp.schemas')):
+        if isinstance(obj, type) and issubclass(obj, APIRequestSchema):
+            schemas.append(obj())
+    return schemas
+
+
+def main():
+    """Run the benchmark."""
+    echo(HEADER.format('schema', 'case', 'marshmallow, us', 'compiled, us', 'speedup'))
+    for schema in request_schemas():
+        name = type(schema).__name__
+        loader = compile_schema(schema)
+        valid = sample(schema)
+        cases = {'valid': valid, 'invalid': {**valid, 'unknown': 'x'}}
+        for case, payload in cases.items():
+            reference = measure(schema.load, payload)
+            if loader is None:
+                echo(ROW_UNCOMPILED.format(name, case, reference, 'n/a'))
+                continue
+            compiled = measure(loader.load, payload)
+            echo(ROW.format(name, case, reference, compiled, reference / compiled))
+
+
+if __name__ == '__main__':
+    main()
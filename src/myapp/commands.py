@@ -0,0 +1,153 @@
+"""MYAPP Flask CLI commands."""
+from logging import getLogger
+from time import sleep
+
+from click import ClickException, command, echo, open_file, option
+from flask import cli, current_app
+
+__all__ = [
+    'users_export',
+    'users_roles',
+    'roles_permissions',
+    'outbox_worker',
+]
+
+LOG = getLogger(__name__)
+
+
+@command(name='users-export')
+@option('--format', 'export_format', help='ndjson or csv', default='ndjson')
+@option('--output', help='filename; "-" for stdout', default='-')
+@option('--batch-size', help='rows per fetch', default=None, type=int)
+@cli.with_appcontext
+def users_export(export_format, output, batch_size):  # noqa: WPS216
+    """
+    Flask CLI users-export command.
+
+    :param export_format: ndjson or csv
+    :param output: output filename
+    :param batch_size: rows per fetch
+    """
+    from myapp import export_users  # noqa: WPS433
+
+    batch_size = batch_size or current_app.config['USERS_EXPORT_BATCH_SIZE']
+    with open_file(output, mode='w', encoding='utf8') as fd:
+        for chunk in export_users(export_format, batch_size):
+            fd.write(chunk)
+
+
+@command(name='users-roles')
+@option('--role', 'roles', help='role to assign; repeatable', multiple=True, required=True)
+@option('--username', 'usernames', help='filter by username; repeatable', multiple=True)
+@option('--active/--inactive', help='filter by the active flag', default=None)
+@option('--having-role', help='filter by a role the users have', default=None)
+@option('--all', 'all_users', help='match every user without a filter', is_flag=True, default=False)
+@option('--revoke', help='revoke instead of assign', is_flag=True, default=False)
+@cli.with_appcontext
+def users_roles(roles, usernames, active, having_role, all_users, revoke):  # noqa: WPS211, WPS216
+    """
+    Flask CLI users-roles command.
+
+    :param roles: role names
+    :param usernames: filter by usernames
+    :param active: filter by the active flag
+    :param having_role: filter by a role the users have
+    :param all_users: match every user without a filter
+    :param revoke: revoke instead of assign
+    :raises ClickException: on unknown roles or an empty filter
+    """
+    from myapp import APIError, assign_roles, revoke_roles  # noqa: WPS433
+
+    change = revoke_roles if revoke else assign_roles
+    try:
+        affected = change(
+            list(roles),
+            usernames=list(usernames),
+            active=active,
+            role=having_role,
+            all_users=all_users,
+        )
+    except APIError as error:
+        raise ClickException(error.metadata['message'])
+    action = 'Revoked' if revoke else 'Assigned'
+    echo(f'{action}: {affected}')
+
+
+@command(name='roles-permissions')
+@option(
+    '--permission',
+    'permissions',
+    help='permission to assign; repeatable',
+    multiple=True,
+    required=True,
+)
+@option('--role', 'roles', help='role to assign to; repeatable', multiple=True, required=True)
+@option('--revoke', help='revoke instead of assign', is_flag=True, default=False)
+@cli.with_appcontext
+def roles_permissions(permissions, roles, revoke):  # noqa: WPS216
+    """
+    Flask CLI roles-permissions command.
+
+    :param permissions: permission names
+    :param roles: role names
+    :param revoke: revoke instead of assign
+    :raises ClickException: on unknown roles or permissions
+    """
+    from myapp import APIError, assign_permissions, revoke_permissions  # noqa: WPS433
+
+    change = revoke_permissions if revoke else assign_permissions
+    try:
+        affected = change(list(permissions), list(roles))
+    except APIError as error:
+        raise ClickException(error.metadata['message'])
+    action = 'Revoked' if revoke else 'Assigned'
+    echo(f'{action}: {affected}')
+
+
+@command(name='outbox-worker')
+@option('--batch-size', help='emails per batch', default=None, type=int)
+@option('--once', help='deliver a single batch and exit', is_flag=True, default=False)
+@cli.with_appcontext
+def outbox_worker(batch_size, once):  # noqa: WPS216
+    """
+    Flask CLI outbox-worker command.
+
+    :param batch_size: emails per batch
+    :param once: deliver a single batch and exit
+    """
+    from myapp import db, deliver_outbox  # noqa: WPS433
+
+    config = current_app.config
+    batch_size = batch_size or config['OUTBOX_BATCH_SIZE']
+    if once:
+        deliver_outbox(batch_size)
+        return
+
+    errors = 0
+    while True:  # noqa: WPS457
+        try:
+            is_drained = _outbox_cycle(batch_size)
+        except Exception:
+            errors += 1
+            LOG.exception('Outbox worker failed; backing off.')
+            db.session.rollback()
+            sleep(min(
+                config['OUTBOX_POLL_INTERVAL'] * 2 ** errors,
+                config['OUTBOX_ERROR_BACKOFF_MAX'],
+            ))
+        else:
+            errors = 0
+            if is_drained:
+                sleep(config['OUTBOX_POLL_INTERVAL'])
+
+
+def _outbox_cycle(batch_size):
+    # True when there's nothing left to deliver; the spare time goes to pruning
+    from myapp import deliver_outbox, prune_outbox  # noqa: WPS433
+
+    sent, failed = deliver_outbox(batch_size)
+    # A full batch means there's probably more
+    if sent + failed < batch_size:
+        prune_outbox(batch_size)
+        return True
+    return False
@@ -1,27 +1,31 @@
 """MYAPP configuration utilities."""
+from contextvars import ContextVar
 from dataclasses import asdict, dataclass, field
 from datetime import timedelta
-from os import environ
+from itertools import count
+from os import cpu_count, environ, getpid, register_at_fork, urandom
 from sys import stderr
 from pathlib import PosixPath
 from importlib import import_module
 from inspect import getmembers, isclass
-from uuid import uuid4
 from logging import Filter
 from typing import MutableMapping, Sequence
+from warnings import warn
 
 from apispec import APISpec
 from apispec.ext.marshmallow import MarshmallowPlugin
 from apispec_webframeworks.flask import FlaskPlugin
 from marshmallow import Schema
 from click import command, option
-from flask import cli, current_app, has_request_context, request
+from flask import cli, current_app
 from yaml import FullLoader, load as yaml_load
 
 __all__ = [
     'APIConfig',
     'open_api_dump',
     'open_api_check',
+    'connection_id_var',
+    'next_connection_id',
 ]
 
 
@@ -144,6 +148,15 @@ class APIConfig:
         ),
     )
     SECURITY_PASSWORD_SALT: str = field(default=environ.get('SECRET_SALT'))
+    # The confirmation tokens bind the email by a hash inside a signed token, so a
+    # fast hash does; the default sha256_crypt (~0.2s) outweighed the password hash.
+    # It stays deprecated to verify the tokens issued before
+    SECURITY_HASHING_SCHEMES: Sequence[str] = field(
+        default_factory=lambda: ['hex_sha256', 'sha256_crypt', 'hex_md5'],
+    )
+    SECURITY_DEPRECATED_HASHING_SCHEMES: Sequence[str] = field(
+        default_factory=lambda: ['sha256_crypt', 'hex_md5'],
+    )
     # no forms so no concept of flashing
     SECURITY_FLASH_MESSAGES: bool = False
 
@@ -201,15 +214,139 @@ class APIConfig:
     SQLALCHEMY_ENGINE_OPTIONS: MutableMapping = field(
         default_factory=lambda: {'isolation_level': 'READ_COMMITTED'},
     )
+    SQLALCHEMY_BINDS: MutableMapping = field(default_factory=dict)
+    # SQLite profile for single-node deployments, e.g. sqlite:////var/lib/myapp/myapp.db;
+    # see myapp.lib.database.APISQLAlchemy.apply_driver_hacks
+    SQLITE_PRAGMAS: MutableMapping = field(default_factory=lambda: {
+        'journal_mode': 'wal',
+        'synchronous': 'normal',  # with WAL, a power loss may lose the last commits only
+        'busy_timeout': 5000,  # milliseconds a writer waits for the lock
+        'cache_size': -64 * 2 ** 10,  # KiB per connection
+        'mmap_size': 256 * 2 ** 20,
+        'temp_store': 'memory',
+        'foreign_keys': 'on',
+    })
+    # Read replicas (keys of SQLALCHEMY_BINDS); see myapp.lib.database.RoutingSession
+    SQLALCHEMY_REPLICA_BINDS: Sequence[str] = field(default_factory=list)
+    # round_robin or least_loaded
+    SQLALCHEMY_REPLICA_SELECTION: str = 'round_robin'
+    # Seconds a user reads from the primary after a write
+    SQLALCHEMY_REPLICA_STICKINESS: int = 5
+    # The sticky users; use a store the workers share, e.g.
+    # myapp.lib.database.RedisStickyBackend, with more than one worker
+    SQLALCHEMY_STICKY_BACKEND: str = 'myapp.lib.responses.LRUCacheBackend'
+    SQLALCHEMY_STICKY_OPTIONS: MutableMapping = field(
+        default_factory=lambda: {'max_entries': 10000},
+    )
+    # Connections quotas by endpoint or blueprint name, e.g.
+    # {'users.export': {'connections': 2, 'timeout': 5}}; see myapp.lib.database.Bulkhead
+    SQLALCHEMY_BULKHEADS: MutableMapping = field(default_factory=lambda: {
+        'users.export': {'connections': 2, 'timeout': 5},
+        'auth.register_bulk': {'connections': 2, 'timeout': 5},
+    })
+    # Database circuit breaker; see myapp.lib.database.CircuitBreaker
+    DB_BREAKER_ENABLED: bool = True
+    DB_BREAKER_WINDOW: int = 10  # seconds
+    DB_BREAKER_MIN_CALLS: int = 20
+    DB_BREAKER_FAILURE_RATE: float = 0.5
+    DB_BREAKER_SLOW_CALL: float = 5.0  # seconds; slower calls count as failures
+    DB_BREAKER_OPEN_SECONDS: int = 5
+    DB_BREAKER_PROBES: int = 3
 
     DEBUG_TB_ENABLED: bool = True
 
+    # Bulk registration; see myapp.services.registration.register_users
+    REGISTER_BULK_MAX_ITEMS: int = 5000
+    REGISTER_BULK_CHUNK_SIZE: int = 500
+    # Password hashing processes; more than the cores only add overhead, and
+    # with one the hashing runs in the calling thread
+    REGISTER_BULK_HASH_WORKERS: int = field(default=cpu_count() or 1)
+
+    # Batch endpoint; see myapp.services.batch.dispatch_batch
+    BATCH_MAX_REQUESTS: int = 20
+    BATCH_THREADS: int = 4
+
+    # Users export; see myapp.services.users.export_users
+    USERS_EXPORT_BATCH_SIZE: int = 1000
+
+    # Idempotency-Key responses; see myapp.lib.idempotency.idempotent
+    # A store of their own: an evicted record lets a retry run the request again
+    IDEMPOTENCY_BACKEND: str = 'myapp.lib.responses.LRUCacheBackend'
+    IDEMPOTENCY_OPTIONS: MutableMapping = field(default_factory=lambda: {'max_entries': 65536})
+    IDEMPOTENCY_TTL: int = 24 * 3600
+    IDEMPOTENCY_WAIT_TIMEOUT: float = 30.0
+
+    # SMTP for the outbox worker; see myapp.services.outbox
+    MAIL_SERVER: str = field(default=environ.get('MAIL_SERVER', 'localhost'))
+    MAIL_PORT: int = field(default=int(environ.get('MAIL_PORT', 25)))
+    MAIL_USE_TLS: bool = False
+    MAIL_USERNAME: str = field(default=environ.get('MAIL_USERNAME'))
+    MAIL_PASSWORD: str = field(default=environ.get('MAIL_PASSWORD'))
+    MAIL_DEFAULT_SENDER: str = 'noreply@myapp.local'
+    MAIL_TIMEOUT: float = 10.0
+    OUTBOX_BATCH_SIZE: int = 100
+    OUTBOX_POLL_INTERVAL: float = 1.0
+    OUTBOX_MAX_ATTEMPTS: int = 8
+    # Retry delay doubles from OUTBOX_BACKOFF up to OUTBOX_BACKOFF_MAX seconds
+    OUTBOX_BACKOFF: int = 30
+    OUTBOX_BACKOFF_MAX: int = 3600
+    # A claimed batch is retried by another worker after OUTBOX_LEASE seconds
+    OUTBOX_LEASE: int = 300
+    # Sent emails are deleted after OUTBOX_RETENTION seconds
+    OUTBOX_RETENTION: int = 7 * 24 * 3600
+    # The worker's delay after an error doubles up to OUTBOX_ERROR_BACKOFF_MAX seconds
+    OUTBOX_ERROR_BACKOFF_MAX: float = 60.0
+
+    # Login tracking and auth events; see myapp.lib.write_behind.WriteBehindBuffer
+    WRITE_BEHIND_INTERVAL: float = 1.0
+    WRITE_BEHIND_MAX_SIZE: int = 1000
+
+    # Response cache; see myapp.lib.responses.cached
+    CACHE_ENABLED: bool = True
+    CACHE_BACKEND: str = 'myapp.lib.responses.LRUCacheBackend'
+    CACHE_OPTIONS: MutableMapping = field(default_factory=lambda: {'max_entries': 1024})
+    CACHE_DEFAULT_TTL: int = 60
+    # Seconds a request waits for an identical one in flight; see myapp.lib.responses.coalesced
+    COALESCE_WAIT_TIMEOUT: float = 10.0
+
+    # Load shedding by view priority; see myapp.lib.admission.AdmissionController
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_QUEUE_START_HEADER: str = 'X-Request-Start'
+    # Seconds in the upstream queue; priorities not listed are never shed
+    ADMISSION_QUEUE_BUDGET: MutableMapping = field(
+        default_factory=lambda: {'high': 5.0, 'normal': 2.0, 'low': 0.5},
+    )
+    ADMISSION_MAX_CONCURRENCY: int = 64
+    # Shares of ADMISSION_MAX_CONCURRENCY a priority may take
+    ADMISSION_CONCURRENCY_SHARE: MutableMapping = field(
+        default_factory=lambda: {'high': 1.0, 'normal': 0.8, 'low': 0.5},
+    )
+
+    # Probes; see myapp.lib.health.HealthMiddleware
+    HEALTH_LIVENESS_PATH: str = '/healthz'
+    HEALTH_READINESS_PATH: str = '/readyz'
+    HEALTH_READY_CACHE_TTL: float = 1.0
+
+    # Inbound correlation ID header; it's generated when absent and echoed back
+    CONNECTION_ID_HEADER: str = 'X-Connection-ID'
+
+    # Exception logging; see myapp.lib.logs.ExceptionLogPolicy
+    EXCEPTION_LOG_EXPECTED_SAMPLE: int = 1  # log every Nth client error per endpoint and type
+    EXCEPTION_LOG_TRACEBACKS_PER_WINDOW: int = 5  # per fingerprint
+    EXCEPTION_LOG_WINDOW: int = 60  # seconds
+
     # API
     TRACEBACK_ENABLED: bool = True
     TRACEBACK_TAIL_LENGTH: int = 15
     JSON_ENSURE_ASCII: bool = False
     JSON_SORT_KEYS: bool = True
     JSON_INDENT: int = 4
+    # Accept and Content-Type alternatives to JSON; see myapp.lib.encoding.negotiate_codec
+    BINARY_CODECS: Sequence[str] = field(default_factory=lambda: [
+        'application/msgpack',
+        'application/x-msgpack',
+        'application/cbor',
+    ])
 
     LOGGING: dict = field(default_factory=lambda: {
         'version': 1,
@@ -221,12 +358,14 @@ class APIConfig:
                 'style': '{',
                 'class': 'logging.Formatter',
             },
+            # Point a handler's formatter here for JSON lines
+            'json': {
+                '()': 'myapp.lib.logs.JSONLogFormatter',
+            },
         },
         'filters': {
             'connection_id_filter': {
                 '()': 'myapp.config.ConnectionIDLoggingFilter',
-                'connection_id_header': 'X-Connection-ID',
-                'is_generate_if_not_set': True,
             },
         },
         'handlers': {
@@ -292,29 +431,49 @@ class APIConfig:
 
 
 # ------------------------TOP LEVEL SETTINGS AND HELPERS------------------------
-class ConnectionIDLoggingFilter(Filter):
-    def __init__(
-        self,
-        connection_id_header='X-Connection-ID',
-        is_generate_if_not_set=True,
-    ):
-        super().__init__()
-        self.connection_id_header = connection_id_header
-        self.is_generate_if_not_set = is_generate_if_not_set
+# Set once per request by myapp.lib.logs.assign_connection_id
+connection_id_var = ContextVar('connection_id', default='X')
 
-    def filter(self, record):  # noqa: WPS125
-        connection_id = None
-        if has_request_context():
-            connection_id = getattr(request, 'connection_id', None)
-            if not connection_id:
-                connection_id = request.headers.get(self.connection_id_header)
 
-            if not connection_id and self.is_generate_if_not_set:
-                connection_id = uuid4()
+class _ConnectionIDGenerator:
+    """Cheap unique IDs: a random per-process prefix and a counter."""
 
-            request.connection_id = connection_id
+    def __init__(self):
+        self.reset()
 
-        record.connection_id = str(connection_id or 'X')
+    def __call__(self):
+        return f'{self.prefix}-{next(self.counter):x}'
 
+    def reset(self):
+        self.prefix = urandom(4).hex() + format(getpid(), 'x')
+        self.counter = count(1)
+
+
+next_connection_id = _ConnectionIDGenerator()
+register_at_fork(after_in_child=next_connection_id.reset)
+
+
+class ConnectionIDLoggingFilter(Filter):
+    """
+    Put the request correlation ID on the log records.
+
+    The connection_id_header and is_generate_if_not_set arguments are accepted
+    for the existing LOGGING configs but ignored: the header is the
+    CONNECTION_ID_HEADER setting and an absent ID is always generated.
+    """
+
+    def __init__(self, connection_id_header=None, is_generate_if_not_set=None):
+        super().__init__()
+        if connection_id_header is not None or is_generate_if_not_set is not None:
+            warn(
+                'The ConnectionIDLoggingFilter arguments are ignored; set CONNECTION_ID_HEADER.',
+                DeprecationWarning,
+                stacklevel=2,
+            )
+
+    def filter(self, record):  # noqa: WPS125
+        record.connection_id = connection_id_var.get()
         return True
+
+
 # ------------------------TOP LEVEL SETTINGS AND HELPERS------------------------
@@ -1,45 +1,216 @@
 """MYAPP Core application logic."""
+from collections.abc import Mapping
 from json import (
     JSONDecoder,
     JSONEncoder,
     loads as _json_loads,
 )
-from logging import getLogger
 from pathlib import PosixPath
 from http import HTTPStatus
+from weakref import WeakKeyDictionary
 
-from flask import Blueprint, current_app, request, Response
+from flask import Blueprint, current_app, request
 from flask.views import MethodView
 from webargs.flaskparser import FlaskParser
-from marshmallow import Schema, fields, pre_dump, RAISE, EXCLUDE
+from webargs.multidictproxy import MultiDictProxy
+from werkzeug.datastructures import MultiDict
+from marshmallow import (
+    Schema,
+    ValidationError,
+    fields,
+    missing,
+    pre_dump,
+    validate,
+    RAISE,
+    EXCLUDE,
+)
 
 __all__ = [
     'APP_PATH',
     'APIMethodView',
     'APIBlueprint',
     'APIError',
+    'CannedError',
     'APIRequestSchema',
     'APIResponseSchema',
     'APIMetadataSchema',
     'JSONEncoder',
     'JSONDecoder',
+    'compile_schema',
     'json_dump',
     'json_dumps',
     'json_loads',
     'parse',
-    'log_request',
-    'log_response',
+    'sparse_schema',
+    'is_field_requested',
 ]
 
-LOG = getLogger(__name__)
-
 # ----------------------------------CONSTANTS----------------------------------
 APP_PATH = PosixPath(__file__).parent
 # ----------------------------------CONSTANTS----------------------------------
 
 
 # -------------------------------WEBARGS SETTINGS-------------------------------
+class CompiledSchemaLoader:
+    """
+    Fast loader for flat request schemas; it's generated once per schema.
+
+    It skips the generic marshmallow machinery (hooks, error stores, partial
+    loading) and produces the same data and the same error messages as the
+    Schema.load does. Schemas with hooks, nested or custom fields aren't
+    compilable and are loaded by marshmallow.
+    """
+
+    COMPILABLE_FIELDS = frozenset((
+        fields.String,
+        fields.Email,
+        fields.Boolean,
+        fields.DateTime,
+        fields.Integer,
+    ))
+
+    def __init__(self, schema: Schema):
+        """
+        Compile a schema.
+
+        :param schema: marshmallow schema
+        """
+        self.plan = []
+        for attr_name, field in schema.load_fields.items():
+            data_key = field.data_key if field.data_key is not None else attr_name
+            # Subclasses may override the deserialization, so the class is matched exactly
+            is_plain_string = type(field) is fields.String  # noqa: WPS516
+            is_plain_string = is_plain_string and not field.validators
+            self.plan.append((data_key, field.attribute or attr_name, field, is_plain_string))
+
+        self.known_keys = frozenset(step[0] for step in self.plan)
+        self.is_raise = schema.unknown == RAISE
+        self.unknown_message = schema.error_messages['unknown']
+        self.type_message = schema.error_messages['type']
+        self.dict_class = schema.dict_class
+
+    @classmethod
+    def is_compilable(cls, schema: Schema):
+        """
+        Check the schema can be compiled.
+
+        :param schema: marshmallow schema
+        :return: is compilable
+        """
+        if schema.many or schema.partial or schema.unknown not in {RAISE, EXCLUDE}:
+            return False
+        if any(schema._hooks.values()):  # noqa: WPS437
+            return False
+        return all(
+            # Subclasses may override the deserialization, so the class is matched exactly
+            type(field) in cls.COMPILABLE_FIELDS  # noqa: WPS516
+            and '.' not in (field.attribute or '')
+            for field in schema.load_fields.values()
+        )
+
+    def load(self, data):
+        """
+        Load data.
+
+        :param data: location data
+        :return: loaded data
+        :raises ValidationError: on invalid data
+        """
+        if not isinstance(data, Mapping):
+            raise ValidationError({'_schema': [self.type_message]})
+
+        loaded = self.dict_class()
+        errors = {}
+        for data_key, attribute, field, is_plain_string in self.plan:
+            raw_value = data.get(data_key, missing)
+            if is_plain_string and raw_value.__class__ is str:
+                loaded[attribute] = raw_value
+                continue
+
+            try:
+                value = field.deserialize(raw_value, data_key, data)
+            except ValidationError as error:
+                errors[data_key] = error.messages
+                continue
+
+            if value is not missing:
+                loaded[attribute] = value
+
+        if self.is_raise:
+            for key in data.keys() - self.known_keys:
+                errors[key] = [self.unknown_message]
+
+        if errors:
+            raise ValidationError(errors)
+
+        return loaded
+
+
+_compiled_loaders = WeakKeyDictionary()
+
+
+def compile_schema(schema: Schema):
+    """
+    Get a compiled loader for the schema; it's generated once.
+
+    :param schema: marshmallow schema
+    :return: compiled loader or None if the schema isn't compilable
+    """
+    loader = _compiled_loaders.get(schema)
+    if loader is None:
+        loader = False
+        if CompiledSchemaLoader.is_compilable(schema):
+            loader = CompiledSchemaLoader(schema)
+        _compiled_loaders[schema] = loader
+    return loader or None
+
+
 class APIRequestParser(FlaskParser):
+    def use_args(self, argmap, *args, **kwargs):
+        # Compile at import time, i.e. once in a preloading master process
+        if isinstance(argmap, Schema):
+            compile_schema(argmap)
+        return super().use_args(argmap, *args, **kwargs)
+
+    def parse(  # noqa: WPS211
+        self,
+        argmap,
+        req=None,
+        *,
+        location=None,
+        validate=None,
+        error_status_code=None,
+        error_headers=None,
+    ):
+        loader = None
+        if isinstance(argmap, Schema) and validate is None:
+            loader = compile_schema(argmap)
+
+        if loader is None:
+            return super().parse(
+                argmap,
+                req,
+                location=location,
+                validate=validate,
+                error_status_code=error_status_code,
+                error_headers=error_headers,
+            )
+
+        req = req if req is not None else self.get_default_request()
+        location = location or self.location
+        try:
+            location_data = self._load_location_data(schema=argmap, req=req, location=location)
+            return loader.load(location_data)
+        except ValidationError as error:
+            self._on_validation_error(
+                error,
+                req,
+                argmap,
+                location,
+                error_status_code=error_status_code,
+                error_headers=error_headers,
+            )
+
     def handle_error(self, error, req, schema, *, error_status_code, error_headers):
         raise APIError(
             'The request specification is invalid; check OpenAPI docs for more info.',
@@ -50,6 +221,34 @@ class APIRequestParser(FlaskParser):
     def parse_files(self, req, name, field):
         raise NotImplementedError
 
+    def _raw_load_json(self, req):
+        codecs = current_app.extensions.get('codecs')
+        codec = codecs.get(req.mimetype) if codecs is not None else None
+        if codec is None:
+            return super()._raw_load_json(req)
+
+        data = req.get_data(cache=True)
+        if not data:
+            return missing
+        try:
+            return codec.loads(data)
+        except ValueError as error:  # msgpack and cbor2 decoding errors are ValueErrors
+            return self._handle_invalid_json_error(error, req)
+
+    def _load_location_data(self, *, schema, req, location):
+        data = super()._load_location_data(schema=schema, req=req, location=location)
+        # The common parameters are for every view; the views' strict schemas shouldn't see them
+        if location != 'query' or isinstance(schema, APICommonRequestSchema):
+            return data
+        if COMMON_QUERY_KEYS.isdisjoint(req.args.keys()):
+            return data
+        args = MultiDict(
+            (key, value)
+            for key, value in req.args.items(multi=True)
+            if key not in COMMON_QUERY_KEYS
+        )
+        return MultiDictProxy(args, schema)
+
 
 parser = APIRequestParser()
 parse = parser.use_args
@@ -66,6 +265,15 @@ class APIRequestSchema(Schema):
         unknown = RAISE
 
 
+SPARSE_FIELDS_PATH = r'[A-Za-z_]\w*(\.[A-Za-z_]\w*)*'
+SPARSE_FIELDS_PATTERN = rf'^{SPARSE_FIELDS_PATH}(,{SPARSE_FIELDS_PATH})*$'
+SPARSE_FIELDS_MAX_LENGTH = 1024
+# The response headers and cookies are taken from the metadata
+SPARSE_FIELDS_REQUIRED = ('metadata.status', 'metadata.headers', 'metadata.cookies')
+SPARSE_SCHEMAS_MAX = 1024
+_sparse_schemas = {}
+
+
 class APICommonRequestSchema(Schema):
     """MYAPP common request parameters."""
 
@@ -78,6 +286,25 @@ class APICommonRequestSchema(Schema):
         required=False,
         default=False,
     )
+    sparse_fields = fields.String(
+        required=False,
+        data_key='fields',
+        validate=[
+            validate.Length(max=SPARSE_FIELDS_MAX_LENGTH),
+            validate.Regexp(SPARSE_FIELDS_PATTERN),
+        ],
+        description=(
+            'Comma separated dotted paths of the response fields to keep, e.g. '
+            + '"data.access_token,metadata.status"; top level fields that are not '
+            + 'mentioned are kept whole.'
+        ),
+    )
+
+
+COMMON_QUERY_KEYS = frozenset(
+    field.data_key or name
+    for name, field in APICommonRequestSchema._declared_fields.items()  # noqa: WPS437
+)
 
 
 class APIResponseSchema(Schema):
@@ -126,7 +353,7 @@ class APIResponseSchema(Schema):
         metadata = self.default_metadata()
 
         response_metadata = response.get('metadata', {})
-        for field in 'status', 'message', 'headers', 'errors', 'details':
+        for field in 'status', 'message', 'headers', 'errors', 'details', 'next_cursor':
             if field in response_metadata:
                 metadata[field] = response_metadata[field]
 
@@ -163,6 +390,67 @@ class APIMetadataSchema(Schema):
         allow_none=True,
         default=None,
     )
+    next_cursor = fields.String(
+        required=False,
+        allow_none=True,
+        description='Opaque cursor of the next page; null on the last page.',
+    )
+
+
+def _bind_nested(schema):
+    for field in schema.fields.values():
+        field = getattr(field, 'inner', field)
+        if isinstance(field, fields.Nested):
+            _bind_nested(field.schema)
+
+
+def sparse_schema(schema: Schema, paths):
+    """
+    Get a copy of the response schema pruned to the paths; made once per schema class and paths.
+
+    :param schema: response schema
+    :param paths: sorted tuple of dotted paths
+    :return: pruned schema
+    :raises ValueError: on unknown fields
+    """
+    key = (type(schema), paths)
+    pruned = _sparse_schemas.get(key)
+    if pruned is None:
+        only = set(paths)
+        pruned_top = {path.split('.', 1)[0] for path in paths}
+        only.update(name for name in schema.fields if name not in pruned_top)
+        for path in SPARSE_FIELDS_REQUIRED:
+            top, _, name = path.partition('.')
+            nested = getattr(schema.fields.get(top), 'schema', None)
+            if top in pruned_top and name in getattr(nested, 'fields', ()):
+                only.add(path)
+
+        pruned = type(schema)(only=only)
+        _bind_nested(pruned)
+        if len(_sparse_schemas) < SPARSE_SCHEMAS_MAX:
+            _sparse_schemas[key] = pruned
+    return pruned
+
+
+def is_field_requested(path):
+    """
+    Check the response field is requested by the fields= parameter; e.g. to skip loading it.
+
+    :param path: dotted path, e.g. "data.users.roles"
+    :return: is requested
+    """
+    paths = getattr(request, 'sparse_fields', None)
+    if not paths:
+        return True
+
+    top = path.split('.', 1)[0]
+    if not any(requested.split('.', 1)[0] == top for requested in paths):
+        return True
+
+    return any(
+        requested == path or path.startswith(requested + '.') or requested.startswith(path + '.')
+        for requested in paths
+    )
 # --------------------------------SERIALIZATION--------------------------------
 
 
@@ -243,45 +531,55 @@ def json_loads(string, **kwargs):
 
 
 class APIMethodView(MethodView):
-    """API Method View."""
+    """
+    API Method View.
+
+    `priority` is the admission priority under overload; see AdmissionController.
+    `batchable` views may be called as batch sub-requests; see dispatch_batch.
+    The `fields=` common parameter is validated against `schema`; see sparse_schema.
+    """
+
+    priority = 'normal'
+    batchable = True
 
     decorators = (
         parse(APICommonRequestSchema(), location='query'),
     )
 
+    def dispatch_request(self, *args, **kwargs):
+        """
+        Dispatch request; the `fields=` common parameter is checked first.
 
-class APIBlueprint(Blueprint):
-    """API Blueprint."""
-
-
-def log_request():
-    """Log request in curl-based fashion."""
-    msg = fr"curl -w '\n' -iX {request.method} '{request.url}' "
-    msg += ''.join(f"-H '{h}:{v}' " for h, v in request.headers.items())
-    if (
-        request.method in {'POST', 'PUT', 'PATCH'}
-        and request.headers.get('Content-Type') == 'application/json'
-    ):
-        msg += f"-d '{request.data.decode('utf8')}'"
-    LOG.info(msg)
-
+        :param args: view args
+        :param kwargs: view kwargs
+        :return: view return value
+        """
+        common = args[0] if args and isinstance(args[0], Mapping) else {}
+        if common.get('sparse_fields'):
+            paths = tuple(sorted(set(common['sparse_fields'].split(','))))
+            schema = getattr(self, 'schema', None)
+            if isinstance(schema, Schema):
+                try:
+                    sparse_schema(schema, paths)
+                except ValueError as error:
+                    raise APIError(
+                        f'Bad request: invalid fields; {error}',
+                        metadata={'status': HTTPStatus.BAD_REQUEST},
+                        http_status=HTTPStatus.BAD_REQUEST,
+                    )
+            request.sparse_fields = paths
+
+        return super().dispatch_request(*args, **kwargs)
 
-def log_response(response: Response):
-    """
-    Log response json.
 
-    :param response: flask response
-    :return: flask response
-    """
-    if response.is_json:
-        LOG.info(f'Response: {response.json}')
-    return response
+class APIBlueprint(Blueprint):
+    """API Blueprint."""
 # ------------------------FLASK AND APPLICATION GENERICS------------------------
 
 
 # ---------------------------EXCEPTIONS AND MESSAGES---------------------------
 class APIError(Exception):
-    """Base API Exception."""
+    """Base API Exception; the response json is dumped on demand."""
 
     def __init__(self, *args, **kwargs):
         """
@@ -290,13 +588,53 @@ class APIError(Exception):
         :param args: any
         :param kwargs: any
         """
-        schema = kwargs.pop('schema', APIResponseSchema())
-        data = kwargs.pop('data', {})
-        metadata = kwargs.pop('metadata', {})
-        metadata.setdefault('message', 'Error' if not args else args[0])
-        metadata.setdefault('status', 3)
-        self.json = schema.dump({'data': data, 'metadata': metadata})
+        self.schema = kwargs.pop('schema', None)
+        self.data = kwargs.pop('data', {})
+        self.metadata = kwargs.pop('metadata', {})
+        self.metadata.setdefault('message', 'Error' if not args else args[0])
+        self.metadata.setdefault('status', 3)
         self.http_status = kwargs.pop('http_status', HTTPStatus.OK)
+        self._json = None
 
         super().__init__(*args)
+
+    @property
+    def json(self):
+        """
+        Dump the response json.
+
+        :return: response json
+        """
+        if self._json is None:
+            schema = self.schema or APIResponseSchema()
+            self._json = schema.dump({'data': self.data, 'metadata': self.metadata})
+        return self._json
+
+
+class CannedError(APIError):
+    """
+    API Exception with a static response.
+
+    The response is built once per app and canned_key (see
+    CannedResponses); raising and handling it involves neither the schema
+    nor the JSON encoding.
+    """
+
+    message = 'Error'
+    status = 3
+    http_status = HTTPStatus.OK
+
+    def __init__(self, headers=None):
+        """
+        Initialize canned API exception.
+
+        :param headers: static response headers
+        """
+        headers = headers or {}
+        super().__init__(
+            self.message,
+            metadata={'status': self.status, 'headers': headers},
+            http_status=self.http_status,
+        )
+        self.canned_key = (type(self), *sorted(headers.items()))
 # ---------------------------EXCEPTIONS AND MESSAGES---------------------------
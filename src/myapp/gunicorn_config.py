@@ -0,0 +1,63 @@
+"""
+MYAPP gunicorn configuration; requires the "production" extra.
+
+Usage: gunicorn --config python:myapp.gunicorn_config myapp.wsgi:application
+
+The application is created and warmed up once in the master (preload_app).
+The master's heap is frozen out of the garbage collector's reach before
+forking, so workers keep sharing its pages copy-on-write.
+"""
+import gc
+from multiprocessing import cpu_count
+from os import environ
+
+bind = environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(environ.get('GUNICORN_WORKERS', cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(environ.get('GUNICORN_THREADS', 4))
+timeout = int(environ.get('GUNICORN_TIMEOUT', '30'))
+max_requests = int(environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+preload_app = environ.get('GUNICORN_PRELOAD', 'true') == 'true'
+
+if preload_app:
+    # A collection in the master would touch every object's header
+    gc.disable()
+
+
+def pre_fork(server, worker):
+    """
+    Prepare the master's state to be inherited by a worker.
+
+    :param server: gunicorn arbiter
+    :param worker: gunicorn worker
+    """
+    if preload_app:
+        from myapp.wsgi import application  # noqa: WPS433
+        from myapp import dispose_engines  # noqa: WPS433
+
+        dispose_engines(application)
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    """
+    Initialize a worker.
+
+    :param server: gunicorn arbiter
+    :param worker: gunicorn worker
+    """
+    gc.enable()
+
+
+def worker_exit(server, worker):
+    """
+    Flush the write-behind buffers of an exiting worker and stop its hashing processes.
+
+    :param server: gunicorn arbiter
+    :param worker: gunicorn worker
+    """
+    from myapp import WriteBehindBuffer, hash_pool  # noqa: WPS433
+
+    WriteBehindBuffer.flush_all()
+    hash_pool.shutdown()
@@ -1 +1,10 @@
 """MYAPP library functions and helpers."""
+from myapp.lib.metrics import *
+from myapp.lib.encoding import *
+from myapp.lib.responses import *
+from myapp.lib.admission import *
+from myapp.lib.database import *
+from myapp.lib.idempotency import *
+from myapp.lib.logs import *
+from myapp.lib.pagination import *
+from myapp.lib.write_behind import *
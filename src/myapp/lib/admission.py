@@ -0,0 +1,127 @@
+"""Load shedding by view priority."""
+from http import HTTPStatus
+from threading import Lock
+from time import time
+
+from flask import current_app, request
+
+from myapp.core import CannedError
+from myapp.lib.metrics import metrics
+
+__all__ = [
+    'AdmissionController',
+    'OverloadedError',
+    'admission',
+]
+
+# Timestamps above these are in microseconds and milliseconds respectively
+MICROSECONDS_SINCE_EPOCH = 1e14
+MILLISECONDS_SINCE_EPOCH = 1e11
+MICROSECONDS = 1e6
+MILLISECONDS = 1e3
+
+
+class OverloadedError(CannedError):
+    """The request is shed by the admission control."""
+
+    message = 'Service Unavailable: the service is overloaded; retry later.'
+    status = HTTPStatus.SERVICE_UNAVAILABLE
+    http_status = HTTPStatus.SERVICE_UNAVAILABLE
+
+    def __init__(self):
+        """Initialize exception."""
+        super().__init__(headers={'Retry-After': '1'})
+
+
+class AdmissionController:
+    """
+    Load shedding by queue time and in-process concurrency.
+
+    A request is rejected early with 503 when the time it spent in the
+    upstream queue (ADMISSION_QUEUE_START_HEADER, e.g. nginx's
+    "X-Request-Start: t=${msec}") exceeds the budget of its view priority, or
+    when the in-flight requests exceed the priority's share of
+    ADMISSION_MAX_CONCURRENCY. Priorities without a budget or a share (e.g.
+    "critical") are never shed.
+    """
+
+    def __init__(self):
+        """Initialize controller."""
+        self._lock = Lock()
+        self.in_flight = 0
+
+    @staticmethod
+    def queue_time(value):
+        """
+        Parse the queue start header into seconds spent in the queue.
+
+        :param value: "t=1609459200.123", seconds, milliseconds or microseconds
+        :return: seconds; None if malformed
+        """
+        try:
+            started_at = float(value[2:] if value.startswith('t=') else value)
+        except ValueError:
+            return None
+        if started_at > MICROSECONDS_SINCE_EPOCH:
+            started_at /= MICROSECONDS
+        elif started_at > MILLISECONDS_SINCE_EPOCH:
+            started_at /= MILLISECONDS
+        return max(time() - started_at, 0)
+
+    @staticmethod
+    def priority():
+        """
+        Get the priority of the requested view.
+
+        :return: priority
+        """
+        view = current_app.view_functions.get(request.endpoint)
+        return getattr(getattr(view, 'view_class', None), 'priority', 'normal')
+
+    def admit(self):
+        """
+        Admit the request or shed it.
+
+        :raises OverloadedError: when shed
+        """
+        config = current_app.config
+        if not config['ADMISSION_ENABLED']:
+            return
+
+        priority = self.priority()
+        reason = None
+
+        budget = config['ADMISSION_QUEUE_BUDGET'].get(priority)
+        queue_start = request.headers.get(config['ADMISSION_QUEUE_START_HEADER'])
+        if budget is not None and queue_start:
+            queue_time = self.queue_time(queue_start)
+            if queue_time is not None and queue_time > budget:
+                reason = 'queue_time'
+
+        share = config['ADMISSION_CONCURRENCY_SHARE'].get(priority)
+        with self._lock:
+            if reason is None and share is not None:
+                if self.in_flight >= config['ADMISSION_MAX_CONCURRENCY'] * share:
+                    reason = 'concurrency'
+            if reason is None:
+                self.in_flight += 1
+                request.admitted = True
+            metrics.gauge('admission.in_flight', self.in_flight)
+
+        if reason is not None:
+            metrics.incr(
+                'admission.shed',
+                endpoint=request.endpoint,
+                priority=priority,
+                reason=reason,
+            )
+            raise OverloadedError()
+
+    def release(self, _=None):
+        """Count the admitted request out."""
+        if getattr(request, 'admitted', False):
+            with self._lock:
+                self.in_flight -= 1
+
+
+admission = AdmissionController()
@@ -0,0 +1,554 @@
+"""Flask-SQLAlchemy with read replicas, circuit breakers and bulkheads."""
+from contextlib import ExitStack
+from http import HTTPStatus
+from itertools import count
+from logging import getLogger
+from math import ceil
+from threading import BoundedSemaphore, Lock
+from time import monotonic
+from weakref import WeakKeyDictionary
+
+from flask import current_app, has_request_context, request
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql import Select
+from werkzeug.utils import import_string
+
+from myapp.core import CannedError
+from myapp.lib.metrics import metrics
+
+__all__ = [
+    'APISQLAlchemy',
+    'RoutingSession',
+    'StickyUsers',
+    'RedisStickyBackend',
+    'CircuitBreaker',
+    'Bulkhead',
+    'DatabaseUnavailableError',
+    'BulkheadFullError',
+]
+
+LOG = getLogger(__name__)
+
+SAFE_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS'))
+BREAKER_STATES = {'closed': 0, 'half_open': 1, 'open': 2}
+
+
+class BulkheadFullError(CannedError):
+    """The endpoint's database connections quota is exhausted."""
+
+    message = 'Service Unavailable: too many concurrent requests of this kind; retry later.'
+    status = HTTPStatus.SERVICE_UNAVAILABLE
+    http_status = HTTPStatus.SERVICE_UNAVAILABLE
+
+    def __init__(self):
+        """Initialize exception."""
+        super().__init__(headers={'Retry-After': '1'})
+
+
+class DatabaseUnavailableError(CannedError):
+    """The database circuit breaker is open."""
+
+    message = 'Service Unavailable: the database is unavailable; retry later.'
+    status = HTTPStatus.SERVICE_UNAVAILABLE
+    http_status = HTTPStatus.SERVICE_UNAVAILABLE
+
+    def __init__(self, retry_after):
+        """
+        Initialize exception.
+
+        :param retry_after: seconds
+        """
+        super().__init__(headers={'Retry-After': str(retry_after)})
+
+
+class CircuitBreaker:
+    """
+    Database circuit breaker.
+
+    The outcomes of the statements are counted in tumbling windows of
+    DB_BREAKER_WINDOW seconds; failures are connection and operational
+    errors (timeouts included) and calls slower than DB_BREAKER_SLOW_CALL.
+    Once the failure rate reaches DB_BREAKER_FAILURE_RATE (of at least
+    DB_BREAKER_MIN_CALLS calls), the breaker opens and the calls fail fast
+    for DB_BREAKER_OPEN_SECONDS. Then it half-opens: DB_BREAKER_PROBES calls
+    are let through, and it closes if they all succeed; a probe that doesn't
+    report within DB_BREAKER_SLOW_CALL counts as failed.
+    """
+
+    def __init__(self, name, config):
+        """
+        Initialize circuit breaker.
+
+        :param name: bind name for metrics
+        :param config: flask config
+        """
+        self.name = name
+        self.failure_rate = config['DB_BREAKER_FAILURE_RATE']
+        self.min_calls = config['DB_BREAKER_MIN_CALLS']
+        self.window = config['DB_BREAKER_WINDOW']
+        self.slow_call = config['DB_BREAKER_SLOW_CALL']
+        self.open_seconds = config['DB_BREAKER_OPEN_SECONDS']
+        self.probes = config['DB_BREAKER_PROBES']
+        self._lock = Lock()
+        self.state = None
+        self._set_state('closed', monotonic())
+
+    def allow(self):
+        """
+        Let a call through or fail fast.
+
+        :raises DatabaseUnavailableError: when open
+        """
+        if not self.try_allow():
+            metrics.incr('db.breaker.rejected', bind=self.name)
+            raise DatabaseUnavailableError(max(ceil(self.opened_until - monotonic()), 1))
+
+    def try_allow(self):
+        """
+        Let a call through or tell it's rejected; e.g. for the replicas with a fallback.
+
+        :return: is allowed
+        """
+        if self.state == 'closed':
+            return True
+
+        now = monotonic()
+        with self._lock:
+            # A probe that doesn't report in time has failed, e.g. on a pool checkout timeout
+            if self.state == 'half_open' and self._probes_started > self._probes_succeeded:
+                if now >= self._probe_deadline:
+                    self._set_state('open', now)
+            if self.state == 'open' and now >= self.opened_until:
+                self._set_state('half_open', now)
+            if self.state == 'half_open' and self._probes_started < self.probes:
+                self._probes_started += 1
+                self._probe_deadline = now + self.slow_call
+                return True
+        return False
+
+    def record(self, failed):
+        """
+        Count a call outcome.
+
+        :param failed: did the call fail
+        """
+        now = monotonic()
+        with self._lock:
+            if self.state == 'half_open':
+                self._record_probe(failed, now)
+                return
+
+            if self.state == 'open':
+                return
+
+            if now - self._window_started >= self.window:
+                self._window_started, self._calls, self._failures = now, 0, 0
+            self._calls += 1
+            self._failures += int(failed)
+            if self._calls >= self.min_calls and self._failures / self._calls >= self.failure_rate:
+                self._set_state('open', now)
+
+    def _record_probe(self, failed, now):
+        if failed:
+            self._set_state('open', now)
+            return
+
+        self._probes_succeeded += 1
+        if self._probes_succeeded >= self.probes:
+            self._set_state('closed', now)
+
+    def _set_state(self, state, now):
+        if state == 'open':
+            LOG.warning(f'Database circuit breaker "{self.name}" is open.')
+        elif state == 'closed' and self.state is not None:
+            LOG.warning(f'Database circuit breaker "{self.name}" is closed.')
+        self.state = state
+        self.opened_until = now + self.open_seconds
+        self._window_started, self._calls, self._failures = now, 0, 0
+        self._probes_started, self._probes_succeeded = 0, 0
+        self._probe_deadline = now
+        metrics.gauge('db.breaker.state', BREAKER_STATES[state], bind=self.name)
+
+
+class Bulkhead:
+    """
+    Database connections quota of a group of endpoints.
+
+    A request takes a slot when its session first needs a connection and
+    gives it back when the session is closed (at the app context teardown).
+    """
+
+    def __init__(self, name, connections, timeout):
+        """
+        Initialize bulkhead.
+
+        :param name: endpoint or blueprint name
+        :param connections: quota
+        :param timeout: seconds to wait for a slot
+        """
+        self.name = name
+        self.timeout = timeout
+        self._slots = BoundedSemaphore(connections)
+
+    def acquire(self):
+        """
+        Take a slot.
+
+        :raises BulkheadFullError: on timeout
+        """
+        if self._slots.acquire(blocking=False):
+            return
+        metrics.incr('db.bulkhead.exhausted', bulkhead=self.name)
+        if not self._slots.acquire(timeout=self.timeout):
+            metrics.incr('db.bulkhead.rejected', bulkhead=self.name)
+            raise BulkheadFullError()
+
+    def release(self):
+        """Give the slot back."""
+        self._slots.release()
+
+
+class RoutingSession(SignallingSession):
+    """
+    Session that sends reads of safe requests to replicas.
+
+    Writes, locking reads and everything outside of GET/HEAD/OPTIONS
+    requests go to the primary. Once the session writes, it sticks to the
+    primary (read-your-writes); so does the user (request.identity, set by
+    the authentication) for SQLALCHEMY_REPLICA_STICKINESS seconds after the
+    commit. Anonymous writes stick nobody; see StickyUsers.stick.
+    """
+
+    def __init__(self, db, **options):
+        """
+        Initialize the session.
+
+        :param db: APISQLAlchemy
+        :param options: session options
+        """
+        super().__init__(db, **options)
+        self.db = db
+        self.wrote = False
+        self.bulkhead = None
+        self.bulkhead_endpoint = None
+
+    def get_bind(self, mapper=None, clause=None):
+        """
+        Get an engine for the statement.
+
+        :param mapper: mapper
+        :param clause: statement
+        :return: engine
+        """
+        is_flushing = self._flushing  # noqa: WPS437
+        is_read = isinstance(clause, Select) and clause._for_update_arg is None  # noqa: WPS437
+        if is_flushing or (clause is not None and not is_read):
+            self.wrote = True
+        elif is_read and self._reads_from_replica(mapper):
+            replica = self.db.get_replica_engine(self.app)
+            breaker = self.db.get_breaker(replica, self.app)
+            # A replica with an open breaker isn't an outage: fall back to the primary
+            if breaker is None or breaker.try_allow():
+                self._enter_bulkhead()
+                return replica
+
+        engine = super().get_bind(mapper, clause)
+        breaker = self.db.get_breaker(engine, self.app)
+        if breaker is not None:
+            breaker.allow()
+        self._enter_bulkhead()
+        return engine
+
+    def close(self):
+        """Close the session and give the bulkhead slot back."""
+        with ExitStack() as stack:
+            stack.callback(self._leave_bulkhead)
+            super().close()
+
+    def commit(self):
+        """Commit and make the client stick to the primary if anything was written."""
+        super().commit()
+        identity = self._identity()
+        if self.wrote and identity is not None:
+            self.db.sticky_users.stick(identity, self.app)
+
+    def _connection_for_bind(self, engine, execution_options=None, **kw):
+        # Pool checkout timeouts reach neither the engine nor the pool events
+        try:
+            return super()._connection_for_bind(engine, execution_options, **kw)
+        except PoolTimeoutError:
+            breaker = self.db.breakers.get(engine)
+            if breaker is not None:
+                breaker.record(failed=True)
+            raise
+
+    def _enter_bulkhead(self):
+        # Sequential batch sub-requests share the session: each one takes the quota of its endpoint
+        if not has_request_context() or self.bulkhead_endpoint == request.endpoint:
+            return
+        self._leave_bulkhead()
+        bulkhead = self.db.get_bulkhead(self.app, request.endpoint)
+        if bulkhead is not None:
+            bulkhead.acquire()
+            self.bulkhead = bulkhead
+        self.bulkhead_endpoint = request.endpoint
+
+    def _leave_bulkhead(self):
+        if self.bulkhead is not None:
+            self.bulkhead.release()
+        self.bulkhead = None
+        self.bulkhead_endpoint = None
+
+    def _reads_from_replica(self, mapper):
+        if self.wrote or not self.app.config['SQLALCHEMY_REPLICA_BINDS']:
+            return False
+
+        if mapper is not None and mapper.persist_selectable.info.get('bind_key'):
+            return False
+
+        if not has_request_context() or request.method not in SAFE_METHODS:
+            return False
+
+        identity = self._identity()
+        return identity is None or not self.db.sticky_users.is_sticky(identity, self.app)
+
+    @staticmethod
+    def _identity():
+        return getattr(request, 'identity', None) if has_request_context() else None
+
+
+def _sqlite_connect(pragmas):
+    def listener(dbapi_connection, _):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+    return listener
+
+
+class APISQLAlchemy(SQLAlchemy):
+    """
+    Flask-SQLAlchemy with read replicas.
+
+    Replicas are bind keys of SQLALCHEMY_BINDS listed in
+    SQLALCHEMY_REPLICA_BINDS; see RoutingSession.
+
+    SQLite databases get the SQLITE_PRAGMAS on connect and a connections
+    pool of SQLALCHEMY_POOL_SIZE. The driver begins a transaction right
+    before its first write, so the reads (with WAL) never block and never
+    hold a snapshot that a write would fail to upgrade; the writers queue
+    for the single writer lock for up to busy_timeout.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """
+        Initialize the extension.
+
+        :param args: SQLAlchemy args
+        :param kwargs: SQLAlchemy kwargs
+        """
+        self.round_robin = count()
+        self.sticky_users = StickyUsers()
+        self.breakers = WeakKeyDictionary()
+        self.bulkheads = WeakKeyDictionary()  # app -> name -> Bulkhead
+        super().__init__(*args, **kwargs)
+
+    def create_engine(self, sa_url, engine_opts):
+        """
+        Create an engine that reports the statements outcomes to its circuit breaker.
+
+        SQLite engines get the pragmas on connect; see apply_driver_hacks.
+
+        :param sa_url: database URL
+        :param engine_opts: engine options
+        :return: engine
+        """
+        sqlite_pragmas = engine_opts.pop('sqlite_pragmas', None)
+        # The SQLALCHEMY_ENGINE_OPTIONS default is for PostgreSQL; the SQLite reads
+        # outside of the write transactions see the latest commits anyway
+        if sqlite_pragmas is not None and engine_opts.get('isolation_level') == 'READ_COMMITTED':
+            engine_opts.pop('isolation_level')
+        engine = super().create_engine(sa_url, engine_opts)
+        if sqlite_pragmas is not None:
+            event.listen(engine, 'connect', _sqlite_connect(sqlite_pragmas))
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        event.listen(engine, 'handle_error', self._handle_error)
+        return engine
+
+    def apply_driver_hacks(self, app, sa_url, options):
+        """
+        Apply the SQLite profile.
+
+        :param app: flask application
+        :param sa_url: database URL
+        :param options: engine options
+        """
+        super().apply_driver_hacks(app, sa_url, options)
+        if sa_url.drivername != 'sqlite':
+            return
+
+        # A pool keeps the connections' page cache and memory map warm
+        options.setdefault('poolclass', QueuePool)
+        options.setdefault('connect_args', {}).setdefault('check_same_thread', False)
+        options['sqlite_pragmas'] = app.config['SQLITE_PRAGMAS']
+
+    def get_breaker(self, engine, app):
+        """
+        Get the engine circuit breaker.
+
+        :param engine: engine
+        :param app: flask application
+        :return: circuit breaker; None if disabled
+        """
+        if not app.config['DB_BREAKER_ENABLED']:
+            return None
+        breaker = self.breakers.get(engine)
+        if breaker is None:
+            breaker = CircuitBreaker(engine.url.database, app.config)
+            breaker = self.breakers.setdefault(engine, breaker)
+        return breaker
+
+    def create_session(self, options):
+        """
+        Create the session factory.
+
+        :param options: session options
+        :return: session factory
+        """
+        return sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def get_bulkhead(self, app, endpoint):
+        """
+        Get the bulkhead of the endpoint or of its blueprint.
+
+        :param app: flask application
+        :param endpoint: endpoint name
+        :return: bulkhead; None if the endpoint isn't limited
+        """
+        quotas = app.config['SQLALCHEMY_BULKHEADS']
+        if not quotas or endpoint is None:
+            return None
+
+        name = endpoint if endpoint in quotas else endpoint.rpartition('.')[0]
+        if name not in quotas:
+            return None
+
+        bulkheads = self.bulkheads.get(app)
+        if bulkheads is None:
+            bulkheads = self.bulkheads.setdefault(app, {})
+        bulkhead = bulkheads.get(name)
+        if bulkhead is None:
+            bulkhead = bulkheads.setdefault(name, Bulkhead(name, **quotas[name]))
+        return bulkhead
+
+    def get_replica_engine(self, app):
+        """
+        Choose a replica by SQLALCHEMY_REPLICA_SELECTION.
+
+        :param app: flask application
+        :return: engine
+        """
+        binds = app.config['SQLALCHEMY_REPLICA_BINDS']
+        if app.config['SQLALCHEMY_REPLICA_SELECTION'] == 'least_loaded':
+            return min(
+                (self.get_engine(app, bind) for bind in binds),
+                key=lambda engine: getattr(engine.pool, 'checkedout', int)(),
+            )
+        return self.get_engine(app, binds[next(self.round_robin) % len(binds)])
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info['breaker_started_at'] = monotonic()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        breaker = self.breakers.get(conn.engine)
+        if breaker is not None:
+            elapsed = monotonic() - conn.info.pop('breaker_started_at', monotonic())
+            breaker.record(failed=elapsed >= breaker.slow_call)
+
+    def _handle_error(self, context):
+        breaker = self.breakers.get(context.engine)
+        if breaker is None:
+            return
+        is_operational = isinstance(context.sqlalchemy_exception, OperationalError)
+        breaker.record(failed=context.is_disconnect or is_operational)
+
+
+class StickyUsers:
+    """The users that read from the primary; the store is chosen by SQLALCHEMY_STICKY_BACKEND."""
+
+    def __init__(self):
+        """Initialize the registry."""
+        self.backends = WeakKeyDictionary()  # app -> backend
+
+    def stick(self, identity, app=None):
+        """
+        Make a user read from the primary for SQLALCHEMY_REPLICA_STICKINESS seconds.
+
+        Commits stick the request's user; call it for the users of anonymous
+        writes, e.g. a registration, so their first reads see the write.
+
+        :param identity: user identity
+        :param app: flask application; the current one by default
+        """
+        app = app or current_app._get_current_object()  # noqa: WPS437
+        ttl = app.config['SQLALCHEMY_REPLICA_STICKINESS']
+        self._backend(app).set(f'sticky:{identity}', True, ttl=ttl)
+
+    def is_sticky(self, identity, app):
+        """
+        Check whether a user reads from the primary.
+
+        :param identity: user identity
+        :param app: flask application
+        :return: is sticky
+        """
+        return self._backend(app).get(f'sticky:{identity}') is not None
+
+    def _backend(self, app):
+        backend = self.backends.get(app)
+        if backend is None:
+            backend_class = import_string(app.config['SQLALCHEMY_STICKY_BACKEND'])
+            backend = backend_class(**app.config['SQLALCHEMY_STICKY_OPTIONS'])
+            backend = self.backends.setdefault(app, backend)
+        return backend
+
+
+class RedisStickyBackend:
+    """Sticky users store shared by the workers; requires the "redis" extra."""
+
+    def __init__(self, url='redis://localhost:6379/0', prefix='myapp:'):
+        """
+        Initialize the store.
+
+        :param url: Redis URL
+        :param prefix: key prefix
+        """
+        from redis import Redis  # noqa: WPS433
+
+        self.prefix = prefix
+        self.redis = Redis.from_url(url)
+
+    def get(self, key):
+        """
+        Get a mark.
+
+        :param key: key
+        :return: True or None
+        """
+        return True if self.redis.exists(self.prefix + key) else None
+
+    def set(self, key, value, ttl):  # noqa: WPS125
+        """
+        Set a mark.
+
+        :param key: key
+        :param value: ignored; the key is the mark
+        :param ttl: time to live in seconds
+        """
+        self.redis.set(self.prefix + key, b'1', ex=ttl)
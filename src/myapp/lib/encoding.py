@@ -0,0 +1,112 @@
+"""Binary response encodings; they require the "binary" extra."""
+from dataclasses import dataclass
+from functools import partial
+from logging import getLogger
+from typing import Callable
+
+from flask import current_app, request
+
+__all__ = [
+    'Codec',
+    'BinaryCodecs',
+    'get_codec',
+    'negotiate_codec',
+]
+
+LOG = getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Codec:
+    """Binary encoding of the same envelope structure as the JSON one."""
+
+    dumps: Callable
+    loads: Callable
+
+
+def _msgpack_codec():
+    import msgpack  # noqa: WPS433
+
+    return Codec(
+        dumps=partial(msgpack.packb, use_bin_type=True),
+        loads=partial(msgpack.unpackb, raw=False),
+    )
+
+
+def _cbor_codec():
+    import cbor2  # noqa: WPS433
+
+    return Codec(dumps=cbor2.dumps, loads=cbor2.loads)
+
+
+# Require the "binary" extra
+CODEC_FACTORIES = {
+    'application/msgpack': _msgpack_codec,
+    'application/x-msgpack': _msgpack_codec,
+    'application/cbor': _cbor_codec,
+}
+_codecs = {}
+
+
+def get_codec(mimetype):
+    """
+    Get the codec of a binary mimetype; it's made once.
+
+    :param mimetype: mimetype
+    :return: codec or None if unknown or its library isn't installed
+    """
+    if mimetype in _codecs:
+        return _codecs[mimetype]
+
+    codec = None
+    factory = CODEC_FACTORIES.get(mimetype)
+    if factory is not None:
+        try:
+            codec = factory()
+        except ImportError:
+            LOG.warning(f'The {mimetype} encoding is disabled; its library is not installed.')
+    _codecs[mimetype] = codec
+    return codec
+
+
+def negotiate_codec():
+    """
+    Pick the response encoding by the Accept header; JSON is the default.
+
+    :return: mimetype and codec; (None, None) for JSON
+    """
+    accept = request.headers.get('Accept', '')
+    enabled = current_app.config['BINARY_CODECS']
+    if not any(mimetype in accept for mimetype in enabled):
+        return None, None
+
+    offered = ['application/json']
+    offered.extend(mimetype for mimetype in enabled if get_codec(mimetype) is not None)
+    mimetype = request.accept_mimetypes.best_match(offered, default='application/json')
+    if mimetype == 'application/json':
+        return None, None
+    return mimetype, get_codec(mimetype)
+
+
+class BinaryCodecs:
+    """Binary encodings extension; the request parser decodes the bodies with it."""
+
+    def init_app(self, app):
+        """
+        Initialize the extension.
+
+        :param app: flask application
+        """
+        app.extensions['codecs'] = self
+
+    @staticmethod
+    def get(mimetype):
+        """
+        Get the codec of a mimetype enabled by BINARY_CODECS.
+
+        :param mimetype: mimetype
+        :return: codec or None
+        """
+        if mimetype not in current_app.config['BINARY_CODECS']:
+            return None
+        return get_codec(mimetype)
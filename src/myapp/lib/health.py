@@ -0,0 +1,129 @@
+"""Liveness and readiness probes served ahead of the Flask request pipeline."""
+from contextlib import ExitStack
+from json import dumps as json_dumps
+from logging import getLogger
+from threading import Lock
+from time import monotonic
+
+from alembic.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import text
+from sqlalchemy.pool import QueuePool
+
+LOG = getLogger(__name__)
+
+HEADERS = [('Content-Type', 'application/json'), ('Cache-Control', 'no-store')]
+ALIVE = b'{"status":"ok"}'
+
+
+class HealthMiddleware:
+    """
+    Serve /healthz and /readyz without logging, parsing and envelopes.
+
+    /healthz is static. /readyz checks the database connectivity, the pool
+    headroom and the migrations revision; the result is cached for
+    HEALTH_READY_CACHE_TTL seconds and only one thread runs the checks at a
+    time, the others get the previous result.
+    """
+
+    def __init__(self, wsgi_app, app, migrations_directory):
+        """
+        Initialize middleware.
+
+        :param wsgi_app: WSGI application
+        :param app: Flask application
+        :param migrations_directory: alembic scripts directory
+        """
+        self.wsgi_app = wsgi_app
+        self.app = app
+        self.migrations_directory = str(migrations_directory)
+        self.liveness_path = app.config['HEALTH_LIVENESS_PATH']
+        self.readiness_path = app.config['HEALTH_READINESS_PATH']
+        self.ttl = app.config['HEALTH_READY_CACHE_TTL']
+        self._lock = Lock()
+        self._heads = None
+        self._checked_at = None
+        self._ready = (False, b'{"status":"unknown"}')
+
+    def __call__(self, environ, start_response):
+        """
+        Serve WSGI request.
+
+        :param environ: WSGI environ
+        :param start_response: WSGI start_response
+        :return: response body
+        """
+        path = environ.get('PATH_INFO')
+        if path not in {self.liveness_path, self.readiness_path}:
+            return self.wsgi_app(environ, start_response)
+        if environ['REQUEST_METHOD'] not in {'GET', 'HEAD'}:
+            return self.wsgi_app(environ, start_response)
+
+        if path == self.liveness_path:
+            is_ok, body = True, ALIVE
+        else:
+            is_ok, body = self.readiness()
+
+        start_response(
+            '200 OK' if is_ok else '503 Service Unavailable',
+            [*HEADERS, ('Content-Length', str(len(body)))],
+        )
+        return [b''] if environ['REQUEST_METHOD'] == 'HEAD' else [body]
+
+    def readiness(self):
+        """
+        Get the cached readiness or check it.
+
+        :return: is ready, response body
+        """
+        checked_at = self._checked_at
+        if checked_at is not None and monotonic() - checked_at < self.ttl:
+            return self._ready
+
+        if not self._lock.acquire(blocking=checked_at is None):
+            return self._ready
+        with ExitStack() as stack:
+            stack.callback(self._lock.release)
+            if self._checked_at is checked_at:
+                self._ready = self.check()
+                self._checked_at = monotonic()
+        return self._ready
+
+    def check(self):
+        """
+        Check the database, the pool and the migrations.
+
+        :return: is ready, response body
+        """
+        checks = {'database': 'ok', 'pool': 'ok', 'migrations': 'ok'}
+        engine = self.app.extensions['sqlalchemy'].db.get_engine(self.app)
+
+        pool = engine.pool
+        if isinstance(pool, QueuePool) and pool._max_overflow >= 0:  # noqa: WPS437
+            if pool.checkedout() >= pool.size() + pool._max_overflow:  # noqa: WPS437
+                checks['pool'] = 'exhausted'
+
+        try:
+            with engine.connect() as connection:
+                connection.execute(text('SELECT 1'))
+                current = set(MigrationContext.configure(connection).get_current_heads())
+            if current != self.heads():
+                checks['migrations'] = f'at {sorted(current)}, expected {sorted(self.heads())}'
+        except Exception as error:
+            LOG.warning(f'Readiness check failed: {error}')
+            checks['database'] = type(error).__name__
+            checks['migrations'] = 'unknown'
+
+        is_ok = all(value == 'ok' for value in checks.values())
+        body = {'status': 'ok' if is_ok else 'fail', 'checks': checks}
+        return is_ok, json_dumps(body, separators=(',', ':')).encode('utf8')
+
+    def heads(self):
+        """
+        Get the head revisions; they're read from the scripts once.
+
+        :return: revisions
+        """
+        if self._heads is None:
+            self._heads = set(ScriptDirectory(self.migrations_directory).get_heads())
+        return self._heads
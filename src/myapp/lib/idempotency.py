@@ -0,0 +1,146 @@
+"""Idempotency-Key support for the non-safe method views."""
+from dataclasses import replace
+from functools import wraps
+from hashlib import sha1
+from http import HTTPStatus
+from threading import Event, Lock
+
+from flask import current_app, request
+from werkzeug.utils import import_string
+
+from myapp.core import APIError
+from myapp.lib.responses import freeze_response, request_fingerprint
+from myapp.lib.metrics import metrics
+
+__all__ = [
+    'IdempotencyStore',
+    'idempotent',
+]
+
+IDEMPOTENCY_KEY_HEADER = 'Idempotency-Key'
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+IDEMPOTENCY_REQUEST_HEADER = 'X-Idempotency-Request'
+_idempotency_lock = Lock()
+_idempotency_in_flight = {}
+
+
+class IdempotencyStore:
+    """Idempotency records extension; the backend is chosen by IDEMPOTENCY_BACKEND."""
+
+    def init_app(self, app):
+        """
+        Initialize the extension.
+
+        :param app: flask application
+        """
+        backend_class = import_string(app.config['IDEMPOTENCY_BACKEND'])
+        app.extensions['idempotency'] = backend_class(**app.config['IDEMPOTENCY_OPTIONS'])
+
+
+def idempotent(ttl=None):
+    """
+    Make a non-safe method view handler idempotent by the Idempotency-Key header.
+
+    The first response (below 500) is stored per key, identity and endpoint;
+    replays return the stored bytes without calling the handler. Concurrent
+    duplicates within the process wait for the first one. The same key with
+    another body is rejected.
+
+    Place it below the authorization decorators: replays skip the handler and
+    the database, not the authorization. The identity is a part of the key;
+    anonymous callers are told apart by the client address.
+
+    :param ttl: time to live in seconds; IDEMPOTENCY_TTL by default
+    :return: decorator
+    """
+    def wrapper(fn):
+        @wraps(fn)
+        def decorator(*args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_KEY_HEADER)
+            backend = current_app.extensions.get('idempotency')
+            if not key or backend is None:
+                return fn(*args, **kwargs)
+
+            store_key, request_hash = _idempotency_keys(key)
+            stored = _idempotency_claim(backend, store_key)
+            if stored is not None:
+                return _idempotent_replay(stored, request_hash)
+
+            try:
+                frozen = freeze_response(_idempotency_call(fn, *args, **kwargs))
+                if frozen.status < HTTPStatus.INTERNAL_SERVER_ERROR:
+                    _idempotency_save(backend, store_key, frozen, request_hash, ttl)
+                return frozen
+            finally:
+                with _idempotency_lock:
+                    _idempotency_in_flight.pop(store_key).set()
+        return decorator
+    return wrapper
+
+
+def _idempotency_keys(key):
+    if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise APIError(
+            f'Invalid {IDEMPOTENCY_KEY_HEADER}: it is too long.',
+            metadata={'status': HTTPStatus.BAD_REQUEST},
+            http_status=HTTPStatus.BAD_REQUEST,
+        )
+
+    fingerprint = request_fingerprint(('identity',))
+    if 'Authorization' not in request.headers:
+        # Anonymous callers don't share the keys
+        fingerprint += ' ' + str(request.remote_addr)
+    fingerprint += ' ' + key
+    store_key = 'idempotency:' + sha1(fingerprint.encode()).hexdigest()  # noqa: S303
+    return store_key, sha1(request.get_data()).hexdigest()  # noqa: S303
+
+
+def _idempotency_claim(backend, store_key):
+    # The stored response, or None when this request is the one to run the handler
+    while True:  # noqa: WPS457
+        stored = backend.get(store_key)
+        if stored is not None:
+            return stored
+
+        with _idempotency_lock:
+            in_flight = _idempotency_in_flight.get(store_key)
+            if in_flight is None:
+                _idempotency_in_flight[store_key] = Event()
+                return None
+
+        if not in_flight.wait(current_app.config['IDEMPOTENCY_WAIT_TIMEOUT']):
+            raise APIError(
+                f'The request with the same {IDEMPOTENCY_KEY_HEADER} is still in progress.',
+                metadata={'status': HTTPStatus.CONFLICT},
+                http_status=HTTPStatus.CONFLICT,
+            )
+
+
+def _idempotency_save(backend, store_key, frozen, request_hash, ttl):
+    headers = frozen.headers + ((IDEMPOTENCY_REQUEST_HEADER, request_hash),)
+    backend.set(
+        store_key,
+        replace(frozen, headers=headers),
+        ttl or current_app.config['IDEMPOTENCY_TTL'],
+    )
+
+
+def _idempotency_call(fn, *args, **kwargs):
+    try:
+        return fn(*args, **kwargs)
+    except Exception as error:
+        return current_app.handle_user_exception(error)
+
+
+def _idempotent_replay(stored, request_hash):
+    headers = dict(stored.headers)
+    if headers.pop(IDEMPOTENCY_REQUEST_HEADER, None) != request_hash:
+        raise APIError(
+            f'The {IDEMPOTENCY_KEY_HEADER} was used with another request body.',
+            metadata={'status': HTTPStatus.UNPROCESSABLE_ENTITY},
+            http_status=HTTPStatus.UNPROCESSABLE_ENTITY,
+        )
+
+    metrics.incr('idempotency.replays', endpoint=request.endpoint)
+    headers['Idempotent-Replayed'] = 'true'
+    return replace(stored, headers=tuple(headers.items()))
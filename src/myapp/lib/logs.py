@@ -0,0 +1,310 @@
+"""Request logging, correlation IDs, exception logging and the JSON log formatter."""
+from collections import OrderedDict
+from http import HTTPStatus
+from json import JSONEncoder
+from logging import Formatter, getLogger
+from os import getpid, register_at_fork
+from re import ASCII, compile as re_compile
+from threading import Lock
+from time import monotonic
+from weakref import WeakSet
+
+from flask import Response, current_app, has_request_context, request
+from werkzeug.exceptions import HTTPException
+
+from myapp.config import connection_id_var, next_connection_id
+from myapp.core import APIError, CannedError
+from myapp.lib.metrics import metrics
+
+__all__ = [
+    'ExceptionLogPolicy',
+    'JSONLogFormatter',
+    'assign_connection_id',
+    'echo_connection_id',
+    'exception_log',
+    'log_request',
+    'log_response',
+    'reset_connection_id',
+]
+
+LOG = getLogger(__name__)
+
+CONNECTION_ID_PATTERN = re_compile(r'[\w.:-]{1,128}', ASCII)
+
+
+def assign_connection_id():
+    """Take the inbound correlation ID if it's sane or generate one; it's done once per request."""
+    connection_id = request.headers.get(current_app.config['CONNECTION_ID_HEADER'], '')
+    if not CONNECTION_ID_PATTERN.fullmatch(connection_id):
+        connection_id = next_connection_id()
+    request.connection_id = connection_id
+    request.connection_id_token = connection_id_var.set(connection_id)
+
+
+def echo_connection_id(response: Response):
+    """
+    Return the correlation ID to the client.
+
+    :param response: flask response
+    :return: flask response
+    """
+    connection_id = getattr(request, 'connection_id', None)
+    if connection_id:
+        response.headers[current_app.config['CONNECTION_ID_HEADER']] = connection_id
+    return response
+
+
+def reset_connection_id(_=None):
+    """Reset the correlation ID; worker threads are reused across requests."""
+    token = getattr(request, 'connection_id_token', None)
+    if token is not None:
+        connection_id_var.reset(token)
+
+
+def log_request():
+    """Log request in curl-based fashion."""
+    request.started_at = monotonic()
+    msg = fr"curl -w '\n' -iX {request.method} '{request.url}' "
+    msg += ''.join(f"-H '{h}:{v}' " for h, v in request.headers.items())
+    if (
+        request.method in {'POST', 'PUT', 'PATCH'}
+        and request.headers.get('Content-Type') == 'application/json'
+    ):
+        data = request.data.decode('utf8')
+        msg += f"-d '{data}'"
+    LOG.info(msg)
+
+
+def log_response(response: Response):
+    """
+    Log response json; the request fields go to `extra` for structured formatters.
+
+    :param response: flask response
+    :return: flask response
+    """
+    extra = {
+        'endpoint': request.endpoint,
+        'method': request.method,
+        'status': response.status_code,
+    }
+    started_at = getattr(request, 'started_at', None)
+    if started_at is not None:
+        extra['latency_ms'] = round((monotonic() - started_at) * 1000, 3)
+
+    if response.is_json:
+        LOG.info(f'Response: {response.json}', extra=extra)
+    else:
+        LOG.info(f'Response: {response.status}', extra=extra)
+    return response
+
+
+class ExceptionLogPolicy:
+    """
+    Exception logging by class.
+
+    Expected errors (canned ones, APIError and HTTP exceptions below 500) are
+    counted and every Nth of them per endpoint and type is logged as a single
+    line. Unexpected errors are logged with a traceback, at most a few per
+    fingerprint (type and the innermost frame) within a window; the suppressed
+    ones are reported as "N suppressed" summaries once the window is over.
+    """
+
+    def __init__(self, max_fingerprints=1024):
+        """
+        Initialize policy.
+
+        :param max_fingerprints: how many fingerprints to track
+        """
+        self.max_fingerprints = max_fingerprints
+        self._lock = Lock()
+        self._windows = OrderedDict()  # fingerprint -> [window start, logged, suppressed]
+        self._summarized_at = 0
+
+    @staticmethod
+    def is_expected(error):
+        """
+        Classify an exception.
+
+        :param error: exception
+        :return: is it an expected client error
+        """
+        if isinstance(error, CannedError):
+            return True
+        if isinstance(error, APIError):
+            return error.http_status < HTTPStatus.INTERNAL_SERVER_ERROR
+        if isinstance(error, HTTPException):
+            code = error.code or HTTPStatus.INTERNAL_SERVER_ERROR
+            return code < HTTPStatus.INTERNAL_SERVER_ERROR
+        return False
+
+    @staticmethod
+    def fingerprint(error):
+        """
+        Make an exception fingerprint.
+
+        :param error: exception
+        :return: e.g. "KeyError@myapp/views/users.py:42"
+        """
+        tb = error.__traceback__
+        if tb is None:
+            return type(error).__name__
+        while tb.tb_next is not None:
+            tb = tb.tb_next
+        error_type = type(error).__name__
+        filename = tb.tb_frame.f_code.co_filename
+        return f'{error_type}@{filename}:{tb.tb_lineno}'
+
+    def log(self, error, msg='User error.'):
+        """
+        Log an exception according to its class.
+
+        :param error: exception
+        :param msg: log message prefix
+        """
+        config = current_app.config
+        now = monotonic()
+        with self._lock:
+            is_summary_due = now - self._summarized_at >= config['EXCEPTION_LOG_WINDOW']
+            if is_summary_due:
+                self._summarized_at = now
+        if is_summary_due:
+            self.log_summaries(now)
+
+        endpoint = request.endpoint if has_request_context() else None
+        if self.is_expected(error):
+            seen = metrics.incr('errors.expected', type=type(error).__name__, endpoint=endpoint)
+            if (seen - 1) % config['EXCEPTION_LOG_EXPECTED_SAMPLE'] == 0:
+                LOG.info(f'{msg} {type(error).__name__}: {error} (seen {seen} times)')
+            return
+
+        metrics.incr('errors.unexpected', type=type(error).__name__, endpoint=endpoint)
+        fingerprint = self.fingerprint(error)
+        is_logged, suppressed = self._count(fingerprint, now)
+        if suppressed:
+            LOG.error(f'{suppressed} similar errors were suppressed: {fingerprint}')
+        if is_logged:
+            LOG.error(msg, exc_info=error)
+        else:
+            metrics.incr('errors.suppressed', fingerprint=fingerprint)
+
+    def log_summaries(self, now):
+        """
+        Report the suppressed errors of the finished windows.
+
+        :param now: monotonic time
+        """
+        window_size = current_app.config['EXCEPTION_LOG_WINDOW']
+        with self._lock:
+            summaries = [
+                (fingerprint, window[2])
+                for fingerprint, window in self._windows.items()
+                if window[2] and now - window[0] >= window_size
+            ]
+            for fingerprint, _ in summaries:
+                self._windows[fingerprint] = [now, 0, 0]
+        for fingerprint, suppressed in summaries:
+            LOG.error(f'{suppressed} similar errors were suppressed: {fingerprint}')
+
+    def _count(self, fingerprint, now):
+        # Is the traceback to be logged, the suppressed count of the finished window
+        config = current_app.config
+        with self._lock:
+            window = self._windows.get(fingerprint)
+            suppressed = 0
+            if window is None or now - window[0] >= config['EXCEPTION_LOG_WINDOW']:
+                suppressed = window[2] if window else 0
+                window = [now, 0, 0]
+                self._windows[fingerprint] = window
+            # The least recently seen fingerprints are evicted first
+            self._windows.move_to_end(fingerprint)
+            if len(self._windows) > self.max_fingerprints:
+                self._windows.popitem(last=False)
+            is_logged = window[1] < config['EXCEPTION_LOG_TRACEBACKS_PER_WINDOW']
+            window[1 if is_logged else 2] += 1
+        return is_logged, suppressed
+
+
+exception_log = ExceptionLogPolicy()
+
+
+def app_version(distribution='MYAPP'):
+    try:
+        from importlib.metadata import PackageNotFoundError, version  # noqa: WPS433
+    except ImportError:  # Python 3.7
+        from pkg_resources import (  # noqa: WPS433
+            DistributionNotFound as PackageNotFoundError,
+            get_distribution,
+        )
+
+        def version(name):  # noqa: WPS440
+            return get_distribution(name).version
+
+    try:
+        return version(distribution)
+    except PackageNotFoundError:
+        return 'unknown'
+
+
+# Every dictConfig makes formatters: they're reset by a single fork hook
+_json_log_formatters = WeakSet()
+
+
+def _reset_json_log_formatters():
+    for formatter in list(_json_log_formatters):
+        formatter.reset()
+
+
+register_at_fork(after_in_child=_reset_json_log_formatters)
+
+
+class JSONLogFormatter(Formatter):
+    """
+    JSON-lines formatter for log shippers.
+
+    The static fields are encoded once (and again after fork); the per-record
+    ones are the level, logger, message, connection ID, the request fields
+    passed via `extra` and the exception info.
+    """
+
+    REQUEST_FIELDS = ('endpoint', 'method', 'status', 'latency_ms')
+
+    def __init__(self, static_fields=None, **kwargs):
+        super().__init__(**kwargs)
+        self.static_fields = {'app': 'MYAPP', 'version': app_version(), **(static_fields or {})}
+        self.encoder = JSONEncoder(
+            ensure_ascii=False,
+            check_circular=False,
+            separators=(',', ':'),
+            default=str,
+        )
+        self.reset()
+        _json_log_formatters.add(self)
+
+    def reset(self):
+        static_fields = {**self.static_fields, 'process': getpid()}
+        self.prefix = self.encoder.encode(static_fields)[:-1] + ','
+
+    def format(self, record):  # noqa: WPS125
+        json = {
+            'ts': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'connection_id': getattr(record, 'connection_id', None) or connection_id_var.get(),
+        }
+        for name in self.REQUEST_FIELDS:
+            value = record.__dict__.get(name)
+            if value is not None:
+                json[name] = value
+
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self.formatException(record.exc_info)
+            json['exc_type'] = record.exc_info[0].__name__
+            json['exc_message'] = str(record.exc_info[1])
+        if record.exc_text:
+            json['exc_traceback'] = record.exc_text
+        if record.stack_info:
+            json['stack_info'] = self.formatStack(record.stack_info)
+
+        return self.prefix + self.encoder.encode(json)[1:]
@@ -0,0 +1,79 @@
+"""Process-local metrics."""
+from collections import defaultdict
+from threading import Lock
+
+__all__ = [
+    'APIMetrics',
+    'metrics',
+]
+
+
+class APIMetrics:
+    """Process-local counters and gauges."""
+
+    def __init__(self):
+        """Initialize metrics."""
+        self._lock = Lock()
+        self._values = defaultdict(int)
+
+    @staticmethod
+    def key(name, **labels):
+        """
+        Make a metric key.
+
+        :param name: metric name
+        :param labels: metric labels
+        :return: metric key, e.g. "cache.hits{endpoint=guys.guys}"
+        """
+        if not labels:
+            return name
+        return name + '{' + ','.join(f'{k}={v}' for k, v in sorted(labels.items())) + '}'
+
+    def incr(self, name, value=1, **labels):
+        """
+        Increment a counter.
+
+        :param name: metric name
+        :param value: increment
+        :param labels: metric labels
+        :return: the new value
+        """
+        key = self.key(name, **labels)
+        with self._lock:
+            self._values[key] += value
+            return self._values[key]
+
+    def gauge(self, name, value, **labels):
+        """
+        Set a gauge.
+
+        :param name: metric name
+        :param value: gauge value
+        :param labels: metric labels
+        """
+        key = self.key(name, **labels)
+        with self._lock:
+            self._values[key] = value
+
+    def get(self, name, **labels):
+        """
+        Get a metric value.
+
+        :param name: metric name
+        :param labels: metric labels
+        :return: metric value
+        """
+        return self._values.get(self.key(name, **labels), 0)
+
+    def snapshot(self, prefix=''):
+        """
+        Make a metrics snapshot.
+
+        :param prefix: metric name prefix
+        :return: metric key to value mapping
+        """
+        with self._lock:
+            return {k: v for k, v in self._values.items() if k.startswith(prefix)}
+
+
+metrics = APIMetrics()
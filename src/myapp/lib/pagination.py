@@ -0,0 +1,97 @@
+"""Keyset (seek) pagination with signed cursors."""
+from http import HTTPStatus
+
+from itsdangerous import BadSignature, URLSafeSerializer
+from flask import current_app
+from marshmallow import fields, validate
+from sqlalchemy import and_, literal, or_
+
+from myapp.core import APIError, APIRequestSchema
+
+__all__ = [
+    'APIPaginationRequestSchema',
+    'keyset_paginate',
+]
+
+
+class APIPaginationRequestSchema(APIRequestSchema):
+    """MYAPP keyset pagination request parameters; mix it into list requests."""
+
+    limit = fields.Integer(
+        required=False,
+        missing=50,  # noqa: WPS432
+        validate=validate.Range(min=1, max=500),  # noqa: WPS432
+        description='Page size.',
+    )
+    cursor = fields.String(
+        required=False,
+        missing=None,
+        allow_none=True,
+        description='Opaque cursor from metadata.next_cursor of the previous page.',
+    )
+
+
+def keyset_paginate(query, columns, limit, cursor=None):
+    """
+    Fetch a page with keyset (seek) pagination.
+
+    The page is located by a WHERE on the ordering columns instead of an
+    OFFSET, so an indexed ordering makes any page an index range scan.
+    The columns must be indexed and unique together (end them with the
+    primary key); their values should be JSON-native.
+
+    :param query: SQLAlchemy ORM query
+    :param columns: ordering columns, ascending
+    :param limit: page size
+    :param cursor: opaque cursor of the previous page
+    :return: rows, next page cursor or None
+    """
+    if cursor:
+        query = query.filter(_keyset_after(columns, _load_cursor(cursor, len(columns))))
+
+    rows = query.order_by(*columns).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _dump_cursor([getattr(rows[-1], column.key) for column in columns])
+
+    return rows, next_cursor
+
+
+def _keyset_after(columns, values):
+    # (a, b) > (x, y) <=> a > x OR (a = x AND b > y); row values aren't portable
+    # bound literals, as comparing to True/False/None would be rejected
+    values = [literal(value, column.type) for column, value in zip(columns, values)]
+    clauses = []
+    for index, column in enumerate(columns):
+        equals = [columns[i] == values[i] for i in range(index)]
+        clauses.append(and_(*equals, column > values[index]))
+    return or_(*clauses)
+
+
+def _cursor_serializer():
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt='keyset-cursor')
+
+
+def _dump_cursor(values):
+    return _cursor_serializer().dumps(values)
+
+
+def _load_cursor(cursor, length):
+    try:
+        values = _cursor_serializer().loads(cursor)
+    except BadSignature:
+        values = None
+
+    if not isinstance(values, list) or len(values) != length:
+        raise APIError(
+            'The request specification is invalid; check OpenAPI docs for more info.',
+            metadata={
+                'status': HTTPStatus.BAD_REQUEST,
+                'errors': {'query': {'cursor': ['Invalid cursor.']}},
+            },
+            http_status=HTTPStatus.BAD_REQUEST,
+        )
+
+    return values
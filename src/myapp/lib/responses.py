@@ -0,0 +1,449 @@
+"""Serialized responses, the response cache and the GET requests coalescing."""
+from collections import OrderedDict, UserDict, defaultdict
+from dataclasses import dataclass
+from functools import wraps
+from hashlib import sha1
+from http import HTTPStatus
+from json import dumps as _json_dumps, loads as _json_loads
+from threading import Event, Lock
+from time import monotonic
+from urllib.parse import urlencode
+
+from flask import Response, current_app, request
+from werkzeug.utils import import_string
+
+from myapp.lib.encoding import negotiate_codec
+from myapp.lib.metrics import metrics
+
+__all__ = [
+    'CannedResponses',
+    'FrozenResponse',
+    'LRUCacheBackend',
+    'RedisCacheBackend',
+    'ResponseCache',
+    'cached',
+    'coalesced',
+    'freeze_response',
+    'request_fingerprint',
+]
+
+
+@dataclass(frozen=True)
+class FrozenResponse:
+    """Serialized response: the final body bytes, HTTP status and headers."""
+
+    body: bytes
+    status: int = HTTPStatus.OK
+    headers: tuple = ()
+
+    @classmethod
+    def freeze(cls, response: Response):
+        """
+        Freeze a Flask response.
+
+        :param response: flask response
+        :return: frozen response
+        """
+        return cls(
+            body=response.get_data(),
+            status=response.status_code,
+            headers=tuple(response.headers.items()),
+        )
+
+    @classmethod
+    def loads(cls, raw: bytes):
+        """
+        Load a frozen response dumped by :meth:`dumps`.
+
+        :param raw: dumped bytes
+        :return: frozen response
+        """
+        head, body = raw.split(b'\n', 1)
+        status, headers = _json_loads(head)
+        return cls(body=body, status=status, headers=tuple(map(tuple, headers)))
+
+    def dumps(self):
+        """
+        Dump into bytes; suitable for shared storages.
+
+        :return: bytes
+        """
+        head = _json_dumps([int(self.status), self.headers], separators=(',', ':'))
+        return head.encode('utf8') + b'\n' + self.body
+
+    def thaw(self, response_class=Response):
+        """
+        Build a new response object; no serialization involved.
+
+        :param response_class: flask response class
+        :return: flask response
+        """
+        return response_class(
+            response=self.body,
+            status=self.status,
+            headers=list(self.headers),
+        )
+
+
+def freeze_response(rv):
+    """
+    Serialize a view return value into a frozen response.
+
+    :param rv: view return value
+    :return: frozen response
+    """
+    if isinstance(rv, FrozenResponse):
+        return rv
+
+    if not isinstance(rv, current_app.response_class):
+        rv = current_app.dump_response(rv)
+
+    return FrozenResponse.freeze(rv)
+
+
+class CannedResponses(UserDict):
+    """Static responses of an app; each is built once per key and response encoding."""
+
+    def get_or_build(self, key, build):
+        """
+        Get a static response; it's built on the first call.
+
+        :param key: canned response key
+        :param build: response factory
+        :return: frozen response
+        """
+        mimetype, _ = negotiate_codec()
+        if mimetype is not None:
+            key = (key, mimetype)
+        frozen = self.get(key)
+        if frozen is None:
+            frozen = FrozenResponse.freeze(build())
+            self[key] = frozen
+        return frozen
+
+
+def request_fingerprint(vary_on=('query',)):
+    """
+    Derive a stable key for the current request.
+
+    The identity part is a digest of the Authorization header; it doesn't
+    touch the database, so it's cheap enough to be computed on every call.
+
+    :param vary_on: request parts to vary on: "query", "identity", "encoding"
+    :return: key
+    """
+    parts = [request.method, request.path]
+    if 'query' in vary_on:
+        parts.append(urlencode(sorted(request.args.items(multi=True))))
+    if 'identity' in vary_on:
+        authorization = request.headers.get('Authorization', '')
+        parts.append(sha1(authorization.encode('utf8')).hexdigest())  # noqa: S303
+    if 'encoding' in vary_on:
+        mimetype, _ = negotiate_codec()
+        if mimetype is not None:
+            parts.append(mimetype)
+    return ' '.join(parts)
+
+
+class LRUCacheBackend:
+    """
+    Bounded in-process LRU cache with per-entry TTL and tags.
+
+    Every worker process has its own entries: an invalidation drops them in
+    the current process only, so the other workers keep serving theirs until
+    the TTL runs out. Use RedisCacheBackend to invalidate across the workers.
+    """
+
+    def __init__(self, max_entries=1024):
+        """
+        Initialize the cache.
+
+        :param max_entries: max number of entries
+        """
+        self.max_entries = max_entries
+        self._lock = Lock()
+        self._entries = OrderedDict()
+        self._tags = defaultdict(set)
+
+    def get(self, key):
+        """
+        Get a value.
+
+        :param key: cache key
+        :return: value or None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value, _ = entry
+            if expires_at <= monotonic():
+                self._delete(key)
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl, tags=()):  # noqa: WPS125
+        """
+        Set a value.
+
+        :param key: cache key
+        :param value: value
+        :param ttl: time to live in seconds
+        :param tags: invalidation tags
+        """
+        with self._lock:
+            self._delete(key)
+            self._entries[key] = (monotonic() + ttl, value, tuple(tags))
+            for tag in tags:
+                self._tags[tag].add(key)
+
+            while len(self._entries) > self.max_entries:
+                self._delete(next(iter(self._entries)))
+
+    def invalidate(self, *tags):
+        """
+        Drop every entry marked with any of the tags.
+
+        :param tags: invalidation tags
+        :return: number of dropped entries
+        """
+        with self._lock:
+            keys = set()
+            for tag in tags:
+                keys.update(self._tags.pop(tag, ()))
+            for key in keys:
+                self._delete(key)
+            return len(keys)
+
+    def clear(self):
+        """Drop everything."""
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def _delete(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+
+        for tag in entry[2]:
+            tagged = self._tags.get(tag)
+            if tagged is not None:
+                tagged.discard(key)
+                if not tagged:
+                    del self._tags[tag]  # noqa: WPS420
+
+
+class RedisCacheBackend:
+    """Shared cache backend; requires the "redis" extra."""
+
+    def __init__(self, url='redis://localhost:6379/0', prefix='myapp:'):
+        """
+        Initialize the cache.
+
+        :param url: Redis URL
+        :param prefix: key prefix
+        """
+        from redis import Redis  # noqa: WPS433
+
+        self.prefix = prefix
+        self.redis = Redis.from_url(url)
+
+    def get(self, key):
+        """
+        Get a value.
+
+        :param key: cache key
+        :return: value or None
+        """
+        raw = self.redis.get(self.prefix + key)
+        return None if raw is None else FrozenResponse.loads(raw)
+
+    def set(self, key, value, ttl, tags=()):  # noqa: WPS125
+        """
+        Set a value.
+
+        :param key: cache key
+        :param value: frozen response
+        :param ttl: time to live in seconds
+        :param tags: invalidation tags
+        """
+        pipe = self.redis.pipeline()
+        pipe.set(self.prefix + key, value.dumps(), ex=ttl)
+        for tag in tags:
+            pipe.sadd(f'{self.prefix}tag:{tag}', self.prefix + key)
+        pipe.execute()
+
+    def invalidate(self, *tags):
+        """
+        Drop every entry marked with any of the tags.
+
+        :param tags: invalidation tags
+        :return: number of dropped entries
+        """
+        tag_keys = [f'{self.prefix}tag:{tag}' for tag in tags]
+        keys = self.redis.sunion(tag_keys) if tag_keys else set()
+        pipe = self.redis.pipeline()
+        if keys:
+            pipe.delete(*keys)
+        pipe.delete(*tag_keys)
+        pipe.execute()
+        return len(keys)
+
+    def clear(self):
+        """Drop everything with the prefix."""
+        for key in self.redis.scan_iter(f'{self.prefix}*'):
+            self.redis.delete(key)
+
+
+class ResponseCache:
+    """Response cache extension; the backend is chosen by CACHE_BACKEND."""
+
+    def init_app(self, app):
+        """
+        Initialize the extension.
+
+        :param app: flask application
+        """
+        backend_class = import_string(app.config['CACHE_BACKEND'])
+        app.extensions['cache'] = backend_class(**app.config['CACHE_OPTIONS'])
+
+    @staticmethod
+    def invalidate(*tags):
+        """
+        Drop cached responses by tags; call it from write paths.
+
+        With the LRUCacheBackend only the current process is affected.
+
+        :param tags: invalidation tags
+        :return: number of dropped entries
+        """
+        return current_app.extensions['cache'].invalidate(*tags)
+
+
+def cached(ttl=None, vary_on=('query',), tags=()):
+    """
+    Cache the final serialized GET responses of a method view handler.
+
+    Place it below jwt_required and above parse: hits skip the parsing,
+    the view and the serialization, yet the authorization is still checked.
+    The negotiated response encoding is always a part of the key. Tag the
+    responses that depend on the data and invalidate the tags on its writes;
+    see ResponseCache.invalidate.
+
+    :param ttl: time to live in seconds; CACHE_DEFAULT_TTL by default
+    :param vary_on: request parts to vary on: "query", "identity"
+    :param tags: invalidation tags
+    :return: decorator
+    """
+    def wrapper(fn):
+        @wraps(fn)
+        def decorator(*args, **kwargs):
+            backend = current_app.extensions.get('cache')
+            if (
+                backend is None
+                or not current_app.config['CACHE_ENABLED']
+                or request.method not in {'GET', 'HEAD'}
+            ):
+                return fn(*args, **kwargs)
+
+            key = 'response:' + request_fingerprint((*vary_on, 'encoding'))
+            frozen = backend.get(key)
+            is_hit = frozen is not None
+
+            if not is_hit:
+                frozen = freeze_response(fn(*args, **kwargs))
+                if frozen.status == HTTPStatus.OK:
+                    backend.set(
+                        key,
+                        frozen,
+                        ttl or current_app.config['CACHE_DEFAULT_TTL'],
+                        tags,
+                    )
+
+            endpoint = request.endpoint
+            hits = metrics.incr('cache.hits', int(is_hit), endpoint=endpoint)
+            misses = metrics.incr('cache.misses', int(not is_hit), endpoint=endpoint)
+            metrics.gauge('cache.hit_rate', round(hits / (hits + misses), 4), endpoint=endpoint)
+
+            return frozen
+        return decorator
+    return wrapper
+
+
+_coalesce_lock = Lock()
+_coalesce_in_flight = {}
+
+
+class _Flight:
+    """An in-flight computation that concurrent identical requests wait for; the leader lands it."""
+
+    def __init__(self, key):
+        self.key = key
+        self.done = Event()
+        self.frozen = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        with _coalesce_lock:
+            _coalesce_in_flight.pop(self.key, None)
+        self.done.set()
+
+    def lead(self, fn, *args, **kwargs):
+        with self:
+            frozen = freeze_response(fn(*args, **kwargs))
+            if frozen.status == HTTPStatus.OK:
+                self.frozen = frozen
+            return frozen
+
+
+def coalesced(vary_on=('query',)):
+    """
+    Coalesce concurrent identical GET requests of a method view handler.
+
+    The first request (per path, normalized query, response encoding and,
+    when it's a part of vary_on, identity) runs the handler; the concurrent ones within the
+    process wait for it and get the same serialized response. If it fails or
+    takes longer than COALESCE_WAIT_TIMEOUT, the waiting ones run the
+    handler themselves.
+
+    Place it below jwt_required and cached: cache misses are coalesced, and
+    the authorization is checked for every request.
+
+    :param vary_on: request parts to vary on: "query", "identity"
+    :return: decorator
+    """
+    def wrapper(fn):
+        @wraps(fn)
+        def decorator(*args, **kwargs):
+            if request.method not in {'GET', 'HEAD'}:
+                return fn(*args, **kwargs)
+
+            key = request_fingerprint((*vary_on, 'encoding'))
+            flight, is_leader = _coalesce_join(key)
+            if is_leader:
+                return flight.lead(fn, *args, **kwargs)
+
+            flight.done.wait(current_app.config['COALESCE_WAIT_TIMEOUT'])
+            if flight.frozen is not None:
+                metrics.incr('coalesce.shared', endpoint=request.endpoint)
+                return flight.frozen
+            return fn(*args, **kwargs)
+        return decorator
+    return wrapper
+
+
+def _coalesce_join(key):
+    # The in-flight computation of the key and whether this request is to run it
+    with _coalesce_lock:
+        flight = _coalesce_in_flight.get(key)
+        if flight is not None:
+            return flight, False
+        flight = _Flight(key)
+        _coalesce_in_flight[key] = flight
+        return flight, True
@@ -0,0 +1,127 @@
+"""Write-behind buffers for the writes that may lag behind the requests."""
+from atexit import register as atexit_register
+from contextlib import nullcontext
+from logging import getLogger
+from os import getpid
+from threading import Event, Lock, Thread
+
+from flask import current_app, has_app_context
+
+from myapp.lib.metrics import metrics
+
+__all__ = [
+    'WriteBehindBuffer',
+]
+
+LOG = getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """
+    Buffer that coalesces writes and flushes them in batches in the background.
+
+    Values added under the same key are merged, values without a key are
+    appended. A flush happens every WRITE_BEHIND_INTERVAL seconds or as soon
+    as WRITE_BEHIND_MAX_SIZE values are pending, and at exit.
+    """
+
+    instances = []
+
+    def __init__(self, name, flush, merge=None):
+        """
+        Initialize the buffer.
+
+        :param name: buffer name for logs and metrics
+        :param flush: callable(coalesced, appended); it's called within app context
+        :param merge: callable(old, new) -> value; the newest value wins by default
+        """
+        self.name = name
+        self.flush_pending = flush
+        self.merge = merge or (lambda old, new: new)
+        self.app = None
+        self._reset()
+        self.instances.append(self)
+
+    def add(self, value, key=None):
+        """
+        Add a value; it's called within app context.
+
+        :param value: value
+        :param key: coalescing key
+        """
+        if self._pid != getpid():
+            self._reset()
+
+        with self._lock:
+            if self.app is None:
+                self.app = current_app._get_current_object()  # noqa: WPS437
+
+            if key is None:
+                self._appended.append(value)
+            elif key in self._coalesced:
+                self._coalesced[key] = self.merge(self._coalesced[key], value)
+            else:
+                self._coalesced[key] = value
+            size = len(self._coalesced) + len(self._appended)
+
+            if self._thread is None:
+                self._thread = Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+        if size >= self.app.config['WRITE_BEHIND_MAX_SIZE']:
+            self._wakeup.set()
+
+    def flush(self):
+        """
+        Flush the pending values.
+
+        :return: number of flushed values
+        """
+        with self._flush_lock:
+            with self._lock:
+                coalesced, appended = self._coalesced, self._appended
+                self._coalesced, self._appended = {}, []
+
+            size = len(coalesced) + len(appended)
+            if not size:
+                return 0
+
+            # Pushing another context would end the current one's session on teardown
+            context = self.app.app_context()
+            if has_app_context() and current_app._get_current_object() is self.app:  # noqa: WPS437
+                context = nullcontext()
+            try:
+                with context:
+                    self.flush_pending(coalesced, appended)
+            except Exception:
+                LOG.exception(f'Write-behind buffer "{self.name}" lost {size} values.')
+                metrics.incr('write_behind.dropped', size, buffer=self.name)
+                return 0
+
+            metrics.incr('write_behind.flushed', size, buffer=self.name)
+            return size
+
+    @classmethod
+    def flush_all(cls):
+        """Flush every buffer; e.g. on worker exit."""
+        for buffer in cls.instances:
+            buffer.flush()
+
+    def _reset(self):
+        # A forked worker starts with its own state; the parent flushes its values by itself
+        self._pid = getpid()
+        self._lock = Lock()
+        self._flush_lock = Lock()
+        self._wakeup = Event()
+        self._thread = None
+        self._coalesced = {}
+        self._appended = []
+
+    def _run(self):
+        while True:  # noqa: WPS457
+            self._wakeup.wait(self.app.config['WRITE_BEHIND_INTERVAL'])
+            self._wakeup.clear()
+            self.flush()
+
+
+atexit_register(WriteBehindBuffer.flush_all)
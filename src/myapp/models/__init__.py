@@ -1,4 +1,8 @@
 """MYAPP data models."""
 from myapp.models.auth import (
     UserModel,
+    AuthEventModel,
+)
+from myapp.models.outbox import (
+    OutboxModel,
 )
@@ -3,6 +3,9 @@ from flask_security import UserMixin, RoleMixin, hash_password
 
 from myapp import db
 
+# Fits an IPv6 address with a zone index
+IP_ADDRESS_LENGTH = 64
+
 
 class UserModel(db.Model, UserMixin):
     """User model."""
@@ -41,6 +44,33 @@ class UserModel(db.Model, UserMixin):
         nullable=True,
         default=None,
     )
+    # SECURITY_TRACKABLE; written behind, see myapp.services.logins.track_login
+    last_login_at = db.Column(
+        db.TIMESTAMP,
+        nullable=True,
+        default=None,
+    )
+    current_login_at = db.Column(
+        db.TIMESTAMP,
+        nullable=True,
+        default=None,
+    )
+    last_login_ip = db.Column(
+        db.String(IP_ADDRESS_LENGTH),
+        nullable=True,
+        default=None,
+    )
+    current_login_ip = db.Column(
+        db.String(IP_ADDRESS_LENGTH),
+        nullable=True,
+        default=None,
+    )
+    login_count = db.Column(
+        db.Integer,
+        nullable=False,
+        default=0,
+        server_default='0',
+    )
 
     roles = db.relationship(
         'RoleModel',
@@ -182,6 +212,43 @@ class PermissionModel(db.Model):
         }
 
 
+class AuthEventModel(db.Model):
+    """Authentication audit event model."""
+
+    __tablename__ = 'auth_event'
+    __table_args__ = {
+        'comment': 'Authentication audit events',
+    }
+
+    id = db.Column(  # noqa: WPS125
+        db.Integer,
+        primary_key=True,
+        autoincrement=True,
+    )
+    kind = db.Column(
+        db.String,
+        nullable=False,
+    )
+    user_id = db.Column(
+        db.Integer,
+        db.ForeignKey('user.id'),
+        nullable=True,
+        index=True,
+    )
+    username = db.Column(
+        db.String,
+        nullable=True,
+    )
+    ip = db.Column(
+        db.String(IP_ADDRESS_LENGTH),
+        nullable=True,
+    )
+    created_at = db.Column(
+        db.TIMESTAMP,
+        nullable=False,
+    )
+
+
 user_roles = db.Table(
     'user_roles',
     db.Column(
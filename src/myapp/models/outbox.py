@@ -0,0 +1,57 @@
+"""MYAPP transactional outbox models."""
+from myapp import db
+
+
+class OutboxModel(db.Model):
+    """
+    Outgoing email; it's written in the same transaction as the change it's about.
+
+    The outbox worker delivers it later; see myapp.services.outbox.
+    """
+
+    __tablename__ = 'outbox'
+    __table_args__ = {
+        'comment': 'Outgoing emails',
+    }
+
+    id = db.Column(  # noqa: WPS125
+        db.Integer,
+        primary_key=True,
+        autoincrement=True,
+    )
+    recipient = db.Column(
+        db.String,
+        nullable=False,
+    )
+    subject = db.Column(
+        db.String,
+        nullable=False,
+    )
+    body = db.Column(
+        db.Text,
+        nullable=False,
+    )
+    created_at = db.Column(
+        db.TIMESTAMP,
+        nullable=False,
+    )
+    next_attempt_at = db.Column(
+        db.TIMESTAMP,
+        nullable=False,
+        index=True,
+    )
+    attempts = db.Column(
+        db.Integer,
+        nullable=False,
+        default=0,
+        server_default='0',
+    )
+    last_error = db.Column(
+        db.Text,
+        nullable=True,
+    )
+    sent_at = db.Column(
+        db.TIMESTAMP,
+        nullable=True,
+        default=None,
+    )
@@ -1,5 +1,6 @@
 """MYAPP serialization schemas."""
 from .auth import (
+    UserSchema,
     LoginRequestSchema,
     LoginResponseSchema,
     LogoutRequestSchema,
@@ -15,11 +16,29 @@ from .auth import (
     RestorePasswordRequestSchema,
     RestorePasswordResponseSchema,
 )
+from .registration import (
+    RegisterBulkRequestSchema,
+    RegisterBulkResponseSchema,
+)
 from .guys import (
     GuysRequestSchema,
     GuysResponseSchema,
 )
+from .users import (
+    UsersRequestSchema,
+    UsersResponseSchema,
+    UsersExportRequestSchema,
+)
 from .stats import (
     StatsRequestSchema,
     StatsResponseSchema,
 )
+from .batch import (
+    BatchRequestSchema,
+    BatchResponseSchema,
+)
+from .roles import (
+    UserRolesRequestSchema,
+    RolePermissionsRequestSchema,
+    AssignmentResponseSchema,
+)
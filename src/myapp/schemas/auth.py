@@ -21,6 +21,11 @@ class UserSchema(flask_marshmallow.Schema):
             'roles',
         ]
 
+    roles = fields.List(
+        fields.String(),
+        description='Role names.',
+    )
+
 
 class LoginRequestSchema(APIRequestSchema):
     """Login request."""
@@ -0,0 +1,80 @@
+"""Batch schemas."""
+from marshmallow import Schema, fields, validate
+
+from myapp import APIRequestSchema, APIResponseSchema
+
+
+class BatchItemRequestSchema(Schema):
+    """Batch sub-request."""
+
+    method = fields.String(
+        required=False,
+        missing='GET',
+        validate=validate.OneOf(['GET', 'POST', 'PUT', 'PATCH', 'DELETE']),
+    )
+    path = fields.String(
+        required=True,
+        validate=validate.Regexp(r'^/api/'),
+        description='Absolute API path, e.g. /api/v1/guys.',
+    )
+    query = fields.Dict(
+        keys=fields.String(),
+        required=False,
+        missing=dict,
+    )
+    body = fields.Raw(
+        required=False,
+        allow_none=True,
+        missing=None,
+        description='JSON body.',
+    )
+    headers = fields.Dict(
+        keys=fields.String(),
+        values=fields.String(),
+        required=False,
+        missing=dict,
+        description='Headers; Authorization and Accept-Language are inherited from the batch.',
+    )
+
+
+class BatchRequestSchema(APIRequestSchema):
+    """Batch request."""
+
+    requests = fields.List(
+        fields.Nested(BatchItemRequestSchema),
+        required=True,
+        validate=validate.Length(min=1),
+    )
+    concurrent = fields.Boolean(
+        required=False,
+        missing=False,
+        description='Run the sub-requests concurrently; they must be independent.',
+    )
+
+
+class BatchResponseSchema(APIResponseSchema):
+    """Batch response."""
+
+    data = fields.Nested('BatchDataSchema')
+
+
+class BatchDataSchema(Schema):
+    """Batch data."""
+
+    responses = fields.List(
+        fields.Nested('BatchItemResponseSchema'),
+        required=True,
+        description='Responses in the order of the sub-requests.',
+    )
+
+
+class BatchItemResponseSchema(Schema):
+    """Batch sub-response."""
+
+    status = fields.Integer(required=True)
+    headers = fields.Dict(required=True)
+    body = fields.Raw(
+        required=True,
+        allow_none=True,
+        description='Response envelope (JSON) or text.',
+    )
@@ -0,0 +1,66 @@
+"""Bulk registration serializers."""
+from marshmallow import Schema, fields, validate
+
+from myapp import APIRequestSchema, APIResponseSchema
+
+
+class RegisterBulkRequestSchema(APIRequestSchema):
+    """Bulk user registration request."""
+
+    users = fields.List(
+        fields.Dict(),
+        required=True,
+        validate=validate.Length(min=1),
+        description='RegisterRequestSchema items; validated one by one.',
+    )
+
+
+class RegisterBulkResponseSchema(APIResponseSchema):
+    """Bulk user registration response."""
+
+    data = fields.Nested('RegisterBulkDataSchema')
+
+
+class RegisterBulkDataSchema(Schema):
+    """Bulk user registration data (payload)."""
+
+    created = fields.Integer(
+        required=True,
+        description='Number of created users.',
+    )
+    failed = fields.Integer(
+        required=True,
+        description='Number of rejected items.',
+    )
+    results = fields.List(
+        fields.Nested('RegisterBulkItemSchema'),
+        required=True,
+        description='Per-item results in the request order.',
+    )
+
+
+class RegisterBulkItemSchema(Schema):
+    """Bulk user registration item result."""
+
+    index = fields.Integer(
+        required=True,
+        description='Item index in the request.',
+    )
+    status = fields.String(
+        required=True,
+        description='One of: created, invalid, duplicate, conflict.',
+    )
+    errors = fields.Dict(
+        required=False,
+        allow_none=True,
+        description='Item errors.',
+    )
+    user = fields.Nested(
+        'UserSchema',
+        required=False,
+        description='User info.',
+    )
+    confirmation_token_link = fields.String(
+        required=False,
+        description='Confirmation token link.',
+    )
@@ -0,0 +1,71 @@
+"""Roles schemas."""
+from marshmallow import Schema, fields, validate
+
+from myapp import APIRequestSchema, APIResponseSchema
+
+
+class UsersFilterSchema(Schema):
+    """Users filter; an empty filter is rejected unless "all" is set."""
+
+    usernames = fields.List(
+        fields.String(),
+        required=False,
+        validate=validate.Length(min=1),
+    )
+    active = fields.Boolean(
+        required=False,
+        description='Filter by the active flag.',
+    )
+    role = fields.String(
+        required=False,
+        description='Filter by a role the users have.',
+    )
+    all_users = fields.Boolean(
+        data_key='all',
+        required=False,
+        description='Match every user when no other filter is given.',
+    )
+
+
+class UserRolesRequestSchema(APIRequestSchema):
+    """Roles assignment request."""
+
+    roles = fields.List(
+        fields.String(),
+        required=True,
+        validate=validate.Length(min=1),
+    )
+    users = fields.Nested(
+        UsersFilterSchema,
+        required=True,
+    )
+
+
+class RolePermissionsRequestSchema(APIRequestSchema):
+    """Permissions assignment request."""
+
+    permissions = fields.List(
+        fields.String(),
+        required=True,
+        validate=validate.Length(min=1),
+    )
+    roles = fields.List(
+        fields.String(),
+        required=True,
+        validate=validate.Length(min=1),
+    )
+
+
+class AssignmentResponseSchema(APIResponseSchema):
+    """Assignment response."""
+
+    data = fields.Nested('AssignmentDataSchema')
+
+
+class AssignmentDataSchema(Schema):
+    """Assignment data."""
+
+    affected = fields.Integer(
+        required=True,
+        description='Number of assignments inserted or deleted.',
+    )
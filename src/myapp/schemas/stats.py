@@ -9,7 +9,7 @@ class StatsRequestSchema(APIRequestSchema):
 
     kind = fields.String(
         required=True,
-        description='What kind of stats do you want?',
+        description='What kind of stats do you want? A metric name prefix, e.g. "cache".',
     )
 
 
@@ -30,3 +30,9 @@ class StatsDataSchema(Schema):
         required=False,
         description='Free RAM amount.',
     )
+    metrics = fields.Dict(
+        keys=fields.String(),
+        values=fields.Number(),
+        required=False,
+        description='Process metrics by name, e.g. "cache.hit_rate{endpoint=guys.guys}".',
+    )
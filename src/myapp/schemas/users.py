@@ -0,0 +1,40 @@
+"""Users schemas."""
+from marshmallow import Schema, fields, validate
+
+from myapp import APIPaginationRequestSchema, APIRequestSchema, APIResponseSchema
+
+
+class UsersRequestSchema(APIPaginationRequestSchema):
+    """Users listing request."""
+
+    active = fields.Boolean(
+        required=False,
+        description='Filter by the active flag.',
+    )
+
+
+class UsersResponseSchema(APIResponseSchema):
+    """Users listing response; metadata.next_cursor points to the next page."""
+
+    data = fields.Nested('UsersDataSchema')
+
+
+class UsersDataSchema(Schema):
+    """Users listing data (payload)."""
+
+    users = fields.List(
+        fields.Nested('UserSchema'),
+        required=True,
+        description='Users ordered by id.',
+    )
+
+
+class UsersExportRequestSchema(APIRequestSchema):
+    """Users export request."""
+
+    format = fields.String(  # noqa: WPS125
+        required=False,
+        missing='ndjson',
+        validate=validate.OneOf(['ndjson', 'csv']),
+        description='Export format: ndjson or csv.',
+    )
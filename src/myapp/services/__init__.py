@@ -1,2 +1,8 @@
-"""Auth Service Package."""
+"""MYAPP services."""
+from myapp.services.outbox import *
 from myapp.services.auth import *
+from myapp.services.logins import *
+from myapp.services.registration import *
+from myapp.services.users import *
+from myapp.services.batch import *
+from myapp.services.roles import *
@@ -11,14 +11,30 @@ from flask_security.utils import hash_data, verify_hash
 from jwt import InvalidTokenError, decode as jwt_decode, encode as jwt_encode
 from itsdangerous import URLSafeTimedSerializer, SignatureExpired, BadSignature
 
-from myapp import APIError, UserModel
+from myapp import APIError, CannedError, UserModel
+from myapp.services.outbox import enqueue_mail
 
 LOG = getLogger(__name__)
 
+MAIL_SUBJECTS = {
+    'auth.confirm': 'MYAPP Registration Confirm.',
+    'auth.change_password': 'MYAPP Password Restore.',
+}
+
 __all__ = [
+    'AuthorizationRequiredError',
+    'UnsupportedAuthTypeError',
+    'TokenMissingError',
+    'TokenContainsSpacesError',
+    'InvalidJWTError',
+    'UnknownJWTUserError',
+    'InvalidCredentialsError',
+    'InsufficientRolesError',
+    'AnonymousRequiredError',
     'JWT',
     'jwt_required',
     'anonymous_required',
+    'roles_required',
     'register_user',
     'confirmation_token_link',
     'confirmation_token_check',
@@ -28,6 +44,63 @@ __all__ = [
 # TODO: Sessions?
 
 
+class AuthorizationRequiredError(CannedError):
+    message = "Authorization Required: request doesn't contain access token."
+    status = HTTPStatus.UNAUTHORIZED
+    http_status = HTTPStatus.UNAUTHORIZED
+
+    def __init__(self, realm):
+        super().__init__(headers={'WWW-Authenticate': f'JWT realm="{realm}"'})
+
+
+class UnsupportedAuthTypeError(CannedError):
+    message = 'Invalid JWT header: unsupported authorization type.'
+    status = HTTPStatus.UNAUTHORIZED
+    http_status = HTTPStatus.UNAUTHORIZED
+
+
+class TokenMissingError(CannedError):
+    message = 'Invalid JWT header: token missing.'
+    status = HTTPStatus.UNAUTHORIZED
+    http_status = HTTPStatus.UNAUTHORIZED
+
+
+class TokenContainsSpacesError(CannedError):
+    message = 'Invalid JWT header: token contains spaces.'
+    status = HTTPStatus.UNAUTHORIZED
+    http_status = HTTPStatus.UNAUTHORIZED
+
+
+class InvalidJWTError(CannedError):
+    message = 'Invalid JWT token'
+    status = HTTPStatus.UNAUTHORIZED
+    http_status = HTTPStatus.UNAUTHORIZED
+
+
+class UnknownJWTUserError(CannedError):
+    message = 'Invalid JWT: user does not exist or the username has changed.'
+    status = HTTPStatus.UNAUTHORIZED
+    http_status = HTTPStatus.UNAUTHORIZED
+
+
+class InvalidCredentialsError(CannedError):
+    message = 'Bad Request: invalid credentials'
+    status = HTTPStatus.UNAUTHORIZED
+    http_status = HTTPStatus.UNAUTHORIZED
+
+
+class InsufficientRolesError(CannedError):
+    message = 'Forbidden: insufficient roles.'
+    status = HTTPStatus.FORBIDDEN
+    http_status = HTTPStatus.FORBIDDEN
+
+
+class AnonymousRequiredError(CannedError):
+    message = 'Bad request: anonymous required.'
+    status = HTTPStatus.BAD_REQUEST
+    http_status = HTTPStatus.BAD_REQUEST
+
+
 class JWT:
     """
     Flask-JWT rework.
@@ -106,67 +179,35 @@ class JWT:
         auth_header_prefix = current_app.config['JWT_AUTH_HEADER_PREFIX']
 
         if not auth_header_value:
-            raise APIError(
-                "Authorization Required: request doesn't contain access token.",
-                metadata={
-                    'status': HTTPStatus.UNAUTHORIZED,
-                    'headers': {'WWW-Authenticate': f'JWT realm="{realm}"'},
-                },
-                http_status=HTTPStatus.UNAUTHORIZED,
-            )
+            raise AuthorizationRequiredError(realm)
 
         parts = auth_header_value.split()
 
         if parts[0].lower() != auth_header_prefix.lower():
-            raise APIError(
-                'Invalid JWT header: unsupported authorization type.',
-                metadata={'status': HTTPStatus.UNAUTHORIZED},
-                http_status=HTTPStatus.UNAUTHORIZED,
-            )
+            raise UnsupportedAuthTypeError()
         elif len(parts) == 1:
-            raise APIError(
-                'Invalid JWT header: token missing.',
-                metadata={'status': HTTPStatus.UNAUTHORIZED},
-                http_status=HTTPStatus.UNAUTHORIZED,
-            )
+            raise TokenMissingError()
         elif len(parts) > 2:
-            raise APIError(
-                'Invalid JWT header: token contains spaces.',
-                metadata={'status': HTTPStatus.UNAUTHORIZED},
-                http_status=HTTPStatus.UNAUTHORIZED,
-            )
+            raise TokenContainsSpacesError()
 
         token = parts[1]
 
         if token is None:
-            raise APIError(
-                "Authorization Required: request doesn't contain access token.",
-                metadata={
-                    'status': HTTPStatus.UNAUTHORIZED,
-                    'headers': {'WWW-Authenticate': f'JWT realm="{realm}"'},
-                },
-                http_status=HTTPStatus.UNAUTHORIZED,
-            )
+            raise AuthorizationRequiredError(realm)
 
         try:
             payload = cls.decode(token)
-        except InvalidTokenError:
-            LOG.exception('Invalid JWT token')
-            raise APIError(
-                'Invalid JWT token',
-                metadata={'status': HTTPStatus.UNAUTHORIZED},
-                http_status=HTTPStatus.UNAUTHORIZED,
-            )
+        except InvalidTokenError as error:
+            LOG.debug(f'Invalid JWT token: {error}')
+            raise InvalidJWTError()
 
-        user = UserModel.query.filter_by(username=payload.get('identity')).one_or_none()
+        # Before the lookup: a user that has just written reads from the primary
+        request.identity = payload.get('identity')
+        user = UserModel.query.filter_by(username=request.identity).one_or_none()
         _request_ctx_stack.top.user = user  # flask_login compatible
 
         if user is None:
-            raise APIError(
-                'Invalid JWT: user does not exist or the username has changed.',
-                metadata={'status': HTTPStatus.UNAUTHORIZED},
-                http_status=HTTPStatus.UNAUTHORIZED,
-            )
+            raise UnknownJWTUserError()
 
 
 def register_user(payload):
@@ -174,34 +215,49 @@ def register_user(payload):
     return UserModel.create_new_user(**payload)
 
 
+def confirmation_serializer():
+    """
+    Make the confirmation tokens serializer.
+
+    :return: serializer
+    """
+    return URLSafeTimedSerializer(
+        secret_key=current_app.config['SECRET_KEY'],
+        salt=current_app.config['SECRET_SALT'].encode(),
+    )
+
+
 def confirmation_token_link(user, endpoint='auth.confirm'):
     """
-    Create a confirmation token link based on user's email.
+    Create a confirmation token link based on user's email and queue it for mailing.
 
     :param user: UserModel
     :param endpoint: endpoint name; for URL generation
     :return: confirmation token link
     """
-    ser = URLSafeTimedSerializer(
-        secret_key=current_app.config['SECRET_KEY'],
-        salt=current_app.config['SECRET_SALT'].encode(),
-    )
+    ser = confirmation_serializer()
     token = ser.dumps([user.username, hash_data(user.email)])
 
     confirmation_link = url_for(endpoint, token=token, _external=True)
 
-    # FIXME: maybe a real email
-    # security._send_mail(
-    #     'MYAPP Registration Confirm.',
-    #     user.email,
-    #     "welcome",
-    #     user=user,  noqa: E800
-    #     confirmation_link=confirmation_link,  noqa: E800
-    # )  noqa: E800
+    # Delivered by the outbox worker once the caller commits
+    enqueue_mail(user.email, *link_mail(confirmation_link, endpoint))
 
     return confirmation_link  # noqa: WPS331
 
 
+def link_mail(link, endpoint):
+    """
+    Make the subject and the body of an email with a link.
+
+    :param link: link
+    :param endpoint: endpoint of the link
+    :return: subject, body
+    """
+    subject = MAIL_SUBJECTS[endpoint]
+    return subject, f'{subject}\n\nFollow the link: {link}\n'
+
+
 def confirmation_token_check(token):
     """
     Check a confirmation token.
@@ -209,10 +265,7 @@ def confirmation_token_check(token):
     :param token: A Token based on email.
     :return: is expired, is invalid, UserModel
     """
-    ser = URLSafeTimedSerializer(
-        secret_key=current_app.config['SECRET_KEY'],
-        salt=current_app.config['SECRET_SALT'].encode(),
-    )
+    ser = confirmation_serializer()
     user = None
     max_age = current_app.config['SECURITY_CONFIRM_WITHIN']
     expired = False
@@ -263,16 +316,29 @@ def jwt_required(realm=None):
     return wrapper
 
 
+def roles_required(*roles):
+    """View decorator that requires the current user to have all the roles.
+
+    Place it below jwt_required.
+
+    :param roles: role names
+    """
+    def wrapper(fn):
+        @wraps(fn)
+        def decorator(*args, **kwargs):
+            if not all(current_user.has_role(role) for role in roles):
+                raise InsufficientRolesError()
+            return fn(*args, **kwargs)
+        return decorator
+    return wrapper
+
+
 def anonymous_required(f):
     """Enforce anonymous authorization."""
     @wraps(f)
     def wrapper(*args, **kwargs):
         """Enforce anonymous authorization."""
         if current_user.is_authenticated:
-            raise APIError(
-                'Bad request: anonymous required.',
-                metadata={'status': HTTPStatus.BAD_REQUEST},
-                http_status=HTTPStatus.BAD_REQUEST,
-            )
+            raise AnonymousRequiredError()
         return f(*args, **kwargs)
     return wrapper
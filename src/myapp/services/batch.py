@@ -0,0 +1,146 @@
+"""Batch Service: sub-requests are dispatched through the view functions in-process."""
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from contextvars import copy_context
+from http import HTTPStatus
+from os import getpid
+from threading import Lock
+
+from flask import current_app, request
+from werkzeug.test import EnvironBuilder
+
+from myapp import CannedError, db, json_loads
+
+BATCH_ENVIRON_KEY = 'myapp.batch'
+INHERITED_HEADERS = ('Authorization', 'Accept-Language')
+
+__all__ = [
+    'BATCH_ENVIRON_KEY',
+    'NotBatchableError',
+    'dispatch_batch',
+]
+
+
+class NotBatchableError(CannedError):
+    message = 'Bad request: the endpoint cannot be called in a batch.'
+    status = HTTPStatus.BAD_REQUEST
+    http_status = HTTPStatus.BAD_REQUEST
+
+
+class _BatchThreads:
+    # The sub-request threads of this process; they're started on the first use
+
+    def __init__(self):
+        self._lock = Lock()
+        self._executor = None
+        self._pid = None
+
+    def get(self, threads):
+        with self._lock:
+            # A forked worker doesn't inherit the threads
+            if self._executor is None or self._pid != getpid():
+                self._executor = ThreadPoolExecutor(threads, thread_name_prefix='batch')
+                self._pid = getpid()
+            return self._executor
+
+
+_batch_threads = _BatchThreads()
+
+
+def sub_request_environ(item):
+    """
+    Make a WSGI environ of a sub-request; it inherits the batch identity.
+
+    :param item: BatchItemRequestSchema data
+    :return: WSGI environ
+    """
+    # The batch queue time counts against the sub-requests' budgets too
+    inherited = (*INHERITED_HEADERS, current_app.config['ADMISSION_QUEUE_START_HEADER'])
+    headers = {name: request.headers[name] for name in inherited if name in request.headers}
+    # The sub-requests are logged under the batch correlation ID
+    connection_id = getattr(request, 'connection_id', None)
+    if connection_id:
+        headers[current_app.config['CONNECTION_ID_HEADER']] = connection_id
+    headers.update(item['headers'])
+    # The sub-responses are embedded in the batch envelope, which has its own encoding
+    headers['Accept'] = 'application/json'
+    with closing(EnvironBuilder(
+        path=item['path'],
+        base_url=request.url_root,
+        method=item['method'],
+        query_string=item['query'],
+        headers=headers,
+        json=item['body'],
+        environ_base={
+            'REMOTE_ADDR': request.remote_addr,
+            BATCH_ENVIRON_KEY: True,
+        },
+    )) as builder:
+        return builder.get_environ()
+
+
+def check_batchable():
+    """
+    Check the view of a sub-request can be called in a batch.
+
+    :raises NotBatchableError: when it cannot
+    """
+    view = current_app.view_functions.get(request.endpoint)
+    if not getattr(getattr(view, 'view_class', None), 'batchable', True):
+        raise NotBatchableError()
+
+
+def dispatch(app, environ):
+    """
+    Dispatch a sub-request.
+
+    The sub-request goes through the same hooks (correlation ID, admission
+    by the view priority, logging), view decorators and response
+    finalizing as a standalone request. It ends with a rollback, as a
+    standalone request ends its session: a failed sub-request leaves
+    neither a broken transaction nor pending objects to the next one.
+
+    :param app: flask application
+    :param environ: WSGI environ
+    :return: BatchItemResponseSchema data
+    """
+    with app.request_context(environ):
+        try:
+            check_batchable()
+            response = app.full_dispatch_request()
+        except NotBatchableError as error:
+            response = app.finalize_request(app.handle_user_exception(error))
+        finally:
+            db.session.rollback()
+
+        body = response.get_data()
+        return {
+            'status': response.status_code,
+            'headers': {k: v for k, v in response.headers.items() if k != 'Content-Length'},
+            'body': json_loads(body) if response.is_json else body.decode('utf8'),
+        }
+
+
+def dispatch_batch(items, concurrent=False):
+    """
+    Dispatch the sub-requests of a batch.
+
+    Sequential sub-requests share the batch database session; concurrent
+    ones run in a pool of BATCH_THREADS threads with their own sessions.
+
+    :param items: BatchItemRequestSchema data
+    :param concurrent: run concurrently
+    :return: BatchItemResponseSchema data, in the order of the items
+    """
+    app = current_app._get_current_object()  # noqa: WPS437
+    environs = [sub_request_environ(item) for item in items]
+
+    if not concurrent:
+        return [dispatch(app, environ) for environ in environs]
+
+    executor = _batch_threads.get(current_app.config['BATCH_THREADS'])
+    futures = [
+        executor.submit(copy_context().run, dispatch, app, environ)
+        for environ in environs
+    ]
+    return [future.result() for future in futures]
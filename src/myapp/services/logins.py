@@ -0,0 +1,78 @@
+"""Login tracking Service: logins and auth events are written behind."""
+from datetime import datetime
+
+from flask import request
+from sqlalchemy import bindparam, func
+
+from myapp import AuthEventModel, UserModel, WriteBehindBuffer, db
+
+__all__ = [
+    'track_login',
+    'auth_writes',
+]
+
+
+def track_login(username, user=None, succeeded=True):
+    """
+    Track a login attempt; it's written behind, see auth_writes.
+
+    :param username: requested username
+    :param user: UserModel or None
+    :param succeeded: is the login successful
+    """
+    now = datetime.utcnow()
+    ip = request.remote_addr
+    auth_writes.add({
+        'kind': 'login' if succeeded else 'login_failed',
+        'user_id': None if user is None else user.id,
+        'username': username,
+        'ip': ip,
+        'created_at': now,
+    })
+    if succeeded:
+        auth_writes.add(
+            {'count': 1, 'at': now, 'ip': ip, 'previous_at': None, 'previous_ip': None},
+            key=user.id,
+        )
+
+
+def _merge_logins(old, new):
+    """Coalesce logins of a user: the latest is current, the one before it is the last."""
+    return {
+        'count': old['count'] + new['count'],
+        'at': new['at'],
+        'ip': new['ip'],
+        'previous_at': old['at'],
+        'previous_ip': old['ip'],
+    }
+
+
+def _flush_auth_writes(logins, events):
+    """Write the coalesced logins with a single UPDATE and the events with a single INSERT."""
+    user = UserModel.__table__
+    update = user.update().where(user.c.id == bindparam('user_id')).values(
+        login_count=user.c.login_count + bindparam('count'),
+        # Without a previous login in the batch, the last one is in the row
+        last_login_at=func.coalesce(
+            bindparam('previous_at', type_=db.TIMESTAMP),
+            user.c.current_login_at,
+        ),
+        last_login_ip=func.coalesce(
+            bindparam('previous_ip', type_=db.String),
+            user.c.current_login_ip,
+        ),
+        current_login_at=bindparam('at', type_=db.TIMESTAMP),
+        current_login_ip=bindparam('ip', type_=db.String),
+    )
+    # Not the session: a flush may happen amid a request's transaction
+    with db.engine.begin() as connection:
+        if logins:
+            connection.execute(
+                update,
+                [dict(login, user_id=user_id) for user_id, login in logins.items()],
+            )
+        if events:
+            connection.execute(AuthEventModel.__table__.insert(), events)
+
+
+auth_writes = WriteBehindBuffer('auth', flush=_flush_auth_writes, merge=_merge_logins)
@@ -0,0 +1,186 @@
+"""Outbox Service: emails are queued with the change and delivered by a worker."""
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from logging import getLogger
+from smtplib import SMTP, SMTPException
+
+from flask import current_app
+
+from myapp import OutboxModel, db, metrics
+
+LOG = getLogger(__name__)
+
+__all__ = [
+    'mail_message',
+    'enqueue_mail',
+    'deliver_outbox',
+    'prune_outbox',
+]
+
+
+def mail_message(recipient, subject, body):
+    """
+    Make an outbox row; e.g. for bulk inserts.
+
+    :param recipient: email address
+    :param subject: subject
+    :param body: plain text body
+    :return: OutboxModel columns
+    """
+    now = datetime.utcnow()
+    return {
+        'recipient': recipient,
+        'subject': subject,
+        'body': body,
+        'created_at': now,
+        'next_attempt_at': now,
+        'attempts': 0,
+    }
+
+
+def enqueue_mail(recipient, subject, body):
+    """
+    Queue an email in the current session; it's sent only if the session commits.
+
+    :param recipient: email address
+    :param subject: subject
+    :param body: plain text body
+    :return: OutboxModel
+    """
+    message = OutboxModel(**mail_message(recipient, subject, body))
+    db.session.add(message)
+    return message
+
+
+def deliver_outbox(batch_size):
+    """
+    Deliver a batch of due emails over a single SMTP connection.
+
+    The batch is claimed with SKIP LOCKED and leased for OUTBOX_LEASE seconds
+    in a short transaction, so workers may run in parallel and no transaction
+    stays open while sending; a crashed worker's batch is retried once the
+    lease runs out. Failed emails are retried with exponential backoff up to
+    OUTBOX_MAX_ATTEMPTS.
+
+    :param batch_size: max number of emails
+    :return: (sent, failed)
+    """
+    claimed = _claim_outbox(batch_size)
+    if not claimed:
+        return 0, 0
+
+    sent, errors = _send_outbox(claimed)
+
+    now = datetime.utcnow()
+    if sent:
+        OutboxModel.query.filter(OutboxModel.id.in_(sent)).update(
+            {'sent_at': now},
+            synchronize_session=False,
+        )
+    last_error = None
+    for message_id, (attempts, error) in errors.items():
+        last_error = str(error)
+        OutboxModel.query.filter_by(id=message_id).update(
+            {'last_error': last_error, 'next_attempt_at': now + _backoff(attempts)},
+            synchronize_session=False,
+        )
+    db.session.commit()
+
+    metrics.incr('outbox.sent', len(sent))
+    metrics.incr('outbox.failed', len(errors))
+    if errors:
+        LOG.warning(
+            f'Outbox: {len(errors)} of {len(claimed)} emails failed; last error: {last_error}',
+        )
+    return len(sent), len(errors)
+
+
+def prune_outbox(batch_size):
+    """
+    Delete a batch of the emails sent more than OUTBOX_RETENTION seconds ago.
+
+    :param batch_size: max number of emails
+    :return: number of deleted emails
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config['OUTBOX_RETENTION'])
+    expired = (
+        db.session.query(OutboxModel.id)
+        .filter(OutboxModel.sent_at < cutoff)
+        .order_by(OutboxModel.id)
+        .limit(batch_size)
+        .subquery()
+    )
+    deleted = OutboxModel.query.filter(OutboxModel.id.in_(expired)).delete(
+        synchronize_session=False,
+    )
+    db.session.commit()
+    return deleted
+
+
+def _claim_outbox(batch_size):
+    # (id, attempts, email) of the leased emails; the lease is committed right away
+    config = current_app.config
+    now = datetime.utcnow()
+    messages = (
+        OutboxModel.query
+        .filter(
+            OutboxModel.sent_at.is_(None),
+            OutboxModel.next_attempt_at <= now,
+            OutboxModel.attempts < config['OUTBOX_MAX_ATTEMPTS'],
+        )
+        .order_by(OutboxModel.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    claimed = []
+    for message in messages:
+        message.attempts += 1
+        message.next_attempt_at = now + timedelta(seconds=config['OUTBOX_LEASE'])
+        claimed.append((message.id, message.attempts, _email(message)))
+    db.session.commit()
+    return claimed
+
+
+def _send_outbox(claimed):
+    # Sent ids and {id: (attempts, error)} of the failed ones
+    sent, errors = [], {}
+    try:
+        smtp = _smtp_connect()
+    except (OSError, SMTPException) as error:
+        return sent, {message_id: (attempts, error) for message_id, attempts, _ in claimed}
+
+    with smtp:
+        for message_id, attempts, email in claimed:
+            try:
+                smtp.send_message(email)
+            except (OSError, SMTPException) as error:
+                errors[message_id] = (attempts, error)
+            else:
+                sent.append(message_id)
+    return sent, errors
+
+
+def _backoff(attempts):
+    config = current_app.config
+    backoff = config['OUTBOX_BACKOFF'] * 2 ** (attempts - 1)
+    return timedelta(seconds=min(backoff, config['OUTBOX_BACKOFF_MAX']))
+
+
+def _smtp_connect():
+    config = current_app.config
+    smtp = SMTP(config['MAIL_SERVER'], config['MAIL_PORT'], timeout=config['MAIL_TIMEOUT'])
+    if config['MAIL_USE_TLS']:
+        smtp.starttls()
+    if config['MAIL_USERNAME']:
+        smtp.login(config['MAIL_USERNAME'], config['MAIL_PASSWORD'])
+    return smtp
+
+
+def _email(message):
+    email = EmailMessage()
+    email['From'] = current_app.config['MAIL_DEFAULT_SENDER']
+    email['To'] = message.recipient
+    email['Subject'] = message.subject
+    email.set_content(message.body)
+    return email
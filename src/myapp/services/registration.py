@@ -0,0 +1,252 @@
+"""Bulk Registration Service."""
+from atexit import register as register_atexit
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+from logging import getLogger
+from multiprocessing import get_context
+from os import getpid
+from threading import Lock
+
+from flask import current_app, url_for
+from flask_security.utils import get_hmac, use_double_hash
+from marshmallow import ValidationError
+from passlib.context import CryptContext
+from sqlalchemy.exc import IntegrityError
+
+from myapp import OutboxModel, UserModel, compile_schema, db, schemas
+from myapp.services.auth import confirmation_serializer, link_mail
+from myapp.services.outbox import mail_message
+
+LOG = getLogger(__name__)
+
+__all__ = [
+    'HashPool',
+    'hash_pool',
+    'register_users',
+]
+
+
+class HashPool:
+    """The password hashing processes of this process; they're started on the first use."""
+
+    def __init__(self):
+        """Initialize the pool."""
+        self._lock = Lock()
+        self._executor = None
+        self._pid = None
+
+    def get(self, workers):
+        """
+        Get the executor.
+
+        :param workers: number of processes
+        :return: ProcessPoolExecutor
+        """
+        with self._lock:
+            # A forked worker doesn't inherit the processes; spawned ones don't inherit the threads
+            if self._executor is None or self._pid != getpid():
+                self._executor = ProcessPoolExecutor(workers, mp_context=get_context('spawn'))
+                self._pid = getpid()
+                register_atexit(self.shutdown)
+            return self._executor
+
+    def shutdown(self):
+        """Stop the processes; see gunicorn_config.worker_exit."""
+        with self._lock:
+            if self._executor is not None and self._pid == getpid():
+                self._executor.shutdown()
+            self._executor = None
+            self._pid = None
+
+
+hash_pool = HashPool()
+
+
+def register_users(payloads):
+    """
+    Register new users in bulk.
+
+    Every item is validated against RegisterRequestSchema; duplicates are
+    detected with a query per chunk; passwords are hashed in parallel by
+    REGISTER_BULK_HASH_WORKERS processes; users are inserted in chunks with
+    a single transaction per chunk. A chunk that conflicts with a
+    concurrent registration is retried item by item.
+
+    :param payloads: RegisterRequestSchema-like items
+    :return: per-item results
+    """
+    results = [{'index': index} for index in range(len(payloads))]
+    new = _exclude_existing(_exclude_invalid(results, payloads))
+    _prepare_users(new)
+
+    chunk_size = current_app.config['REGISTER_BULK_CHUNK_SIZE']
+    for start in range(0, len(new), chunk_size):
+        chunk = new[start:start + chunk_size]
+        for result, _ in chunk:
+            if result['token']:
+                result['link'] = url_for('auth.confirm', token=result['token'], _external=True)
+        try:
+            _insert_users(chunk)
+        except IntegrityError:
+            LOG.warning('Bulk registration chunk conflicted; retrying it item by item.')
+            db.session.rollback()
+            chunk = _insert_users_one_by_one(chunk)
+        _created(chunk)
+
+    return results
+
+
+def _insert_users(chunk):
+    rows = [dict(item, active=True) for _, item in chunk]
+    messages = [
+        mail_message(row['email'], *link_mail(result['link'], 'auth.confirm'))
+        for (result, _), row in zip(chunk, rows)
+        if result.get('link')
+    ]
+    db.session.execute(UserModel.__table__.insert(), rows)
+    if messages:
+        db.session.execute(OutboxModel.__table__.insert(), messages)
+    db.session.commit()
+
+
+def _insert_users_one_by_one(chunk):
+    inserted = []
+    for result, item in chunk:
+        try:
+            _insert_users([(result, item)])
+        except IntegrityError:
+            db.session.rollback()
+            result.pop('token')
+            result.pop('link', None)
+            result.update(status='conflict', errors={'_schema': ['Already registered.']})
+        else:
+            inserted.append((result, item))
+    return inserted
+
+
+def _created(inserted):
+    """Report the inserted users; they're loaded back for the generated columns."""
+    if not inserted:
+        return
+
+    usernames = [item['username'] for _, item in inserted]
+    users = {
+        user.username: user
+        for user in UserModel.query.filter(UserModel.username.in_(usernames))
+    }
+    is_exposed = current_app.debug or current_app.testing
+    for result, item in inserted:
+        result.pop('token')
+        link = result.pop('link', None)
+        result.update(status='created', user=users[item['username']])
+        if link and is_exposed:
+            result['confirmation_token_link'] = link
+
+
+def _exclude_invalid(results, payloads):
+    loader = compile_schema(schemas.RegisterRequestSchema())
+    accepted = []
+    seen_usernames = set()
+    seen_emails = set()
+    for result, payload in zip(results, payloads):
+        try:
+            item = loader.load(payload)
+        except ValidationError as error:
+            result.update(status='invalid', errors=error.messages)
+            continue
+
+        if item['username'] in seen_usernames or item['email'] in seen_emails:
+            result.update(status='duplicate', errors={'_schema': ['Duplicate in the batch.']})
+            continue
+
+        seen_usernames.add(item['username'])
+        seen_emails.add(item['email'])
+        accepted.append((result, item))
+    return accepted
+
+
+def _exclude_existing(accepted):
+    if not accepted:
+        return accepted
+
+    existing_usernames = _existing(UserModel.username, [item['username'] for _, item in accepted])
+    existing_emails = _existing(UserModel.email, [item['email'] for _, item in accepted])
+
+    new = []
+    for result, item in accepted:
+        if item['username'] in existing_usernames or item['email'] in existing_emails:
+            result.update(status='duplicate', errors={'_schema': ['Already registered.']})
+        else:
+            new.append((result, item))
+    return new
+
+
+def _existing(column, values):
+    # A query per chunk keeps the bind parameters under the SQLite limit
+    chunk_size = current_app.config['REGISTER_BULK_CHUNK_SIZE']
+    existing = set()
+    for start in range(0, len(values), chunk_size):
+        query = db.session.query(column).filter(column.in_(values[start:start + chunk_size]))
+        existing.update(row[0] for row in query)
+    return existing
+
+
+def _prepare_users(new):
+    """Hash the passwords and make the confirmation tokens; the hashing is CPU-bound."""
+    if not new:
+        return
+
+    serializer = confirmation_serializer()
+    for (result, item), (password, email_hash) in zip(new, _hash_users(new)):
+        item['password'] = password
+        result['token'] = None
+        if email_hash is not None:
+            result['token'] = serializer.dumps([item['username'], email_hash])
+
+
+def _hash_users(new):
+    is_double_hash = use_double_hash()
+    passwords = [
+        get_hmac(item['password']).decode('ascii') if is_double_hash else item['password']
+        for _, item in new
+    ]
+    emails = [item['email'].encode('utf8') for _, item in new]
+
+    hash_user = partial(_hash_user, _hashing_contexts())
+    workers = current_app.config['REGISTER_BULK_HASH_WORKERS']
+    if workers <= 1:
+        return map(hash_user, passwords, emails)
+    chunksize = max(len(new) // (workers * 4), 1)
+    return hash_pool.get(workers).map(hash_user, passwords, emails, chunksize=chunksize)
+
+
+def _hashing_contexts():
+    # The processes get the Flask-Security hashing setup as plain strings
+    security = current_app.extensions['security']
+    config = current_app.config
+    return (
+        security.pwd_context.to_string(),
+        security.hashing_context.to_string() if config['SECURITY_CONFIRMABLE'] else None,
+        config.get('SECURITY_PASSWORD_HASH_OPTIONS', {}).get(security.password_hash, {}),
+    )
+
+
+@lru_cache(maxsize=None)
+def _crypt_context(config):
+    return CryptContext.from_string(config)
+
+
+def _hash_user(contexts, password, email):
+    """
+    Hash a password and an email like Flask-Security does; it's run in the hashing processes.
+
+    :param contexts: password context, hashing context (None to skip the email) and hash options
+    :param password: password, HMAC-ed if the double hash is used
+    :param email: email bytes
+    :return: password hash, email hash
+    """
+    pwd_context, hashing_context, options = contexts
+    email_hash = None
+    if hashing_context is not None:
+        email_hash = _crypt_context(hashing_context).hash(email)
+    return _crypt_context(pwd_context).hash(password, **options), email_hash
@@ -0,0 +1,161 @@
+"""Roles Service: set-based role and permission assignments."""
+from http import HTTPStatus
+from logging import getLogger
+
+from sqlalchemy import and_, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from myapp import APIError, UserModel, cache, db
+from myapp.models.auth import PermissionModel, RoleModel, role_permissions, user_roles
+
+LOG = getLogger(__name__)
+
+__all__ = [
+    'assign_roles',
+    'revoke_roles',
+    'assign_permissions',
+    'revoke_permissions',
+]
+
+
+def assign_roles(roles, usernames=None, active=None, role=None, all_users=False):  # noqa: WPS211
+    """
+    Assign roles to the users matching a filter with a single INSERT ... SELECT.
+
+    :param roles: role names
+    :param usernames: filter by usernames
+    :param active: filter by the active flag
+    :param role: filter by a role the users have
+    :param all_users: allow an empty filter matching every user
+    :return: number of new assignments
+    """
+    role_ids = _ids_by_name(RoleModel, roles)
+    users_criteria = _users_criteria(usernames, active, role, all_users)
+    query = select([UserModel.id, RoleModel.id]).where(
+        and_(RoleModel.id.in_(role_ids), *users_criteria),
+    )
+    affected = _insert_from_select(user_roles, ('u_id', 'r_id'), query)
+    LOG.info(f'Assigned roles {roles}: {affected} new assignments.')
+    if affected:
+        cache.invalidate('users')
+    return affected
+
+
+def revoke_roles(roles, usernames=None, active=None, role=None, all_users=False):  # noqa: WPS211
+    """
+    Revoke roles from the users matching a filter with a single DELETE.
+
+    :param roles: role names
+    :param usernames: filter by usernames
+    :param active: filter by the active flag
+    :param role: filter by a role the users have
+    :param all_users: allow an empty filter matching every user
+    :return: number of deleted assignments
+    """
+    role_ids = _ids_by_name(RoleModel, roles)
+    criteria = [user_roles.c.r_id.in_(role_ids)]
+    users_criteria = _users_criteria(usernames, active, role, all_users)
+    if users_criteria:
+        users = select([UserModel.id]).where(and_(*users_criteria))
+        criteria.append(user_roles.c.u_id.in_(users))
+
+    affected = _delete(user_roles, criteria)
+    LOG.info(f'Revoked roles {roles}: {affected} assignments.')
+    if affected:
+        cache.invalidate('users')
+    return affected
+
+
+def assign_permissions(permissions, roles):
+    """
+    Assign permissions to roles with a single INSERT ... SELECT.
+
+    Nothing cached depends on the permissions; authorization is checked per request.
+
+    :param permissions: permission names
+    :param roles: role names
+    :return: number of new assignments
+    """
+    permission_ids = _ids_by_name(PermissionModel, permissions)
+    role_ids = _ids_by_name(RoleModel, roles)
+    query = select([RoleModel.id, PermissionModel.id]).where(
+        and_(RoleModel.id.in_(role_ids), PermissionModel.id.in_(permission_ids)),
+    )
+    affected = _insert_from_select(role_permissions, ('r_id', 'p_id'), query)
+    LOG.info(f'Assigned permissions {permissions} to roles {roles}: {affected}.')
+    return affected
+
+
+def revoke_permissions(permissions, roles):
+    """
+    Revoke permissions from roles with a single DELETE.
+
+    :param permissions: permission names
+    :param roles: role names
+    :return: number of deleted assignments
+    """
+    permission_ids = _ids_by_name(PermissionModel, permissions)
+    role_ids = _ids_by_name(RoleModel, roles)
+    affected = _delete(role_permissions, [
+        role_permissions.c.r_id.in_(role_ids),
+        role_permissions.c.p_id.in_(permission_ids),
+    ])
+    LOG.info(f'Revoked permissions {permissions} from roles {roles}: {affected}.')
+    return affected
+
+
+def _users_criteria(usernames, active, role, all_users):
+    criteria = []
+    if usernames:
+        criteria.append(UserModel.username.in_(usernames))
+    if active is not None:
+        criteria.append(UserModel.active.is_(active))
+    if role is not None:
+        # Aliased: the statements select from role and delete from user_roles themselves
+        having = user_roles.alias('having_roles')
+        having_role = RoleModel.__table__.alias('having_role')
+        criteria.append(UserModel.id.in_(
+            select([having.c.u_id])
+            .select_from(having.join(having_role, having_role.c.id == having.c.r_id))
+            .where(having_role.c.name == role),
+        ))
+
+    # An empty filter changes the roles of everyone: it must be asked for explicitly
+    if not criteria and not all_users:
+        raise APIError(
+            'Bad request: the users filter is empty; set "all" to match every user.',
+            metadata={'status': HTTPStatus.BAD_REQUEST},
+            http_status=HTTPStatus.BAD_REQUEST,
+        )
+    return criteria
+
+
+def _ids_by_name(model, names):
+    rows = db.session.query(model.id, model.name).filter(model.name.in_(names)).all()
+    unknown = set(names).difference(name for _, name in rows)
+    if unknown:
+        names = ', '.join(sorted(unknown))
+        raise APIError(
+            f'Bad request: unknown {model.__tablename__}s: {names}.',
+            metadata={'status': HTTPStatus.BAD_REQUEST},
+            http_status=HTTPStatus.BAD_REQUEST,
+        )
+    return [id_ for id_, _ in rows]
+
+
+def _insert_from_select(table, columns, query):
+    # Existing assignments are skipped: ON CONFLICT DO NOTHING or INSERT OR IGNORE
+    if db.engine.dialect.name == 'postgresql':
+        statement = pg_insert(table).from_select(columns, query).on_conflict_do_nothing()
+    else:
+        statement = table.insert().from_select(columns, query)
+        statement = statement.prefix_with('OR IGNORE', dialect='sqlite')
+    affected = db.session.execute(statement).rowcount
+    db.session.commit()
+    return affected
+
+
+def _delete(table, criteria):
+    affected = db.session.execute(table.delete().where(and_(*criteria))).rowcount
+    db.session.commit()
+    return affected
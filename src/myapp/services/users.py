@@ -0,0 +1,102 @@
+"""Users Service."""
+from csv import writer as csv_writer
+from io import StringIO
+from json import dumps as json_dumps
+from logging import getLogger
+
+from sqlalchemy.orm import lazyload, selectinload
+
+from myapp import UserModel, keyset_paginate, schemas
+
+LOG = getLogger(__name__)
+
+__all__ = [
+    'EXPORT_FORMATS',
+    'export_users',
+    'list_users',
+]
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def list_users(limit, cursor=None, active=None, with_roles=True):
+    """
+    List users page by page; ordered by id.
+
+    :param limit: page size
+    :param cursor: cursor of the previous page
+    :param active: filter by the active flag
+    :param with_roles: load roles; otherwise they aren't loaded unless accessed
+    :return: users, next page cursor or None
+    """
+    roles_loading = selectinload if with_roles else lazyload
+    query = UserModel.query.options(roles_loading(UserModel.roles))
+    if active is not None:
+        query = query.filter(UserModel.active.is_(active))
+
+    return keyset_paginate(query, (UserModel.id,), limit, cursor)
+
+
+def export_users(export_format='ndjson', batch_size=1000):
+    """
+    Export all users row by row with constant memory.
+
+    The rows are fetched with a server-side cursor (where the driver supports
+    it) in batches of batch_size; roles are loaded per batch with SELECT IN.
+
+    :param export_format: one of EXPORT_FORMATS
+    :param batch_size: rows per fetch and per yielded chunk
+    :yield: text chunks
+    """
+    schema = schemas.UserSchema()
+    query = (
+        UserModel.query
+        .options(selectinload(UserModel.roles))
+        .order_by(UserModel.id)
+        .execution_options(stream_results=True)
+        .yield_per(batch_size)
+    )
+
+    if export_format == 'csv':
+        serialize = _csv_serializer(schema)
+        yield serialize(None)
+    else:
+        serialize = _ndjson_serializer(schema)
+
+    chunk = []
+    for user in query:
+        chunk.append(serialize(user))
+        if len(chunk) >= batch_size:
+            yield ''.join(chunk)
+            chunk.clear()
+
+    if chunk:
+        yield ''.join(chunk)
+
+
+def _ndjson_serializer(schema):
+    def serialize(user):
+        return json_dumps(schema.dump(user), ensure_ascii=False, separators=(',', ':')) + '\n'
+    return serialize
+
+
+def _csv_serializer(schema):
+    columns = schema.Meta.fields
+    buffer = StringIO()
+    writer = csv_writer(buffer)
+
+    def serialize(user):
+        if user is None:
+            writer.writerow(columns)
+        else:
+            row = schema.dump(user)
+            row['roles'] = ','.join(row['roles'])
+            writer.writerow([row[column] for column in columns])
+        line = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return line
+    return serialize
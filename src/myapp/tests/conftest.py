@@ -1,4 +1,5 @@
 """MYAPP tests configuration."""
+from flask import Blueprint
 from pytest import fixture
 
 from myapp import create_app
@@ -18,3 +19,22 @@ def setup_some():
 def setup_app():
     app = create_app()
     return app
+
+
+@fixture(scope='session', name='register_views')
+def setup_register_views(app):
+    """
+    Set up a registrar of ad-hoc views; each blueprint is registered once per session.
+
+    :param app: flask application
+    :return: function of the blueprint name, {rule: view function} and the URL prefix
+        that returns a test client
+    """
+    def register_views(name, views, url_prefix=None):
+        if name not in app.blueprints:
+            blueprint = Blueprint(name, __name__, url_prefix=url_prefix)
+            for rule, view_func in views.items():
+                blueprint.add_url_rule(rule, view_func=view_func)
+            app.register_blueprint(blueprint)
+        return app.test_client()
+    return register_views
@@ -0,0 +1,67 @@
+"""
+Test admission control.
+"""
+from time import time
+
+from pytest import fixture
+
+from myapp import AdmissionController, APIMethodView, APIResponseSchema, admission, metrics
+
+
+@fixture(name='client')
+def setup_client(register_views):
+    """
+    Set up a client of a view per priority.
+
+    :param register_views: ad-hoc views registrar
+    :return: client
+    """
+    views = {}
+    for priority in ('critical', 'high', 'low'):
+        view = type(f'{priority}View', (APIMethodView,), {
+            'priority': priority,
+            'schema': APIResponseSchema(),
+            'get': lambda self, _: (self.schema, {'data': {}}),
+        })
+        views[f'/test_admission/{priority}'] = view.as_view(priority)
+    return register_views('test_admission', views)
+
+
+class TestAdmissionController:
+    """Test load shedding."""
+
+    def test_queue_time(self):
+        """Test queue start header formats."""
+        now = time()
+        for value in (f't={now - 1}', str(int((now - 1) * 1e3)), str(int((now - 1) * 1e6))):
+            assert 0.9 < AdmissionController.queue_time(value) < 1.5
+        assert AdmissionController.queue_time('garbage') is None
+
+    def test_shed_by_queue_time(self, client):
+        """Test the low priority is shed first and the critical one is never shed."""
+        headers = {'X-Request-Start': f't={time() - 1}'}
+
+        response = client.get('/test_admission/low', headers=headers)
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+        assert client.get('/test_admission/high', headers=headers).status_code == 200
+        assert client.get('/test_admission/critical', headers=headers).status_code == 200
+        shed = metrics.get(
+            'admission.shed',
+            endpoint='test_admission.low',
+            priority='low',
+            reason='queue_time',
+        )
+        assert shed >= 1
+
+    def test_shed_by_concurrency(self, app, client, monkeypatch):
+        """Test the in-flight requests are limited by the priority share."""
+        monkeypatch.setitem(app.config, 'ADMISSION_MAX_CONCURRENCY', 10)
+
+        admission.in_flight += 5
+        try:
+            assert client.get('/test_admission/low').status_code == 503
+            assert client.get('/test_admission/high').status_code == 200
+        finally:
+            admission.in_flight -= 5
+        assert client.get('/test_admission/low').status_code == 200
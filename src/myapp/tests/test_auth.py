@@ -1,5 +1,22 @@
 from flask import url_for, testing
-from pytest import mark
+from flask_security.utils import verify_password
+from pytest import fixture, mark
+from sqlalchemy import event
+
+from myapp import (
+    JWT,
+    AuthEventModel,
+    OutboxModel,
+    TokenContainsSpacesError,
+    UserModel,
+    auth_writes,
+    confirmation_token_check,
+    db,
+    register_users,
+    revoke_roles,
+    track_login,
+)
+from myapp.models.auth import RoleModel
 
 
 @mark.usefixtures('client_class')
@@ -17,3 +34,197 @@ class TestAuthViews:
         )
 
         assert res.status_code == 401
+
+    def test_auth_register_bulk_requires_token(self):
+        client: testing.FlaskClient = self.client
+
+        res = client.post(
+            url_for('auth.register_bulk'),
+            json={
+                'users': [
+                    {'username': 'me', 'email': 'me@example.com', 'password': 'me'},
+                ],
+            },
+        )
+
+        assert res.status_code == 401
+        assert res.headers['WWW-Authenticate'].startswith('JWT realm=')
+        assert res.json['metadata']['message'].startswith('Authorization Required')
+
+    def test_auth_canned_errors(self):
+        client: testing.FlaskClient = self.client
+        headers = {'Authorization': 'JWT a b'}
+
+        first = client.post(url_for('auth.register_bulk'), json={}, headers=headers)
+        second = client.post(url_for('auth.register_bulk'), json={}, headers=headers)
+
+        assert first.status_code == 401
+        assert first.get_data() == second.get_data()
+        assert first.json['metadata']['message'] == 'Invalid JWT header: token contains spaces.'
+        assert first.headers['X-Connection-ID'] != second.headers['X-Connection-ID']
+        assert (TokenContainsSpacesError,) in client.application.canned_responses
+
+
+def test_track_login_is_written_behind(app):
+    user = UserModel(username='tracked', email='tracked@example.com', password='x')
+    db.session.add(user)
+    db.session.commit()
+    auth_writes.flush()
+    try:
+        for ip in ('10.0.0.1', '10.0.0.2', '10.0.0.3'):
+            with app.test_request_context(environ_base={'REMOTE_ADDR': ip}):
+                track_login('tracked', user)
+        track_login('tracked', user, succeeded=False)
+
+        assert auth_writes.flush() == 5
+        db.session.refresh(user)
+        assert user.login_count == 3
+        assert (user.last_login_ip, user.current_login_ip) == ('10.0.0.2', '10.0.0.3')
+        kinds = [event.kind for event in AuthEventModel.query.filter_by(user_id=user.id)]
+        assert sorted(kinds) == ['login', 'login', 'login', 'login_failed']
+    finally:
+        AuthEventModel.query.filter_by(user_id=user.id).delete()
+        db.session.delete(user)
+        db.session.commit()
+
+
+@fixture(name='bulk_users')
+def setup_bulk_users(app):
+    """
+    Set up an existing user; the bulk registered ones are deleted afterwards.
+
+    :param app: flask application
+    :return: existing user
+    """
+    user = UserModel(username='test-bulk-old', email='test-bulk-old@example.com', password='x')
+    db.session.add(user)
+    db.session.commit()
+    yield user
+
+    db.session.rollback()
+    UserModel.query.filter(UserModel.username.like('test-bulk-%')).delete(synchronize_session=False)
+    OutboxModel.query.filter(OutboxModel.recipient.like('test-bulk-%')).delete(
+        synchronize_session=False,
+    )
+    db.session.commit()
+
+
+@mark.parametrize('workers', [1, 2])
+def test_register_users(app, bulk_users, monkeypatch, workers):
+    """Test the per-item results, the duplicates and the chunked inserts."""
+    monkeypatch.setitem(app.config, 'REGISTER_BULK_CHUNK_SIZE', 2)
+    monkeypatch.setitem(app.config, 'REGISTER_BULK_HASH_WORKERS', workers)
+    # Expose the confirmation links
+    monkeypatch.setitem(app.config, 'TESTING', True)
+    inserts = []
+
+    def count_inserts(conn, cursor, statement, *args):
+        if statement.startswith('INSERT INTO user '):
+            inserts.append(statement)
+
+    payloads = [
+        {'username': 'test-bulk-1', 'email': 'test-bulk-1@example.com', 'password': 'a'},
+        {'username': 'test-bulk-2', 'email': 'nope', 'password': 'b'},
+        {'username': 'test-bulk-1', 'email': 'test-bulk-3@example.com', 'password': 'c'},
+        {'username': 'test-bulk-4', 'email': 'test-bulk-1@example.com', 'password': 'd'},
+        {'username': 'test-bulk-old', 'email': 'test-bulk-5@example.com', 'password': 'e'},
+        {'username': 'test-bulk-6', 'email': 'test-bulk-old@example.com', 'password': 'f'},
+        # A username equal to an email of another item isn't a duplicate
+        {'username': 'test-bulk-7@example.com', 'email': 'test-bulk-7@example.com', 'password': 'g'},
+        {'username': 'test-bulk-8', 'email': 'test-bulk-1', 'password': 'h'},
+        {'username': 'test-bulk-9', 'email': 'test-bulk-9@example.com', 'password': 'i'},
+    ]
+    engine = db.get_engine(app)
+    event.listen(engine, 'before_cursor_execute', count_inserts)
+    try:
+        results = register_users(payloads)
+    finally:
+        event.remove(engine, 'before_cursor_execute', count_inserts)
+
+    assert [result['index'] for result in results] == list(range(len(payloads)))
+    statuses = [result['status'] for result in results]
+    assert statuses == [
+        'created',
+        'invalid',
+        'duplicate',
+        'duplicate',
+        'duplicate',
+        'duplicate',
+        'created',
+        'invalid',
+        'created',
+    ]
+    assert results[1]['errors'] == {'email': ['Not a valid email address.']}
+    assert results[2]['errors'] == {'_schema': ['Duplicate in the batch.']}
+    assert results[4]['errors'] == {'_schema': ['Already registered.']}
+    assert len(inserts) == 2
+
+    user = UserModel.query.filter_by(username='test-bulk-9').one()
+    assert results[8]['user'].id == user.id
+    assert verify_password('i', user.password)
+    token = results[8]['confirmation_token_link'].split('token=')[-1]
+    expired, invalid, confirmed = confirmation_token_check(token)
+    assert (expired, invalid, confirmed.username) == (False, False, 'test-bulk-9')
+
+
+def test_register_users_conflict(app, bulk_users, monkeypatch):
+    """Test a chunk conflicting with a concurrent registration is retried item by item."""
+    # The concurrent registration lands between the duplicates query and the insert
+    monkeypatch.setattr('myapp.services.registration._exclude_existing', lambda accepted: accepted)
+    payloads = [
+        {'username': 'test-bulk-1', 'email': 'test-bulk-1@example.com', 'password': 'a'},
+        {'username': 'test-bulk-old', 'email': 'test-bulk-2@example.com', 'password': 'b'},
+        {'username': 'test-bulk-3', 'email': 'test-bulk-3@example.com', 'password': 'c'},
+    ]
+
+    results = register_users(payloads)
+
+    assert [result['status'] for result in results] == ['created', 'conflict', 'created']
+    assert results[1]['errors'] == {'_schema': ['Already registered.']}
+    assert all(results[index]['user'].id is not None for index in (0, 2))
+    assert OutboxModel.query.filter(OutboxModel.recipient.like('test-bulk-%')).count() == 2
+
+
+@fixture(name='bulk_admin')
+def setup_bulk_admin(bulk_users):
+    """
+    Make the existing user an admin.
+
+    :param bulk_users: existing user
+    :return: admin
+    """
+    admin_role = RoleModel.query.filter_by(name='admin').one_or_none()
+    admin_created = admin_role is None
+    bulk_users.roles.append(admin_role or RoleModel(name='admin'))
+    db.session.commit()
+    yield bulk_users
+
+    db.session.rollback()
+    revoke_roles(['admin'], usernames=['test-bulk-old'])
+    if admin_created:
+        RoleModel.query.filter_by(name='admin').delete(synchronize_session=False)
+    db.session.commit()
+
+
+def test_register_bulk_replay_is_authorized(client, bulk_admin):
+    """Test a replayed bulk registration is authorized again."""
+    headers = {
+        'Authorization': f'JWT {JWT.encode(bulk_admin).decode()}',
+        'Idempotency-Key': 'test-bulk-replay',
+    }
+    body = {
+        'users': [
+            {'username': 'test-bulk-1', 'email': 'test-bulk-1@example.com', 'password': 'a'},
+        ],
+    }
+    url = url_for('auth.register_bulk')
+
+    assert client.post(url, json=body, headers=headers).status_code == 200
+    db.session.remove()
+    replayed = client.post(url, json=body, headers=headers)
+    assert replayed.headers['Idempotent-Replayed'] == 'true'
+
+    revoke_roles(['admin'], usernames=['test-bulk-old'])
+    db.session.commit()
+    db.session.remove()
+    assert client.post(url, json=body, headers=headers).status_code == 403
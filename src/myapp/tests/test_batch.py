@@ -0,0 +1,206 @@
+"""
+Test batch endpoint.
+"""
+from flask import url_for
+from pytest import fixture, importorskip, mark
+
+from myapp import (
+    APIMethodView,
+    APIResponseSchema,
+    NotBatchableError,
+    OutboxModel,
+    UserModel,
+    admission,
+    db,
+)
+
+
+@fixture(name='batch_views')
+def setup_batch_views(register_views):
+    """
+    Set up a database view per priority.
+
+    :param register_views: ad-hoc views registrar
+    """
+    views = {}
+    for priority in ('high', 'low'):
+        view = type(f'{priority}View', (APIMethodView,), {
+            'priority': priority,
+            'schema': APIResponseSchema(),
+            'get': lambda view, _: (view.schema, {'data': {'users': UserModel.query.count()}}),
+        })
+        views[f'/{priority}'] = view.as_view(priority)
+    register_views('test_batch', views, url_prefix='/api/test_batch')
+
+
+@fixture(name='taken_user')
+def setup_taken_user(app):
+    """
+    Set up a registered user; the users registered by the test are deleted afterwards.
+
+    :param app: flask application
+    :return: UserModel
+    """
+    user = UserModel(
+        username='test-batch-taken',
+        email='test-batch-taken@example.com',
+        password='x',
+    )
+    db.session.add(user)
+    db.session.commit()
+    yield user
+
+    db.session.rollback()
+    OutboxModel.query.filter(OutboxModel.recipient.like('test-batch-%')).delete(
+        synchronize_session=False,
+    )
+    UserModel.query.filter(UserModel.username.like('test-batch-%')).delete(
+        synchronize_session=False,
+    )
+    db.session.commit()
+
+
+def batch(client, paths):
+    """
+    Make a sequential batch.
+
+    pytest-flask keeps the outer app context, so the session is ended manually.
+
+    :param client: test client
+    :param paths: sub-requests paths
+    :return: sub-responses statuses
+    """
+    requests = [{'path': path} for path in paths]
+    response = client.post(url_for('batch.batch'), json={'requests': requests})
+    db.session.remove()
+    return [sub['status'] for sub in response.json['data']['responses']]
+
+
+@mark.usefixtures('client_class')
+class TestBatchView:
+    """Test batch endpoint."""
+
+    @mark.parametrize('concurrent', [False, True])
+    def test_batch(self, concurrent):
+        """Test the sub-requests are dispatched in order through the views."""
+        res = self.client.post(
+            url_for('batch.batch'),
+            json={
+                'concurrent': concurrent,
+                'requests': [
+                    {'path': '/api/v1/nope'},
+                    {'path': '/api/v1/auth/register/bulk', 'method': 'POST', 'body': {'users': []}},
+                    {'path': '/api/v1/guys', 'headers': {'Authorization': 'JWT a b'}},
+                    {'path': '/api/v1/batch', 'method': 'POST', 'body': {'requests': [{'path': '/api/v1/nope'}]}},
+                ],
+            },
+        )
+
+        assert res.status_code == 200
+        responses = res.json['data']['responses']
+        assert [response['status'] for response in responses] == [404, 401, 401, 400]
+        assert responses[2]['body']['metadata']['message'] == 'Invalid JWT header: token contains spaces.'
+        assert responses[3]['body']['metadata']['message'] == 'Bad request: batches cannot be nested.'
+        assert responses[0]['headers']['Content-Type'] == 'application/json'
+
+    def test_batch_limit(self, app, monkeypatch):
+        """Test the number of sub-requests is limited."""
+        monkeypatch.setitem(app.config, 'BATCH_MAX_REQUESTS', 1)
+        res = self.client.post(
+            url_for('batch.batch'),
+            json={'requests': [{'path': '/api/v1/nope'}, {'path': '/api/v1/nope'}]},
+        )
+
+        assert res.status_code == 413
+
+    @mark.usefixtures('batch_views')
+    def test_bulkheads(self, app, monkeypatch):
+        """Test each sequential sub-request takes the quota of its own endpoint."""
+        quotas = {'test_batch.low': {'connections': 1, 'timeout': 0.01}}
+        monkeypatch.setitem(app.config, 'SQLALCHEMY_BULKHEADS', quotas)
+
+        high, low = '/api/test_batch/high', '/api/test_batch/low'
+        assert batch(self.client, [high, low]) == [200, 200]
+
+        bulkhead = db.get_bulkhead(app, 'test_batch.low')
+        bulkhead.acquire()
+        try:
+            statuses = batch(self.client, [high, low, high])
+        finally:
+            bulkhead.release()
+        assert statuses == [200, 503, 200]
+
+    @mark.usefixtures('batch_views')
+    def test_admission(self, app, monkeypatch):
+        """Test each sub-request is admitted by its own view priority."""
+        monkeypatch.setitem(app.config, 'ADMISSION_MAX_CONCURRENCY', 10)
+        monkeypatch.setattr(admission, 'in_flight', admission.in_flight + 4)
+
+        statuses = batch(self.client, ['/api/test_batch/low', '/api/test_batch/high'])
+        assert statuses == [503, 200]
+
+    @mark.parametrize('concurrent', [False, True])
+    def test_failed_sub_request(self, taken_user, concurrent):
+        """Test a failed sub-request leaves neither a broken transaction nor its objects."""
+        requests = [
+            {
+                'path': '/api/v1/auth/register',
+                'method': 'POST',
+                'body': {'username': username, 'email': email, 'password': 'x'},
+            }
+            for username, email in (
+                (taken_user.username, 'test-batch-other@example.com'),
+                ('test-batch-fresh', 'test-batch-fresh@example.com'),
+            )
+        ]
+        res = self.client.post(
+            url_for('batch.batch'),
+            json={'concurrent': concurrent, 'requests': requests},
+        )
+        db.session.remove()
+
+        statuses = [sub['status'] for sub in res.json['data']['responses']]
+        assert statuses == [500, 200]
+        registered = UserModel.query.filter(UserModel.username.like('test-batch-%'))
+        assert {user.email for user in registered} == {
+            'test-batch-taken@example.com',
+            'test-batch-fresh@example.com',
+        }
+
+    def test_hooks(self):
+        """Test the sub-requests go through the request hooks under the batch correlation ID."""
+        res = self.client.post(
+            url_for('batch.batch'),
+            json={'requests': [{'path': '/api/v1/nope'}, {'path': '/api/v1/nope'}]},
+            headers={'X-Connection-ID': 'test-batch-connection'},
+        )
+
+        subs = res.json['data']['responses']
+        assert [sub['headers']['X-Connection-ID'] for sub in subs] == ['test-batch-connection'] * 2
+
+    def test_not_batchable(self):
+        """Test the streamed export is rejected instead of being buffered."""
+        res = self.client.post(
+            url_for('batch.batch'),
+            json={'requests': [{'path': '/api/v1/users/export'}]},
+        )
+
+        sub = res.json['data']['responses'][0]
+        assert sub['status'] == 400
+        assert sub['body']['metadata']['message'] == NotBatchableError.message
+
+    def test_binary_accept(self):
+        """Test the sub-responses are JSON whatever the sub-request accepts."""
+        importorskip('msgpack')
+        res = self.client.post(
+            url_for('batch.batch'),
+            json={'requests': [
+                {'path': '/api/v1/guys', 'headers': {'Accept': 'application/msgpack'}},
+            ]},
+        )
+
+        assert res.status_code == 200
+        sub = res.json['data']['responses'][0]
+        assert sub['status'] == 401
+        assert sub['headers']['Content-Type'] == 'application/json'
+        assert sub['body']['metadata']['status'] == 401
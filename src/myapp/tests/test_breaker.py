@@ -0,0 +1,154 @@
+"""
+Test database circuit breaker.
+"""
+from time import monotonic, sleep
+
+from pytest import raises
+from sqlalchemy import event, text
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+from myapp import APIMethodView, APIResponseSchema, DatabaseUnavailableError, UserModel, db, metrics
+
+
+def faulty_engine():
+    """
+    Make an in-memory SQLite stand-in that fails the statements on demand.
+
+    :return: engine, fault switch
+    """
+    fault = [False]
+    engine = db.create_engine(make_url('sqlite://'), {})
+
+    @event.listens_for(engine, 'connect')
+    def connect(dbapi_connection, _):
+        # A non-zero progress handler result interrupts the statement
+        dbapi_connection.set_progress_handler(lambda: fault[0], 1)
+
+    return engine, fault
+
+
+def execute(engine, breaker):
+    """
+    Execute a statement through the breaker.
+
+    :param engine: engine
+    :param breaker: circuit breaker
+    """
+    breaker.allow()
+    try:
+        with engine.connect() as connection:
+            connection.execute(text('SELECT 1'))
+    except OperationalError:  # noqa: S110
+        pass
+
+
+class TestCircuitBreaker:
+    """Test circuit breaker."""
+
+    def test_breaker(self, app, monkeypatch):
+        """Test it opens on failures, fails fast and closes after successful probes."""
+        monkeypatch.setitem(app.config, 'DB_BREAKER_MIN_CALLS', 4)
+        monkeypatch.setitem(app.config, 'DB_BREAKER_OPEN_SECONDS', 60)
+        monkeypatch.setitem(app.config, 'DB_BREAKER_PROBES', 2)
+        engine, fault = faulty_engine()
+        breaker = db.get_breaker(engine, app)
+
+        fault[0] = True
+        for _ in range(4):
+            execute(engine, breaker)
+        assert breaker.state == 'open'
+        assert metrics.get('db.breaker.state', bind=breaker.name) == 2
+
+        with raises(DatabaseUnavailableError) as error:
+            breaker.allow()
+        assert error.value.metadata['headers']['Retry-After'] == '60'
+
+        breaker.open_seconds = 0
+        breaker.opened_until = 0
+        fault[0] = False
+        execute(engine, breaker)
+        assert breaker.state == 'half_open'
+        execute(engine, breaker)
+        assert breaker.state == 'closed'
+
+    def test_try_allow(self, app, monkeypatch):
+        """Test a breaker that's only asked whether to allow (e.g. a replica's) half-opens."""
+        monkeypatch.setitem(app.config, 'DB_BREAKER_MIN_CALLS', 1)
+        engine, fault = faulty_engine()
+        breaker = db.get_breaker(engine, app)
+
+        fault[0] = True
+        execute(engine, breaker)
+        assert not breaker.try_allow()
+
+        breaker.opened_until = 0
+        assert breaker.try_allow()
+        assert breaker.state == 'half_open'
+
+    def test_unreported_probes(self, app, monkeypatch):
+        """Test the probes that never report count as failed instead of blocking for good."""
+        monkeypatch.setitem(app.config, 'DB_BREAKER_MIN_CALLS', 1)
+        monkeypatch.setitem(app.config, 'DB_BREAKER_PROBES', 2)
+        monkeypatch.setitem(app.config, 'DB_BREAKER_SLOW_CALL', 0.05)
+        engine, fault = faulty_engine()
+        breaker = db.get_breaker(engine, app)
+
+        fault[0] = True
+        execute(engine, breaker)
+        breaker.opened_until = 0
+        breaker.allow()
+        breaker.allow()
+        with raises(DatabaseUnavailableError):
+            breaker.allow()
+        assert breaker.state == 'half_open'
+
+        sleep(0.05)
+        with raises(DatabaseUnavailableError):
+            breaker.allow()
+        assert breaker.state == 'open'
+
+        breaker.opened_until = 0
+        breaker.allow()
+        assert breaker.state == 'half_open'
+
+    def test_checkout_timeout(self, app, monkeypatch):
+        """Test a pool checkout timeout counts as a failure."""
+        monkeypatch.setitem(app.config, 'DB_BREAKER_MIN_CALLS', 1)
+        engine = db.create_engine(make_url('sqlite://'), {
+            'poolclass': QueuePool,
+            'pool_size': 1,
+            'max_overflow': 0,
+            'pool_timeout': 0.01,
+        })
+        breaker = db.get_breaker(engine, app)
+        session = db.create_session({'bind': engine})()
+
+        with engine.connect():
+            with raises(PoolTimeoutError):
+                session.execute(text('SELECT 1'))
+        session.close()
+        assert breaker.state == 'open'
+
+    def test_fast_fail_response(self, app, register_views, monkeypatch):
+        """Test an open breaker of the primary answers 503 without touching the database."""
+        class BreakerView(APIMethodView):
+            schema = APIResponseSchema()
+
+            def get(self, _):
+                return self.schema, {'data': {'users': UserModel.query.count()}}
+
+        client = register_views('test_breaker', {'/test_breaker': BreakerView.as_view('breaker')})
+
+        breaker = db.get_breaker(db.get_engine(app), app)
+        assert client.get('/test_breaker').status_code == 200
+        try:
+            monkeypatch.setattr(breaker, 'open_seconds', 30)
+            breaker._set_state('open', monotonic())
+
+            response = client.get('/test_breaker')
+            assert response.status_code == 503
+            assert response.headers['Retry-After'] == '30'
+        finally:
+            breaker._set_state('closed', monotonic())
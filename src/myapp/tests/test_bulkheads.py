@@ -0,0 +1,49 @@
+"""
+Test database connections bulkheads.
+"""
+from myapp import APIMethodView, APIResponseSchema, UserModel, db, metrics
+
+
+def get(client):
+    """
+    Request the test view; pytest-flask keeps the outer app context, so end the session manually.
+
+    :param client: test client
+    :return: response
+    """
+    response = client.get('/test_bulkhead')
+    db.session.remove()
+    return response
+
+
+class TestBulkhead:
+    """Test connections quotas."""
+
+    def test_bulkhead(self, app, register_views, monkeypatch):
+        """Test the quota is taken per request, given back at teardown and enforced."""
+        class BulkheadView(APIMethodView):
+            schema = APIResponseSchema()
+
+            def get(self, _):
+                return self.schema, {'data': {'users': UserModel.query.count()}}
+
+        views = {'/test_bulkhead': BulkheadView.as_view('bulkhead')}
+        client = register_views('test_bulkhead', views)
+        quota = {'connections': 1, 'timeout': 0.01}
+        monkeypatch.setitem(app.config['SQLALCHEMY_BULKHEADS'], 'test_bulkhead', quota)
+
+        assert get(client).status_code == 200
+        assert get(client).status_code == 200
+
+        bulkhead = db.get_bulkhead(app, 'test_bulkhead.bulkhead')
+        bulkhead.acquire()
+        try:
+            response = get(client)
+        finally:
+            bulkhead.release()
+
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+        assert metrics.get('db.bulkhead.exhausted', bulkhead='test_bulkhead') == 1
+        assert metrics.get('db.bulkhead.rejected', bulkhead='test_bulkhead') == 1
+        assert get(client).status_code == 200
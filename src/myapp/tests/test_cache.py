@@ -0,0 +1,119 @@
+"""
+Test response cache.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from time import sleep
+
+from flask import request
+
+from myapp import (
+    APIMethodView,
+    APIResponseSchema,
+    FrozenResponse,
+    LRUCacheBackend,
+    cached,
+    coalesced,
+    metrics,
+)
+
+
+class TestLRUCacheBackend:
+    """Test LRU cache backend."""
+
+    def test_bounded(self):
+        """Test the least recently used entry is evicted."""
+        cache = LRUCacheBackend(max_entries=2)
+        cache.set('a', 1, ttl=60)
+        cache.set('b', 2, ttl=60)
+        assert cache.get('a') == 1
+        cache.set('c', 3, ttl=60)
+
+        assert cache.get('b') is None
+        assert cache.get('a') == 1
+        assert cache.get('c') == 3
+
+    def test_ttl(self):
+        """Test expired entries are dropped."""
+        cache = LRUCacheBackend()
+        cache.set('a', 1, ttl=0.01)
+        sleep(0.02)
+
+        assert cache.get('a') is None
+
+    def test_invalidate(self):
+        """Test invalidation by tags."""
+        cache = LRUCacheBackend()
+        cache.set('a', 1, ttl=60, tags=('users',))
+        cache.set('b', 2, ttl=60, tags=('users', 'guys'))
+        cache.set('c', 3, ttl=60, tags=('guys',))
+
+        assert cache.invalidate('users') == 2
+        assert cache.get('a') is None
+        assert cache.get('b') is None
+        assert cache.get('c') == 3
+
+
+class TestCached:
+    """Test cached decorator."""
+
+    def test_cached(self, app, register_views):
+        """Test the view runs once and the hits return the same bytes."""
+        calls = []
+
+        class CachedView(APIMethodView):
+            schema = APIResponseSchema()
+
+            @cached(ttl=60, tags=('test',))
+            def get(self, _):
+                calls.append(1)
+                return self.schema, {'data': {'calls': len(calls)}}
+
+        client = register_views('test_cache', {'/test_cache': CachedView.as_view('cached')})
+
+        first = client.get('/test_cache?a=1')
+        second = client.get('/test_cache?a=1')
+        assert len(calls) == 1
+        assert first.get_data() == second.get_data()
+
+        client.get('/test_cache?a=2')
+        assert len(calls) == 2
+
+        with app.app_context():
+            app.extensions['cache'].invalidate('test')
+        client.get('/test_cache?a=1')
+        assert len(calls) == 3
+
+    def test_frozen_response_dumps(self):
+        """Test frozen response round trip."""
+        frozen = FrozenResponse(b'{}', 200, (('Content-Type', 'application/json'),))
+
+        assert FrozenResponse.loads(frozen.dumps()) == frozen
+
+
+class TestCoalesced:
+    """Test coalesced decorator."""
+
+    def test_coalesced(self, register_views):
+        """Test concurrent identical requests share one handler call."""
+        calls = []
+
+        class CoalescedView(APIMethodView):
+            schema = APIResponseSchema()
+
+            @coalesced()
+            def get(self, _):
+                calls.append(1)
+                sleep(0.2)
+                return self.schema, {'data': {'a': request.args['a']}}
+
+        views = {'/test_coalesce': CoalescedView.as_view('coalesced')}
+
+        def get(query):
+            return register_views('test_coalesce', views).get(f'/test_coalesce?{query}').get_data()
+
+        with ThreadPoolExecutor(4) as executor:
+            bodies = list(executor.map(get, ['a=1&b=2', 'b=2&a=1', 'a=1&b=2', 'a=2']))
+
+        assert len(calls) == 2
+        assert bodies[0] == bodies[1] == bodies[2] != bodies[3]
+        assert metrics.get('coalesce.shared', endpoint='test_coalesce.coalesced') == 2
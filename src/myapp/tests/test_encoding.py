@@ -0,0 +1,68 @@
+"""
+Test binary response encodings.
+"""
+from json import dumps, loads
+
+from flask import url_for
+from pytest import fixture, importorskip, mark
+
+from myapp import Codec
+from myapp.lib.encoding import CODEC_FACTORIES, _codecs  # noqa: WPS450
+
+MIMETYPE = 'application/x-test'
+
+
+@fixture(name='test_codec')
+def setup_test_codec(app, monkeypatch):
+    """
+    Enable a JSON-based codec under a test mimetype.
+
+    :param app: flask application
+    :param monkeypatch: monkeypatch fixture
+    :return: codec
+    """
+    codec = Codec(dumps=lambda obj: dumps(obj).encode('utf8'), loads=loads)
+    monkeypatch.setitem(CODEC_FACTORIES, MIMETYPE, lambda: codec)
+    monkeypatch.setitem(app.config, 'BINARY_CODECS', [*app.config['BINARY_CODECS'], MIMETYPE])
+    yield codec
+    _codecs.pop(MIMETYPE, None)
+
+
+@mark.usefixtures('client_class')
+class TestEncoding:
+    """Test the content negotiation."""
+
+    def test_negotiation(self, test_codec):
+        """Test the envelope, canned ones included, is encoded as accepted."""
+        for _ in range(2):
+            res = self.client.post(
+                url_for('auth.login'),
+                data=test_codec.dumps({'username': 'nobody', 'password': 'x'}),
+                headers={'Content-Type': MIMETYPE, 'Accept': f'{MIMETYPE}, application/json;q=0.5'},
+            )
+            assert res.status_code == 401
+            assert res.headers['Content-Type'] == MIMETYPE
+            assert 'Accept' in res.headers['Vary']
+            assert test_codec.loads(res.get_data())['metadata']['status'] == 401
+
+        res = self.client.post(url_for('auth.login'), json={'username': 'nobody', 'password': 'x'})
+        assert res.headers['Content-Type'] == 'application/json'
+        assert res.json['metadata']['status'] == 401
+
+    def test_invalid_body(self, test_codec):
+        """Test an undecodable body is a bad request."""
+        res = self.client.post(url_for('auth.login'), data=b'{', headers={'Content-Type': MIMETYPE})
+
+        assert res.status_code == 400
+
+    def test_msgpack(self):
+        """Test the msgpack codec round trip."""
+        importorskip('msgpack')
+        res = self.client.post(
+            url_for('auth.login'),
+            json={'username': 'nobody', 'password': 'x'},
+            headers={'Accept': 'application/msgpack'},
+        )
+
+        assert res.headers['Content-Type'] == 'application/msgpack'
+        assert _codecs['application/msgpack'].loads(res.get_data())['metadata']['status'] == 401
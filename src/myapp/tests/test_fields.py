@@ -0,0 +1,64 @@
+"""
+Test sparse fieldsets.
+"""
+from marshmallow import Schema, fields
+from pytest import fixture, raises
+
+from myapp import APIMethodView, APIRequestSchema, APIResponseSchema, is_field_requested, parse, sparse_schema
+
+
+class ThingsSchema(Schema):
+    name = fields.String()
+    secret = fields.String()
+
+
+class ThingsResponseSchema(APIResponseSchema):
+    data = fields.Nested(ThingsSchema)
+
+
+class ThingsView(APIMethodView):
+    schema = ThingsResponseSchema()
+
+    @parse(APIRequestSchema(), location='query')
+    def get(self, _, __):
+        secret_requested = is_field_requested('data.secret')
+        return self.schema, {'data': {'name': str(secret_requested), 'secret': 'x'}}
+
+
+@fixture(name='client')
+def setup_client(register_views):
+    """
+    Set up a client of a view with a nested response and a strict query schema.
+
+    :param register_views: ad-hoc views registrar
+    :return: client
+    """
+    return register_views('test_fields', {'/test_fields': ThingsView.as_view('things')})
+
+
+class TestSparseFields:
+    """Test the fields= parameter."""
+
+    def test_sparse_schema(self):
+        """Test the pruned schema is cached and keeps the required metadata."""
+        schema = ThingsResponseSchema()
+        pruned = sparse_schema(schema, ('data.name',))
+
+        assert pruned is sparse_schema(schema, ('data.name',))
+        assert pruned.dump({'data': {'name': 'a', 'secret': 'b'}, 'metadata': {'status': 0}}) == {
+            'data': {'name': 'a'},
+            'metadata': {'status': 0, 'message': 'Nice', 'errors': None, 'details': None, 'headers': {}},
+        }
+        with raises(ValueError):
+            sparse_schema(schema, ('data.nope',))
+
+    def test_fields(self, client):
+        """Test the response is pruned and the view sees what's requested."""
+
+        full = client.get('/test_fields').json
+        assert full['data'] == {'name': 'True', 'secret': 'x'}
+
+        sparse = client.get('/test_fields?fields=data.name,metadata.status').json
+        assert sparse == {'data': {'name': 'False'}, 'metadata': {'status': 0, 'headers': {}}}
+
+        assert client.get('/test_fields?fields=data.nope').status_code == 400
@@ -0,0 +1,43 @@
+"""
+Test health probes.
+"""
+
+
+class TestHealthMiddleware:
+    """Test liveness and readiness probes."""
+
+    def test_liveness(self, app):
+        """Test the liveness probe is static."""
+        response = app.test_client().get('/healthz')
+
+        assert response.status_code == 200
+        assert response.get_data() == b'{"status":"ok"}'
+        assert 'X-Connection-ID' not in response.headers
+
+    def test_readiness(self, app, monkeypatch):
+        """Test the readiness checks are cached and report failures."""
+        middleware = app.wsgi_app
+        client = app.test_client()
+        calls = []
+        check = middleware.check
+
+        def counted_check():
+            calls.append(1)
+            return check()
+
+        # The middleware outlives the test: its cached state is restored afterwards
+        monkeypatch.setattr(middleware, 'check', counted_check)
+        monkeypatch.setattr(middleware, 'ttl', 60)
+        monkeypatch.setattr(middleware, '_checked_at', None)
+        monkeypatch.setattr(middleware, '_ready', middleware._ready)
+
+        assert client.get('/readyz').json['status'] == 'ok'
+        assert client.get('/readyz').status_code == 200
+        assert len(calls) == 1
+
+        monkeypatch.setattr(middleware, 'ttl', 0)
+        monkeypatch.setattr(middleware, '_heads', {'ffffffffffff'})
+        response = client.get('/readyz')
+        assert response.status_code == 503
+        assert response.json['checks']['migrations'].startswith('at [')
+        assert len(calls) == 2
@@ -0,0 +1,112 @@
+"""
+Test idempotency keys.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from time import sleep
+
+from pytest import fixture
+
+from myapp import APIMethodView, APIResponseSchema, idempotent
+
+calls = []
+
+
+class IdempotentView(APIMethodView):
+    schema = APIResponseSchema()
+
+    @idempotent()
+    def post(self, _):
+        calls.append(1)
+        sleep(0.1)
+        return self.schema, {'data': {'calls': len(calls)}}
+
+
+@fixture(scope='module', name='client')
+def setup_client(register_views):
+    """
+    Set up a client of an idempotent view.
+
+    :param register_views: ad-hoc views registrar
+    :return: client
+    """
+    return register_views(
+        'test_idempotency',
+        {'/test_idempotency': IdempotentView.as_view('idempotent')},
+    )
+
+
+def post(client, key, body='{}', authorization='JWT a', remote_addr='127.0.0.1'):
+    headers = {'Idempotency-Key': key}
+    if authorization:
+        headers['Authorization'] = authorization
+    return client.post(
+        '/test_idempotency',
+        data=body,
+        headers=headers,
+        content_type='application/json',
+        environ_base={'REMOTE_ADDR': remote_addr},
+    )
+
+
+def test_replay(client):
+    """Test a retry replays the stored bytes."""
+    calls.clear()
+    first = post(client, 'replay')
+    second = post(client, 'replay')
+
+    assert len(calls) == 1
+    assert first.get_data() == second.get_data()
+    assert second.headers['Idempotent-Replayed'] == 'true'
+
+    post(client, 'replay', authorization='JWT b')
+    assert len(calls) == 2
+
+
+def test_anonymous_clients(client):
+    """Test anonymous callers don't share the keys."""
+    calls.clear()
+    post(client, 'anonymous', authorization=None, remote_addr='10.0.0.1')
+    replayed = post(client, 'anonymous', authorization=None, remote_addr='10.0.0.1')
+    other = post(client, 'anonymous', authorization=None, remote_addr='10.0.0.2')
+
+    assert replayed.headers['Idempotent-Replayed'] == 'true'
+    assert 'Idempotent-Replayed' not in other.headers
+    assert len(calls) == 2
+
+
+def test_another_body_is_rejected(client):
+    """Test a key can't be reused with another body."""
+    post(client, 'body', body='{"a": 1}')
+    response = post(client, 'body', body='{"a": 2}')
+
+    assert response.status_code == 422
+    assert response.json['metadata']['status'] == 422
+
+
+def test_too_long_key(client):
+    """Test a key is limited in length."""
+    response = post(client, 'x' * 256)
+
+    assert response.status_code == 400
+    assert response.json['metadata']['status'] == 400
+
+
+def test_dedicated_store(app, client):
+    """Test the records aren't evicted by the response cache."""
+    calls.clear()
+    post(client, 'store')
+    app.extensions['cache'].clear()
+
+    assert post(client, 'store').headers['Idempotent-Replayed'] == 'true'
+    assert len(calls) == 1
+    assert app.extensions['idempotency'] is not app.extensions['cache']
+
+
+def test_concurrent_duplicates_wait(client):
+    """Test concurrent duplicates wait for the first request."""
+    calls.clear()
+    with ThreadPoolExecutor(4) as executor:
+        responses = list(executor.map(lambda _: post(client, 'concurrent'), range(4)))
+
+    assert len(calls) == 1
+    assert len({response.get_data() for response in responses}) == 1
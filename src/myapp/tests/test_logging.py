@@ -0,0 +1,134 @@
+"""
+Test request logging.
+"""
+from json import loads
+from logging import ERROR, LogRecord
+from logging.config import DictConfigurator
+from sys import exc_info
+
+from pytest import warns
+from yaml import FullLoader, load as yaml_load
+
+from myapp import APIError, APIMethodView, APIMetrics, APIResponseSchema, ExceptionLogPolicy
+from myapp.config import ConnectionIDLoggingFilter, connection_id_var
+from myapp.lib.logs import JSONLogFormatter
+
+LEGACY_FILTER_CONFIG = """
+(): myapp.config.ConnectionIDLoggingFilter
+connection_id_header: X-Connection-ID
+is_generate_if_not_set: true
+"""
+
+
+class TestConnectionID:
+    """Test per-request correlation IDs."""
+
+    def test_connection_id(self, register_views):
+        """Test the ID is taken or generated once, visible to logging and echoed back."""
+        seen = []
+
+        class ConnectionIDView(APIMethodView):
+            schema = APIResponseSchema()
+
+            def get(self, _):
+                record = LogRecord('test', 20, __file__, 1, 'msg', None, None)
+                ConnectionIDLoggingFilter().filter(record)
+                seen.append(record.connection_id)
+                return self.schema, {'data': {}}
+
+        client = register_views(
+            'test_connection_id',
+            {'/test_connection_id': ConnectionIDView.as_view('connection_id')},
+        )
+
+        response = client.get('/test_connection_id', headers={'X-Connection-ID': 'abc-1'})
+        assert response.headers['X-Connection-ID'] == 'abc-1'
+        assert seen[-1] == 'abc-1'
+
+        first = client.get('/test_connection_id', headers={'X-Connection-ID': 'bad id;'})
+        second = client.get('/test_connection_id')
+        assert first.headers['X-Connection-ID'] == seen[-2]
+        assert second.headers['X-Connection-ID'] == seen[-1]
+        assert seen[-2] not in {'bad id;', seen[-1]}
+
+        assert connection_id_var.get() == 'X'
+
+    def test_legacy_filter_config(self):
+        """Test a LOGGING config with the former filter arguments still loads."""
+        config = yaml_load(LEGACY_FILTER_CONFIG, Loader=FullLoader)
+
+        with warns(DeprecationWarning):
+            log_filter = DictConfigurator({}).configure_filter(config)
+
+        record = LogRecord('test', 20, __file__, 1, 'msg', None, None)
+        assert log_filter.filter(record)
+        assert record.connection_id == 'X'
+
+
+class TestJSONLogFormatter:
+    """Test JSON lines formatter."""
+
+    def test_format(self):
+        """Test static, request and exception fields."""
+        try:
+            raise ValueError('Boom')
+        except ValueError:
+            record = LogRecord('test', ERROR, __file__, 1, 'Failed %s', ('x',), exc_info())
+        record.__dict__.update(status=500, latency_ms=1.5)
+
+        line = JSONLogFormatter(static_fields={'env': 'test'}).format(record)
+        json = loads(line)
+
+        assert '\n' not in line
+        assert json['app'] == 'MYAPP'
+        assert json['env'] == 'test'
+        assert json['message'] == 'Failed x'
+        assert json['connection_id'] == 'X'
+        assert json['status'] == 500
+        assert json['latency_ms'] == 1.5
+        assert 'endpoint' not in json
+        assert json['exc_type'] == 'ValueError'
+        assert json['exc_message'] == 'Boom'
+        assert 'Traceback' in json['exc_traceback']
+
+
+class TestExceptionLogPolicy:
+    """Test tiered exception logging."""
+
+    def test_expected(self, app, caplog, monkeypatch):
+        """Test client errors are sampled one-liners."""
+        monkeypatch.setitem(app.config, 'EXCEPTION_LOG_EXPECTED_SAMPLE', 3)
+        # The sampling counts on the metrics; other tests count the same errors
+        monkeypatch.setattr('myapp.lib.logs.metrics', APIMetrics())
+        policy = ExceptionLogPolicy()
+        for _ in range(5):
+            policy.log(APIError('Invalid JWT token', http_status=401))
+
+        records = [r for r in caplog.records if 'Invalid JWT token' in r.getMessage()]
+        assert len(records) == 2
+        assert not any(r.exc_info for r in records)
+
+    def test_unexpected(self, app, caplog, monkeypatch):
+        """Test tracebacks are rate limited per fingerprint and summarized."""
+        monkeypatch.setitem(app.config, 'EXCEPTION_LOG_TRACEBACKS_PER_WINDOW', 2)
+        monkeypatch.setitem(app.config, 'EXCEPTION_LOG_WINDOW', 60)
+        policy = ExceptionLogPolicy()
+        for _ in range(5):
+            try:
+                {}['missing']  # noqa: WPS428
+            except KeyError as error:
+                policy.log(error)
+
+        assert len([r for r in caplog.records if r.exc_info]) == 2
+
+        monkeypatch.setitem(app.config, 'EXCEPTION_LOG_WINDOW', 0)
+        policy.log(ValueError('other'))
+        assert '3 similar errors were suppressed: KeyError@' in caplog.text
+
+    def test_eviction(self, app):
+        """Test the least recently seen fingerprints are evicted first."""
+        policy = ExceptionLogPolicy(max_fingerprints=2)
+        for error_class in (KeyError, ValueError, KeyError, TypeError):
+            policy.log(error_class())
+
+        assert list(policy._windows) == ['KeyError', 'TypeError']
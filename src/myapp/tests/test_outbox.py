@@ -0,0 +1,164 @@
+"""
+Test the outbox delivery against a local SMTP server.
+"""
+from datetime import datetime, timedelta
+
+from flask import url_for
+from pytest import fixture, importorskip
+from sqlalchemy.exc import OperationalError
+
+from myapp import (
+    OutboxModel,
+    UserModel,
+    db,
+    deliver_outbox,
+    mail_message,
+    outbox_worker,
+    prune_outbox,
+)
+
+
+@fixture(name='smtp')
+def setup_smtp(app, monkeypatch):
+    """
+    Set up a local SMTP server.
+
+    :return: received messages
+    """
+    controller_module = importorskip('aiosmtpd.controller')
+    handlers = importorskip('aiosmtpd.handlers')
+
+    class Handler(handlers.Message):
+        def __init__(self):
+            super().__init__()
+            self.messages = []
+
+        def handle_message(self, message):
+            self.messages.append(message)
+
+    handler = Handler()
+    controller = controller_module.Controller(handler, hostname='127.0.0.1', port=8025)
+    controller.start()
+    monkeypatch.setitem(app.config, 'MAIL_SERVER', '127.0.0.1')
+    monkeypatch.setitem(app.config, 'MAIL_PORT', 8025)
+    yield handler.messages
+    controller.stop()
+
+
+@fixture(name='outbox')
+def setup_outbox():
+    """
+    Start and end with an empty outbox.
+
+    :return: OutboxModel
+    """
+    OutboxModel.query.delete()
+    db.session.commit()
+    yield OutboxModel
+    OutboxModel.query.delete()
+    UserModel.query.filter_by(username='outboxed').delete()
+    db.session.commit()
+
+
+def test_register_mail_is_delivered_by_worker(client, smtp, outbox):
+    """Test the registration queues the email and the worker delivers it."""
+    client.post(
+        url_for('auth.register'),
+        json={'username': 'outboxed', 'email': 'outboxed@example.com', 'password': 'x'},
+    )
+    assert outbox.query.count() == 1
+    assert not smtp
+
+    assert deliver_outbox(batch_size=10) == (1, 0)
+    assert smtp[0]['To'] == 'outboxed@example.com'
+    assert outbox.query.one().sent_at is not None
+
+    assert deliver_outbox(batch_size=10) == (0, 0)
+
+
+def test_failed_mail_is_retried_later(app, client, outbox, monkeypatch):
+    """Test a failed delivery is postponed."""
+    monkeypatch.setitem(app.config, 'MAIL_SERVER', '127.0.0.1')
+    monkeypatch.setitem(app.config, 'MAIL_PORT', 1)
+    client.post(
+        url_for('auth.register'),
+        json={'username': 'outboxed', 'email': 'outboxed@example.com', 'password': 'x'},
+    )
+
+    assert deliver_outbox(batch_size=10) == (0, 1)
+    message = outbox.query.one()
+    assert message.attempts == 1
+    assert message.next_attempt_at > message.created_at
+
+    assert deliver_outbox(batch_size=10) == (0, 0)
+
+
+def test_batch_is_leased_before_sending(app, outbox, monkeypatch):
+    """Test the claim is committed before the emails are sent."""
+    seen = []
+
+    class SMTP:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            return None
+
+        def send_message(self, email):
+            # Another connection sees the lease while the email is being sent
+            with db.engine.connect() as connection:
+                seen.append(connection.execute('SELECT attempts FROM outbox').scalar())
+
+    monkeypatch.setattr('myapp.services.outbox._smtp_connect', SMTP)
+    db.session.add(outbox(**mail_message('outboxed@example.com', 'Subject', 'Body')))
+    db.session.commit()
+
+    assert deliver_outbox(batch_size=10) == (1, 0)
+    assert seen == [1]
+    assert outbox.query.one().sent_at is not None
+
+
+def test_sent_mail_is_pruned(app, outbox):
+    """Test only the emails sent before the retention period are deleted."""
+    old = datetime.utcnow() - timedelta(seconds=app.config['OUTBOX_RETENTION'] + 1)
+    messages = [
+        mail_message(f'outboxed-{index}@example.com', 'Subject', 'Body')
+        for index in range(3)
+    ]
+    messages[0]['sent_at'] = old
+    messages[1]['sent_at'] = datetime.utcnow()
+    db.session.add_all(outbox(**message) for message in messages)
+    db.session.commit()
+
+    assert prune_outbox(batch_size=10) == 1
+    assert sorted(message.recipient for message in outbox.query) == [
+        'outboxed-1@example.com',
+        'outboxed-2@example.com',
+    ]
+
+
+def test_worker_backs_off_on_errors(app, monkeypatch):
+    """Test the worker survives an error, rolls back and backs off."""
+    results = iter([OperationalError('SELECT', {}, Exception('gone')), (0, 0)])
+    sleeps = []
+
+    def deliver(batch_size):
+        result = next(results)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        if len(sleeps) == 2:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr('myapp.deliver_outbox', deliver)
+    monkeypatch.setattr('myapp.prune_outbox', lambda batch_size: 0)
+    monkeypatch.setattr('myapp.commands.sleep', sleep)
+
+    result = app.test_cli_runner().invoke(outbox_worker, ['--batch-size', '10'])
+
+    assert result.exit_code == 1
+    interval = app.config['OUTBOX_POLL_INTERVAL']
+    assert sleeps == [interval * 2, interval]
@@ -0,0 +1,117 @@
+"""
+Test read replica routing.
+"""
+from contextlib import contextmanager
+
+from flask import request, url_for
+from flask_login import current_user
+from pytest import fixture
+from sqlalchemy import create_engine
+
+from myapp import JWT, APIMethodView, APIResponseSchema, UserModel, db, jwt_required
+
+MARKER = 'replica-marker'
+
+
+@fixture(name='replica_app')
+def setup_replica_app(app, tmp_path, monkeypatch):
+    """
+    Set up a primary and a replica that differs from it by a single user.
+
+    :return: app
+    """
+    primary, replica = (f'sqlite:///{tmp_path / name}.db' for name in ('primary', 'replica'))
+    for uri in (primary, replica):
+        db.Model.metadata.create_all(create_engine(uri))
+    create_engine(replica).execute(
+        UserModel.__table__.insert(), username=MARKER, email=MARKER, password='x',
+    )
+
+    monkeypatch.setitem(app.config, 'SQLALCHEMY_DATABASE_URI', primary)
+    monkeypatch.setitem(app.config, 'SQLALCHEMY_BINDS', {'replica': replica})
+    monkeypatch.setitem(app.config, 'SQLALCHEMY_REPLICA_BINDS', ['replica'])
+    return app
+
+
+@contextmanager
+def request_context(app, identity=None, **kwargs):
+    """Push a request context; pytest-flask keeps the outer one, so end the session manually."""
+    with app.test_request_context(**kwargs):
+        if identity is not None:
+            request.identity = identity
+        yield
+    db.session.remove()
+
+
+def read_from_replica():
+    return UserModel.query.filter_by(username=MARKER).one_or_none() is not None
+
+
+def write():
+    table = UserModel.__table__
+    db.session.execute(table.delete().where(table.c.username == MARKER))
+
+
+class MeView(APIMethodView):
+    schema = APIResponseSchema()
+
+    @jwt_required()
+    def get(self, _):
+        return self.schema, {'data': {'username': current_user.username}}
+
+
+def test_safe_requests_read_from_replica(replica_app):
+    """Test GET reads go to the replica; the rest go to the primary."""
+    with request_context(replica_app, method='GET'):
+        assert read_from_replica()
+    with request_context(replica_app, method='POST'):
+        assert not read_from_replica()
+
+
+def test_session_sticks_after_write(replica_app):
+    """Test a session reads its own writes."""
+    with request_context(replica_app, method='GET'):
+        write()
+        assert not read_from_replica()
+        db.session.rollback()
+
+
+def test_user_sticks_after_commit(replica_app):
+    """Test a user reads from the primary for a while after a commit; the others don't."""
+    with request_context(replica_app, identity='test-replica-writer', method='POST'):
+        write()
+        db.session.commit()
+    with request_context(replica_app, identity='test-replica-writer', method='GET'):
+        assert not read_from_replica()
+    with request_context(replica_app, identity='test-replica-other', method='GET'):
+        assert read_from_replica()
+
+
+def test_anonymous_write_sticks_nobody(replica_app):
+    """Test an anonymous commit doesn't send the other clients (e.g. behind a NAT) to primary."""
+    with request_context(replica_app, method='POST'):
+        write()
+        db.session.commit()
+    with request_context(replica_app, method='GET'):
+        assert read_from_replica()
+    with request_context(replica_app, identity='test-replica-other', method='GET'):
+        assert read_from_replica()
+
+
+def test_registered_user_sticks(replica_app, register_views):
+    """Test the JWT lookup of a new user finds it though the replica lags behind."""
+    client = register_views('test_replicas', {'/test_replicas/me': MeView.as_view('me')})
+    username = 'test-replica-new'
+    res = client.post(
+        url_for('auth.register'),
+        json={'username': username, 'email': f'{username}@example.com', 'password': 'x'},
+    )
+    db.session.remove()
+    assert res.status_code == 200
+
+    headers = {'Authorization': f'JWT {JWT.encode(UserModel(username=username)).decode()}'}
+    res = client.get('/test_replicas/me', headers=headers)
+    db.session.remove()
+
+    assert res.status_code == 200
+    assert res.json['data']['username'] == username
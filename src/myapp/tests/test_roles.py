@@ -0,0 +1,171 @@
+"""
+Test set-based role and permission assignments.
+"""
+from flask import url_for
+from pytest import fixture, mark, raises
+
+from myapp import (
+    JWT,
+    APIError,
+    UserModel,
+    assign_permissions,
+    assign_roles,
+    db,
+    revoke_permissions,
+    revoke_roles,
+    users_roles,
+)
+from myapp.models.auth import PermissionModel, RoleModel
+
+
+@fixture(name='roles')
+def setup_roles(app):
+    """
+    Set up users, roles and a permission; they're deleted afterwards.
+
+    :param app: flask application
+    :return: users
+    """
+    users = [
+        UserModel(
+            username=f'test-roles-{i}',
+            email=f'test-roles-{i}@example.com',
+            password='x',
+            active=i < 2,
+        )
+        for i in range(3)
+    ]
+    reviewer = RoleModel(name='test-reviewer')
+    editor = RoleModel(name='test-editor')
+    admin = RoleModel.query.filter_by(name='admin').one_or_none()
+    admin_created = admin is None
+    permission = PermissionModel(name='test-edit')
+    users[0].roles.append(reviewer)
+    users[1].roles.append(admin or RoleModel(name='admin'))
+    db.session.add_all([*users, editor, permission])
+    db.session.commit()
+    usernames = [user.username for user in users]
+    yield users
+
+    db.session.rollback()
+    revoke_roles(['test-reviewer', 'test-editor'], all_users=True)
+    revoke_roles(['admin'], usernames=usernames)
+    revoke_permissions(['test-edit'], ['test-reviewer', 'test-editor'])
+    UserModel.query.filter(UserModel.username.like('test-roles-%')).delete(synchronize_session=False)
+    RoleModel.query.filter(RoleModel.name.like('test-%')).delete(synchronize_session=False)
+    PermissionModel.query.filter_by(name='test-edit').delete(synchronize_session=False)
+    if admin_created:
+        RoleModel.query.filter_by(name='admin').delete(synchronize_session=False)
+    db.session.commit()
+
+
+def headers(user):
+    """
+    Make the authorization headers of a user.
+
+    :param user: UserModel
+    :return: headers
+    """
+    return {'Authorization': f'JWT {JWT.encode(user).decode()}'}
+
+
+def test_roles(roles):
+    """Test the assignments are counted and the existing ones are skipped."""
+    usernames = [user.username for user in roles]
+
+    assert assign_roles(['test-editor'], usernames=usernames, active=True) == 2
+    assert assign_roles(['test-editor', 'test-reviewer'], usernames=usernames) == 3
+    assert revoke_roles(['test-editor'], usernames=usernames, role='test-reviewer') == 3
+    assert revoke_roles(['test-editor'], usernames=usernames) == 0
+
+    db.session.expire_all()
+    assert [role.name for role in roles[2].roles] == ['test-reviewer']
+
+    with raises(APIError):
+        assign_roles(['test-nope'], usernames=usernames)
+
+
+def test_permissions(roles):
+    """Test the permissions assignments."""
+    assert assign_permissions(['test-edit'], ['test-editor', 'test-reviewer']) == 2
+    assert assign_permissions(['test-edit'], ['test-editor']) == 0
+    assert revoke_permissions(['test-edit'], ['test-reviewer']) == 1
+
+
+def test_empty_filter(roles):
+    """Test an empty users filter must be asked for explicitly."""
+    with raises(APIError):
+        revoke_roles(['test-reviewer'])
+    with raises(APIError):
+        assign_roles(['test-editor'], usernames=[])
+
+    assert revoke_roles(['test-reviewer'], all_users=True) == 1
+
+
+@mark.usefixtures('client_class')
+class TestRolesViews:
+    """Test the assignment endpoints."""
+
+    def test_admin_required(self, roles):
+        """Test only admins may change the assignments."""
+        body = {'roles': ['test-editor'], 'users': {'usernames': ['test-roles-2']}}
+
+        assert self.client.post(url_for('roles.users'), json=body).status_code == 401
+        res = self.client.post(url_for('roles.users'), json=body, headers=headers(roles[0]))
+        assert res.status_code == 403
+
+    def test_user_roles(self, roles):
+        """Test the roles assignment and revocation."""
+        body = {'roles': ['test-editor'], 'users': {'usernames': ['test-roles-2']}}
+
+        res = self.client.post(url_for('roles.users'), json=body, headers=headers(roles[1]))
+        assert res.status_code == 200
+        assert res.json['data']['affected'] == 1
+
+        res = self.client.delete(url_for('roles.users'), json=body, headers=headers(roles[1]))
+        assert res.json['data']['affected'] == 1
+
+    def test_bad_requests(self, roles):
+        """Test unknown roles and empty filters are rejected."""
+        url = url_for('roles.users')
+
+        body = {'roles': ['test-nope'], 'users': {'usernames': ['test-roles-2']}}
+        res = self.client.post(url, json=body, headers=headers(roles[1]))
+        assert res.status_code == 400
+        assert res.json['metadata']['message'] == 'Bad request: unknown roles: test-nope.'
+
+        body = {'roles': ['test-reviewer'], 'users': {}}
+        assert self.client.delete(url, json=body, headers=headers(roles[1])).status_code == 400
+
+        body['users']['all'] = True
+        res = self.client.delete(url, json=body, headers=headers(roles[1]))
+        assert res.json['data']['affected'] == 1
+
+    def test_role_permissions(self, roles):
+        """Test the permissions assignment."""
+        body = {'permissions': ['test-edit'], 'roles': ['test-editor']}
+        url = url_for('roles.permissions')
+
+        res = self.client.post(url, json=body, headers=headers(roles[1]))
+        assert res.json['data']['affected'] == 1
+        assert self.client.delete(url, json=body, headers=headers(roles[0])).status_code == 403
+
+
+def test_cli(app, roles):
+    """Test the users-roles command."""
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(users_roles, ['--role', 'test-editor', '--username', 'test-roles-2'])
+    assert result.exit_code == 0
+    assert result.output == 'Assigned: 1\n'
+
+    result = runner.invoke(users_roles, ['--role', 'test-editor', '--revoke'])
+    assert result.exit_code == 1
+    assert 'the users filter is empty' in result.output
+
+    result = runner.invoke(users_roles, ['--role', 'test-editor', '--revoke', '--all'])
+    assert result.output == 'Revoked: 1\n'
+
+    result = runner.invoke(users_roles, ['--role', 'test-nope', '--all'])
+    assert result.exit_code == 1
+    assert 'unknown roles: test-nope' in result.output
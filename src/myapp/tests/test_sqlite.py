@@ -0,0 +1,24 @@
+"""
+Test the SQLite profile.
+"""
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import QueuePool
+
+from myapp import db
+
+
+def test_sqlite_profile(app, tmp_path):
+    """Test the pragmas, the pool and the PostgreSQL isolation level default."""
+    sa_url = make_url(f'sqlite:///{tmp_path / "profile.db"}')
+    options = {'pool_size': 2}
+    db.apply_driver_hacks(app, sa_url, options)
+    options['isolation_level'] = 'READ_COMMITTED'
+    engine = db.create_engine(sa_url, options)
+    try:
+        with engine.connect() as connection:
+            assert connection.execute('PRAGMA journal_mode').scalar() == 'wal'
+            assert connection.execute('PRAGMA foreign_keys').scalar() == 1
+            assert connection.execute('PRAGMA busy_timeout').scalar() == app.config['SQLITE_PRAGMAS']['busy_timeout']
+        assert isinstance(engine.pool, QueuePool)
+    finally:
+        engine.dispose()
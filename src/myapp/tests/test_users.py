@@ -0,0 +1,237 @@
+"""
+Test users listing and export.
+"""
+from csv import reader as csv_reader
+from json import loads
+
+from flask import url_for
+from pytest import fixture, mark
+
+from myapp import JWT, UserModel, db, export_users, keyset_paginate, revoke_roles, users_export
+from myapp.models.auth import RoleModel
+
+COLUMNS = ['username', 'email', 'active', 'confirmed_at', 'roles']
+
+
+@fixture(name='users')
+def setup_users(app):
+    """
+    Set up an admin and a user; they're deleted afterwards.
+
+    :param app: flask application
+    :return: admin, user
+    """
+    admin_role = RoleModel.query.filter_by(name='admin').one_or_none()
+    admin_created = admin_role is None
+    admin = UserModel(
+        username='test-export-admin',
+        email='test-export-admin@example.com',
+        password='x',
+    )
+    admin.roles.append(admin_role or RoleModel(name='admin'))
+    user = UserModel(
+        username='test-export-user',
+        email='test-export-user@example.com',
+        password='x',
+    )
+    db.session.add_all([admin, user])
+    db.session.commit()
+    yield admin, user
+
+    db.session.rollback()
+    revoke_roles(['admin'], usernames=['test-export-admin'])
+    exported = UserModel.query.filter(UserModel.username.like('test-export-%'))
+    exported.delete(synchronize_session=False)
+    if admin_created:
+        RoleModel.query.filter_by(name='admin').delete(synchronize_session=False)
+    db.session.commit()
+
+
+def headers(user):
+    """
+    Make the authorization headers of a user.
+
+    :param user: UserModel
+    :return: headers
+    """
+    return {'Authorization': f'JWT {JWT.encode(user).decode()}'}
+
+
+@fixture(name='page_users')
+def setup_page_users(app):
+    """
+    Set up five users, every other one inactive; they're deleted afterwards.
+
+    :param app: flask application
+    :return: usernames
+    """
+    users = [
+        UserModel(
+            username=f'test-page-{i}',
+            email=f'test-page-{i}@example.com',
+            password='x',
+            active=i % 2 == 0,
+        )
+        for i in range(5)
+    ]
+    db.session.add_all(users)
+    db.session.commit()
+    yield [user.username for user in users]
+
+    db.session.rollback()
+    paged = UserModel.query.filter(UserModel.username.like('test-page-%'))
+    paged.delete(synchronize_session=False)
+    db.session.commit()
+
+
+def paginate(query, columns, limit):
+    """
+    Walk all pages.
+
+    :param query: query
+    :param columns: ordering columns
+    :param limit: page size
+    :return: pages of usernames
+    """
+    pages = []
+    cursor = None
+    while True:  # noqa: WPS457
+        rows, cursor = keyset_paginate(query, columns, limit, cursor)
+        pages.append([row.username for row in rows])
+        if cursor is None:
+            return pages
+
+
+@mark.parametrize('limit', [1, 2, 5, 6])
+def test_keyset_pages(page_users, limit):
+    """Test the pages don't overlap or skip rows; the last one has no cursor."""
+    query = UserModel.query.filter(UserModel.username.like('test-page-%'))
+    pages = paginate(query, (UserModel.id,), limit)
+
+    assert pages == [page_users[i:i + limit] for i in range(0, len(page_users), limit)]
+
+
+def test_keyset_ties(page_users):
+    """Test the boundaries of a multi-column ordering with ties on the first column."""
+    query = UserModel.query.filter(UserModel.username.like('test-page-%'))
+    pages = paginate(query, (UserModel.active, UserModel.id), 2)
+
+    inactive, active = page_users[1::2], page_users[::2]
+    assert sum(pages, []) == inactive + active
+    assert [len(page) for page in pages] == [2, 2, 1]
+
+
+def test_export_ndjson(users):
+    """Test a JSON object per line, a chunk per batch."""
+    chunks = list(export_users('ndjson', batch_size=1))
+    lines = [loads(line) for line in ''.join(chunks).splitlines()]
+
+    assert len(chunks) == UserModel.query.count() == len(lines)
+    exported = {line['username']: line for line in lines}
+    assert exported['test-export-admin'] == {
+        'username': 'test-export-admin',
+        'email': 'test-export-admin@example.com',
+        'active': True,
+        'confirmed_at': None,
+        'roles': ['admin'],
+    }
+    assert exported['test-export-user']['roles'] == []
+
+
+def test_export_csv(users):
+    """Test a header and a row per user; the roles are joined."""
+    rows = list(csv_reader(''.join(export_users('csv', batch_size=2)).splitlines()))
+
+    assert rows[0] == COLUMNS
+    assert len(rows) == UserModel.query.count() + 1
+    exported = {row[0]: row for row in rows[1:]}
+    assert exported['test-export-admin'] == [
+        'test-export-admin',
+        'test-export-admin@example.com',
+        'True',
+        '',
+        'admin',
+    ]
+
+
+@mark.usefixtures('client_class')
+class TestUsersExportView:
+    """Test the export endpoint."""
+
+    def test_admin_required(self, users):
+        """Test only admins may export."""
+        url = url_for('users.export')
+
+        assert self.client.get(url).status_code == 401
+        assert self.client.get(url, headers=headers(users[1])).status_code == 403
+
+    def test_streamed(self, users):
+        """Test the export is streamed as an attachment."""
+        res = self.client.get(
+            url_for('users.export', format='csv'),
+            headers=headers(users[0]),
+            buffered=False,
+        )
+
+        assert res.status_code == 200
+        assert res.is_streamed
+        assert res.mimetype == 'text/csv'
+        assert res.headers['Content-Disposition'] == 'attachment; filename=users.csv'
+        lines = b''.join(res.response).decode('utf8').splitlines()
+        assert lines[0] == ','.join(COLUMNS)
+        assert len(lines) == UserModel.query.count() + 1
+        res.close()
+
+
+def test_cli(app, users, tmp_path):
+    """Test the users-export command writes the file."""
+    output = tmp_path / 'users.ndjson'
+    args = ['--output', str(output), '--batch-size', '1']
+    result = app.test_cli_runner().invoke(users_export, args)
+
+    assert result.exit_code == 0
+    lines = output.read_text(encoding='utf8').splitlines()
+    assert 'test-export-user' in {loads(line)['username'] for line in lines}
+
+
+@mark.usefixtures('client_class')
+class TestUsersView:
+    """Test the listing endpoint."""
+
+    def get(self, admin, **query):
+        """
+        List users.
+
+        :param admin: admin UserModel
+        :param query: query parameters
+        :return: response
+        """
+        return self.client.get(url_for('users.users', **query), headers=headers(admin))
+
+    def test_pages(self, users, page_users):
+        """Test following the cursors with the active filter until the last page."""
+        usernames = []
+        cursor = None
+        for _ in range(UserModel.query.count()):
+            res = self.get(users[0], limit=2, active='true', cursor=cursor)
+            assert res.status_code == 200
+            usernames.extend(user['username'] for user in res.json['data']['users'])
+            assert all(user['active'] for user in res.json['data']['users'])
+            cursor = res.json['metadata']['next_cursor']
+            if cursor is None:
+                break
+
+        assert cursor is None
+        assert len(usernames) == len(set(usernames))
+        assert [name for name in usernames if name.startswith('test-page-')] == page_users[::2]
+        assert 'test-export-user' in usernames
+
+    def test_tampered_cursor(self, users, page_users):
+        """Test a cursor which isn't signed by the server is rejected."""
+        res = self.get(users[0], limit=2)
+        cursor = res.json['metadata']['next_cursor']
+
+        res = self.get(users[0], limit=2, cursor=cursor[:-2] + 'xx')
+        assert res.status_code == 400
+        assert res.json['metadata']['status'] == 400
+        assert res.json['metadata']['errors'] == {'query': {'cursor': ['Invalid cursor.']}}
@@ -0,0 +1,66 @@
+"""
+Test compiled request validation.
+"""
+from marshmallow import ValidationError, fields
+from pytest import mark
+
+from myapp import compile_schema, schemas
+from myapp.core import APICommonRequestSchema, APIRequestSchema, CompiledSchemaLoader
+
+PAYLOADS = (
+    {},
+    {'username': 'me', 'password': 'me'},
+    {'username': 1, 'password': None, 'unknown': 'x'},
+    {'email': 'not an email', 'full_name': 'guy', 'dob': 'yesterday'},
+    {'email': 'guy@example.com', 'dob': '2020-01-01T00:00:00', 'kind': 'cache'},
+    {'debug_tb_enabled': 'maybe', 'token': 'x', 'new_password': 'a', 'old_password': 'b'},
+    ['not', 'a', 'mapping'],
+)
+
+
+def load(load_fn, payload):
+    try:
+        return load_fn(payload), None
+    except ValidationError as error:
+        return None, error.messages
+
+
+# Request schemas with list or nested fields; they're loaded by marshmallow
+FALLBACK_SCHEMAS = frozenset((
+    'BatchRequestSchema',
+    'RegisterBulkRequestSchema',
+    'RolePermissionsRequestSchema',
+    'UserRolesRequestSchema',
+))
+
+
+def request_schemas(fallback):
+    return [
+        getattr(schemas, name)()
+        for name in dir(schemas)
+        if isinstance(getattr(schemas, name), type)
+        and issubclass(getattr(schemas, name), APIRequestSchema)
+        and (name in FALLBACK_SCHEMAS) == fallback
+    ]
+
+
+@mark.parametrize('schema', [APICommonRequestSchema(), *request_schemas(fallback=False)])
+def test_compiled_loader_is_equivalent(schema):
+    loader = compile_schema(schema)
+    assert loader is not None
+
+    for payload in PAYLOADS:
+        assert load(loader.load, payload) == load(schema.load, payload)
+
+
+@mark.parametrize('schema', request_schemas(fallback=True))
+def test_list_and_nested_schemas_fall_back(schema):
+    assert not CompiledSchemaLoader.is_compilable(schema)
+    assert compile_schema(schema) is None
+
+
+def test_nested_schema_falls_back():
+    class NestedRequestSchema(APIRequestSchema):
+        guys = fields.List(fields.Nested(schemas.GuysRequestSchema))
+
+    assert compile_schema(NestedRequestSchema()) is None
@@ -6,6 +6,7 @@ from .auth import (
     ConfirmationTokenView,
     ConfirmView,
     RegisterView,
+    RegisterBulkView,
     ChangePasswordView,
     RestorePasswordView,
 )
@@ -13,7 +14,22 @@ from .guys import (
     GUYS_BLUEPRINT,
     GuysView,
 )
+from .users import (
+    USERS_BLUEPRINT,
+    UsersView,
+    UsersExportView,
+)
 from .stats import (
     STATS_BLUEPRINT,
     StatsView,
 )
+from .batch import (
+    BATCH_BLUEPRINT,
+    BatchView,
+)
+from .roles import (
+    ROLES_BLUEPRINT,
+    UserRolesView,
+    RolePermissionsView,
+)
+from .routes import register_blueprints
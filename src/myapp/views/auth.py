@@ -10,16 +10,22 @@ from myapp import (  # noqa: WPS347
     APIMethodView,
     APIBlueprint,
     APIError,
+    InvalidCredentialsError,
     JWT,
     anonymous_required,
+    cache,
     db,
     schemas,
     register_user,
+    register_users,
+    roles_required,
     confirmation_token_link,
     confirmation_token_check,
     confirmation,
+    idempotent,
     parse,
     jwt_required,
+    track_login,
     UserModel,
 )
 
@@ -29,6 +35,8 @@ AUTH_BLUEPRINT = APIBlueprint('auth', __name__)
 class LoginView(APIMethodView):
     """Login resource."""
 
+    priority = 'high'
+
     schema = schemas.LoginResponseSchema()
 
     @anonymous_required
@@ -57,11 +65,10 @@ class LoginView(APIMethodView):
         user = UserModel.query.filter_by(username=req['username']).one_or_none()
 
         if not (user and verify_password(req['password'], user.password)):
-            raise APIError(
-                'Bad Request: invalid credentials',
-                metadata={'status': HTTPStatus.UNAUTHORIZED},
-                http_status=HTTPStatus.UNAUTHORIZED,
-            )
+            track_login(req['username'], user, succeeded=False)
+            raise InvalidCredentialsError()
+
+        track_login(req['username'], user)
 
         access_token = JWT.encode(user)
         expires = datetime.utcnow() + current_app.config['JWT_EXPIRATION_DELTA']
@@ -83,6 +90,8 @@ class LoginView(APIMethodView):
 class LogoutView(APIMethodView):
     """Logout resource."""
 
+    priority = 'high'
+
     schema = schemas.LogoutResponseSchema()
 
     @jwt_required
@@ -124,6 +133,7 @@ class RegisterView(APIMethodView):
     schema = schemas.RegisterResponseSchema()
 
     @anonymous_required
+    @idempotent()
     @parse(schemas.RegisterRequestSchema(), location='json')
     def post(self, _, req):
         """
@@ -133,6 +143,13 @@ class RegisterView(APIMethodView):
         description: >
             # Registration endpoint Endpoint.
         parameters:
+            -
+                in: header
+                name: Idempotency-Key
+                description: Retries with the same key replay the first response
+                schema:
+                    type: string
+                required: false
             -
                 in: query
                 schema: APICommonRequestSchema
@@ -160,10 +177,74 @@ class RegisterView(APIMethodView):
 
         db.session.add(user)
         db.session.commit()
+        # The new user's first reads must find it, even on a lagging replica
+        db.sticky_users.stick(user.username)
+        cache.invalidate('users')
 
         return self.schema, res
 
 
+class RegisterBulkView(APIMethodView):
+    """Bulk register resource."""
+
+    priority = 'low'
+
+    schema = schemas.RegisterBulkResponseSchema()
+
+    @jwt_required()
+    @roles_required('admin')
+    @idempotent()
+    @parse(schemas.RegisterBulkRequestSchema(), location='json')
+    def post(self, _, req):
+        """
+        Register new users in bulk.
+
+        ---
+        description: >
+            # Bulk registration endpoint; for partners onboarding.
+        parameters:
+            -
+                in: header
+                name: Idempotency-Key
+                description: Retries with the same key replay the first response
+                schema:
+                    type: string
+                required: false
+            -
+                in: query
+                schema: APICommonRequestSchema
+            -
+                in: query
+                schema: RegisterBulkRequestSchema
+        responses:
+            200:
+                description: Per-item results
+                content:
+                    application/json:
+                        schema: RegisterBulkResponseSchema
+        """
+        max_items = current_app.config['REGISTER_BULK_MAX_ITEMS']
+        if len(req['users']) > max_items:
+            raise APIError(
+                f'Bad request: too many users; the limit is {max_items}.',
+                metadata={'status': HTTPStatus.REQUEST_ENTITY_TOO_LARGE},
+                http_status=HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+            )
+
+        results = register_users(req['users'])
+        created = sum(result['status'] == 'created' for result in results)
+        if created:
+            cache.invalidate('users')
+
+        return self.schema, {
+            'data': {
+                'created': created,
+                'failed': len(results) - created,
+                'results': results,
+            },
+        }
+
+
 class ConfirmationTokenView(APIMethodView):
     """Confirmation Token resource."""
 
@@ -205,6 +286,7 @@ class ConfirmationTokenView(APIMethodView):
             raise APIError('Already confirmed', metadata={'status': 10})
 
         token_link = confirmation_token_link(user)
+        db.session.commit()
 
         if current_app.debug or current_app.testing:
             res['data']['confirmation_token_link'] = token_link
@@ -258,6 +340,7 @@ class ConfirmView(APIMethodView):
         user = confirmation(user)
         db.session.add(user)
         db.session.commit()
+        cache.invalidate('users')
 
         return self.schema, {'data': {'user': user}}
 
@@ -267,6 +350,7 @@ class ChangePasswordView(APIMethodView):
 
     schema = schemas.ChangePasswordResponseSchema()
 
+    @idempotent()
     @parse(schemas.ChangePasswordRequestSchema(), location='json')
     def post(self, _, req):
         """
@@ -276,6 +360,13 @@ class ChangePasswordView(APIMethodView):
         description: >
             # Registration endpoint Endpoint.
         parameters:
+            -
+                in: header
+                name: Idempotency-Key
+                description: Retries with the same key replay the first response
+                schema:
+                    type: string
+                required: false
             -
                 in: query
                 schema: APICommonRequestSchema
@@ -318,6 +409,7 @@ class ChangePasswordView(APIMethodView):
 
         db.session.add(user)
         db.session.commit()
+        cache.invalidate('users')
 
         return self.schema, {'data': {'user': user}}
 
@@ -327,6 +419,7 @@ class RestorePasswordView(APIMethodView):
 
     schema = schemas.RestorePasswordResponseSchema()
 
+    @idempotent()
     @parse(schemas.RestorePasswordRequestSchema(), location='json')
     def post(self, _, r):
         """
@@ -336,6 +429,13 @@ class RestorePasswordView(APIMethodView):
         description: >
             # Registration endpoint Endpoint.
         parameters:
+            -
+                in: header
+                name: Idempotency-Key
+                description: Retries with the same key replay the first response
+                schema:
+                    type: string
+                required: false
             -
                 in: query
                 schema: APICommonRequestSchema
@@ -356,6 +456,7 @@ class RestorePasswordView(APIMethodView):
             raise APIError('Go away', metadata={'status': 9})
 
         token_link = confirmation_token_link(user, endpoint='auth.change_password')
+        db.session.commit()
         if current_app.debug or current_app.testing:
             res['data']['confirmation_token_link'] = token_link
 
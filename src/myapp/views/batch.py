@@ -0,0 +1,64 @@
+"""Batch controllers."""
+from http import HTTPStatus
+
+from flask import current_app, request
+
+from myapp import (  # noqa: WPS347
+    APIMethodView,
+    APIBlueprint,
+    APIError,
+    BATCH_ENVIRON_KEY,
+    BatchRequestSchema,
+    BatchResponseSchema,
+    dispatch_batch,
+    parse,
+)
+
+BATCH_BLUEPRINT = APIBlueprint('batch', __name__)
+
+
+class BatchView(APIMethodView):
+    """Batch resource."""
+
+    schema = BatchResponseSchema()
+
+    @parse(BatchRequestSchema(), location='json')
+    def post(self, _, req):
+        """
+        Make several API calls in one round trip.
+
+        ---
+        description: >
+            # Batch endpoint; each sub-request is authorized and handled as a standalone one.
+        parameters:
+            -
+                in: query
+                schema: APICommonRequestSchema
+            -
+                in: query
+                schema: BatchRequestSchema
+        responses:
+            200:
+                description: Sub-responses in the order of the sub-requests
+                content:
+                    application/json:
+                        schema: BatchResponseSchema
+        """
+        if request.environ.get(BATCH_ENVIRON_KEY):
+            raise APIError(
+                'Bad request: batches cannot be nested.',
+                metadata={'status': HTTPStatus.BAD_REQUEST},
+                http_status=HTTPStatus.BAD_REQUEST,
+            )
+
+        max_requests = current_app.config['BATCH_MAX_REQUESTS']
+        if len(req['requests']) > max_requests:
+            raise APIError(
+                f'Bad request: too many requests; the limit is {max_requests}.',
+                metadata={'status': HTTPStatus.REQUEST_ENTITY_TOO_LARGE},
+                http_status=HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+            )
+
+        responses = dispatch_batch(req['requests'], concurrent=req['concurrent'])
+
+        return self.schema, {'data': {'responses': responses}}
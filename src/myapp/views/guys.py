@@ -4,6 +4,8 @@ from myapp import (  # noqa: WPS347
     APIBlueprint,
     GuysRequestSchema,
     GuysResponseSchema,
+    cached,
+    coalesced,
     jwt_required,
     parse,
 )
@@ -17,6 +19,8 @@ class GuysView(APIMethodView):
     schema = GuysResponseSchema()
 
     @jwt_required()
+    @cached(ttl=30, vary_on=('query', 'identity'))  # noqa: WPS432
+    @coalesced(vary_on=('query', 'identity'))
     @parse(GuysRequestSchema(), location='query')
     def get(self, _, r):
         """
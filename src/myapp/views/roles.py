@@ -0,0 +1,139 @@
+"""Roles controllers."""
+from myapp import (  # noqa: WPS347
+    APIMethodView,
+    APIBlueprint,
+    AssignmentResponseSchema,
+    RolePermissionsRequestSchema,
+    UserRolesRequestSchema,
+    assign_permissions,
+    assign_roles,
+    jwt_required,
+    parse,
+    revoke_permissions,
+    revoke_roles,
+    roles_required,
+)
+
+ROLES_BLUEPRINT = APIBlueprint('roles', __name__)
+
+
+class UserRolesView(APIMethodView):
+    """Users roles resource."""
+
+    priority = 'low'
+
+    schema = AssignmentResponseSchema()
+
+    @jwt_required()
+    @roles_required('admin')
+    @parse(UserRolesRequestSchema(), location='json')
+    def post(self, _, req):
+        """
+        Assign roles to the users matching a filter.
+
+        ---
+        description: >
+            # Set-based assignment; the existing assignments are skipped.
+        parameters:
+            -
+                in: query
+                schema: APICommonRequestSchema
+            -
+                in: query
+                schema: UserRolesRequestSchema
+        responses:
+            200:
+                description: Number of new assignments
+                content:
+                    application/json:
+                        schema: AssignmentResponseSchema
+        """
+        return self.schema, {'data': {'affected': assign_roles(req['roles'], **req['users'])}}
+
+    @jwt_required()
+    @roles_required('admin')
+    @parse(UserRolesRequestSchema(), location='json')
+    def delete(self, _, req):
+        """
+        Revoke roles from the users matching a filter.
+
+        ---
+        description: >
+            # Set-based revocation.
+        parameters:
+            -
+                in: query
+                schema: APICommonRequestSchema
+            -
+                in: query
+                schema: UserRolesRequestSchema
+        responses:
+            200:
+                description: Number of deleted assignments
+                content:
+                    application/json:
+                        schema: AssignmentResponseSchema
+        """
+        return self.schema, {'data': {'affected': revoke_roles(req['roles'], **req['users'])}}
+
+
+class RolePermissionsView(APIMethodView):
+    """Roles permissions resource."""
+
+    priority = 'low'
+
+    schema = AssignmentResponseSchema()
+
+    @jwt_required()
+    @roles_required('admin')
+    @parse(RolePermissionsRequestSchema(), location='json')
+    def post(self, _, req):
+        """
+        Assign permissions to roles.
+
+        ---
+        description: >
+            # Set-based assignment; the existing assignments are skipped.
+        parameters:
+            -
+                in: query
+                schema: APICommonRequestSchema
+            -
+                in: query
+                schema: RolePermissionsRequestSchema
+        responses:
+            200:
+                description: Number of new assignments
+                content:
+                    application/json:
+                        schema: AssignmentResponseSchema
+        """
+        affected = assign_permissions(req['permissions'], req['roles'])
+        return self.schema, {'data': {'affected': affected}}
+
+    @jwt_required()
+    @roles_required('admin')
+    @parse(RolePermissionsRequestSchema(), location='json')
+    def delete(self, _, req):
+        """
+        Revoke permissions from roles.
+
+        ---
+        description: >
+            # Set-based revocation.
+        parameters:
+            -
+                in: query
+                schema: APICommonRequestSchema
+            -
+                in: query
+                schema: RolePermissionsRequestSchema
+        responses:
+            200:
+                description: Number of deleted assignments
+                content:
+                    application/json:
+                        schema: AssignmentResponseSchema
+        """
+        affected = revoke_permissions(req['permissions'], req['roles'])
+        return self.schema, {'data': {'affected': affected}}
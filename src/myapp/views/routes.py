@@ -0,0 +1,84 @@
+"""MYAPP URL rules."""
+from myapp.views.auth import (
+    AUTH_BLUEPRINT,
+    LoginView,
+    LogoutView,
+    ConfirmationTokenView,
+    ConfirmView,
+    RegisterView,
+    RegisterBulkView,
+    ChangePasswordView,
+    RestorePasswordView,
+)
+from myapp.views.guys import (
+    GUYS_BLUEPRINT,
+    GuysView,
+)
+from myapp.views.users import (
+    USERS_BLUEPRINT,
+    UsersView,
+    UsersExportView,
+)
+from myapp.views.stats import (
+    STATS_BLUEPRINT,
+    StatsView,
+)
+from myapp.views.batch import (
+    BATCH_BLUEPRINT,
+    BatchView,
+)
+from myapp.views.roles import (
+    ROLES_BLUEPRINT,
+    UserRolesView,
+    RolePermissionsView,
+)
+
+
+def register_blueprints(app):  # noqa: WPS213
+    """
+    Add the URL rules and register the blueprints.
+
+    :param app: Flask Application
+    """
+    AUTH_BLUEPRINT.add_url_rule('/login', view_func=LoginView.as_view('login'))
+    AUTH_BLUEPRINT.add_url_rule('/logout', view_func=LogoutView.as_view('logout'))
+    AUTH_BLUEPRINT.add_url_rule('/register', view_func=RegisterView.as_view('register'))
+    AUTH_BLUEPRINT.add_url_rule(
+        '/register/bulk',
+        view_func=RegisterBulkView.as_view('register_bulk'),
+    )
+    AUTH_BLUEPRINT.add_url_rule(
+        '/confirmation_token',
+        view_func=ConfirmationTokenView.as_view('confirmation_token'),
+    )
+    AUTH_BLUEPRINT.add_url_rule('/confirm', view_func=ConfirmView.as_view('confirm'))
+    AUTH_BLUEPRINT.add_url_rule(
+        '/change_password',
+        view_func=ChangePasswordView.as_view('change_password'),
+    )
+    AUTH_BLUEPRINT.add_url_rule(
+        '/restore_password',
+        view_func=RestorePasswordView.as_view('restore_password'),
+    )
+
+    GUYS_BLUEPRINT.add_url_rule('/guys', view_func=GuysView.as_view('guys'))
+
+    STATS_BLUEPRINT.add_url_rule('/stats', view_func=StatsView.as_view('stats'))
+
+    USERS_BLUEPRINT.add_url_rule('/users', view_func=UsersView.as_view('users'))
+    USERS_BLUEPRINT.add_url_rule('/users/export', view_func=UsersExportView.as_view('export'))
+
+    BATCH_BLUEPRINT.add_url_rule('/batch', view_func=BatchView.as_view('batch'))
+
+    ROLES_BLUEPRINT.add_url_rule('/roles/users', view_func=UserRolesView.as_view('users'))
+    ROLES_BLUEPRINT.add_url_rule(
+        '/roles/permissions',
+        view_func=RolePermissionsView.as_view('permissions'),
+    )
+
+    app.register_blueprint(AUTH_BLUEPRINT, url_prefix='/api/v1/auth')
+    app.register_blueprint(GUYS_BLUEPRINT, url_prefix='/api/v1')
+    app.register_blueprint(STATS_BLUEPRINT, url_prefix='/api/v1')
+    app.register_blueprint(USERS_BLUEPRINT, url_prefix='/api/v1')
+    app.register_blueprint(BATCH_BLUEPRINT, url_prefix='/api/v1')
+    app.register_blueprint(ROLES_BLUEPRINT, url_prefix='/api/v1')
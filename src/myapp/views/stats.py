@@ -1,5 +1,13 @@
 """Stats controllers."""
-from myapp import APIMethodView, APIBlueprint
+from myapp import (  # noqa: WPS347
+    APIMethodView,
+    APIBlueprint,
+    StatsRequestSchema,
+    StatsResponseSchema,
+    jwt_required,
+    metrics,
+    parse,
+)
 
 STATS_BLUEPRINT = APIBlueprint('stats', __name__)
 
@@ -7,13 +15,20 @@ STATS_BLUEPRINT = APIBlueprint('stats', __name__)
 class StatsView(APIMethodView):
     """Stats resource."""
 
-    def get(self):
+    schema = StatsResponseSchema()
+
+    @jwt_required()
+    @parse(StatsRequestSchema(), location='query')
+    def get(self, _, r):
         """
         Stats detail view.
 
         ---
         description: Provides some stats.
         parameters:
+            -
+                in: query
+                schema: APICommonRequestSchema
             -
                 in: query
                 schema: StatsRequestSchema
@@ -24,4 +39,4 @@ class StatsView(APIMethodView):
                     application/json:
                         schema: StatsResponseSchema
         """
-        return {'hey': self.__class__}
+        return self.schema, {'data': {'metrics': metrics.snapshot(prefix=r['kind'])}}
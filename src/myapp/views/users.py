@@ -0,0 +1,106 @@
+"""Users controllers."""
+from flask import current_app, stream_with_context
+
+from myapp import (  # noqa: WPS347
+    APIMethodView,
+    APIBlueprint,
+    EXPORT_FORMATS,
+    UsersExportRequestSchema,
+    UsersRequestSchema,
+    UsersResponseSchema,
+    cached,
+    export_users,
+    is_field_requested,
+    jwt_required,
+    list_users,
+    parse,
+    roles_required,
+)
+
+USERS_BLUEPRINT = APIBlueprint('users', __name__)
+
+
+class UsersView(APIMethodView):
+    """Users resource."""
+
+    schema = UsersResponseSchema()
+
+    @jwt_required()
+    @roles_required('admin')
+    @cached(ttl=10, vary_on=('query', 'identity'), tags=('users',))
+    @parse(UsersRequestSchema(), location='query')
+    def get(self, _, r):
+        """
+        List users with keyset pagination.
+
+        ---
+        description: >
+            # Users listing; follow metadata.next_cursor for the next page.
+        parameters:
+            -
+                in: query
+                schema: APICommonRequestSchema
+            -
+                in: query
+                schema: UsersRequestSchema
+        responses:
+            200:
+                description: A page of users
+                content:
+                    application/json:
+                        schema: UsersResponseSchema
+        """
+        users, next_cursor = list_users(
+            r['limit'],
+            r['cursor'],
+            r.get('active'),
+            with_roles=is_field_requested('data.users.roles'),
+        )
+
+        return self.schema, {
+            'data': {'users': users},
+            'metadata': {'next_cursor': next_cursor},
+        }
+
+
+class UsersExportView(APIMethodView):
+    """Users export resource."""
+
+    priority = 'low'
+    # The streamed export would be buffered in the batch response
+    batchable = False
+
+    @jwt_required()
+    @roles_required('admin')
+    @parse(UsersExportRequestSchema(), location='query')
+    def get(self, _, r):
+        """
+        Stream all users as NDJSON or CSV.
+
+        ---
+        description: >
+            # Users export; the response is streamed with constant memory.
+        parameters:
+            -
+                in: query
+                schema: APICommonRequestSchema
+            -
+                in: query
+                schema: UsersExportRequestSchema
+        responses:
+            200:
+                description: One user per line
+                content:
+                    application/x-ndjson: {}
+                    text/csv: {}
+        """
+        export_format = r['format']
+        chunks = export_users(export_format, current_app.config['USERS_EXPORT_BATCH_SIZE'])
+
+        return current_app.response_class(
+            stream_with_context(chunks),
+            mimetype=EXPORT_FORMATS[export_format],
+            headers={
+                'Content-Disposition': f'attachment; filename=users.{export_format}',
+            },
+        )
@@ -0,0 +1,9 @@
+"""
+MYAPP WSGI entry point.
+
+Usage: gunicorn --config python:myapp.gunicorn_config myapp.wsgi:application
+"""
+from myapp import create_app, warmup
+
+application = create_app()
+warmup(application)